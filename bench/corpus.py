@@ -0,0 +1,161 @@
+"""生成压测用的文档/图片语料
+
+    python bench/corpus.py --out bench_corpus
+
+生成内容固定（随机种子固定），保证多次压测结果可比较。
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import zipfile
+from pathlib import Path
+from typing import Dict, List
+
+WORDS = (
+    "service document parser latency throughput cache worker queue token "
+    "request response stream upload extract analyze model page image text"
+).split()
+
+# 各类文件的规格：名称 -> 参数
+PDF_SPECS = {"small": 2, "medium": 30, "large": 200}
+DOCX_SPECS = {"small": 50, "large": 2000}
+CSV_SPECS = {"small": 100, "large": 20000}
+JSON_SPECS = {"small": 100, "large": 20000}
+IMAGE_SPECS = {"small": (800, 600), "large": (2480, 3508)}
+
+
+def _sentence(rng: random.Random, n: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def make_pdf(pages: int, rng: random.Random, lines_per_page: int = 40) -> bytes:
+    """手写一个最小的多页文本 PDF（Helvetica 字体，不依赖第三方库）"""
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(objects) + 1 + 2 * pages
+    page_ids = []
+    for _ in range(pages):
+        text = "\n".join(
+            f"BT /F1 10 Tf 40 {800 - 18 * i} Td ({_sentence(rng)}) Tj ET" for i in range(lines_per_page)
+        ).encode("latin-1")
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(text), text))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font, content)
+        ))
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref))
+    return out.getvalue()
+
+
+def make_docx(paragraphs: int, rng: random.Random) -> bytes:
+    """生成只含 document.xml 的最小 DOCX"""
+    body = "".join(f"<w:p><w:r><w:t>{_sentence(rng)}</w:t></w:r></w:p>" for _ in range(paragraphs))
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{body}</w:body></w:document>"
+    )
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        "</Types>"
+    )
+    rels = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="word/document.xml"/></Relationships>'
+    )
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", content_types)
+        z.writestr("_rels/.rels", rels)
+        z.writestr("word/document.xml", document)
+    return out.getvalue()
+
+
+def make_csv(rows: int, rng: random.Random) -> bytes:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["id", "name", "score", "comment"])
+    for i in range(rows):
+        writer.writerow([i, rng.choice(WORDS), round(rng.random() * 100, 3), _sentence(rng, 6)])
+    return out.getvalue().encode("utf-8")
+
+
+def make_json(items: int, rng: random.Random) -> bytes:
+    data = [{"id": i, "name": rng.choice(WORDS), "tags": rng.sample(WORDS, 3), "text": _sentence(rng)} for i in range(items)]
+    return json.dumps(data).encode("utf-8")
+
+
+def make_image(size, rng: random.Random) -> bytes:
+    """生成带文字的 PNG；未安装 Pillow 时返回空"""
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return b""
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for y in range(20, size[1] - 20, 24):
+        draw.text((20, y), _sentence(rng, 8), fill="black")
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+def generate(out_dir: Path, seed: int = 42) -> Dict[str, List[Path]]:
+    """生成全部语料，返回 {类型: [文件路径...]}"""
+    rng = random.Random(seed)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    corpus: Dict[str, List[Path]] = {"pdf": [], "docx": [], "csv": [], "json": [], "image": []}
+    plan = (
+        [("pdf", f"{name}.pdf", make_pdf, n) for name, n in PDF_SPECS.items()]
+        + [("docx", f"{name}.docx", make_docx, n) for name, n in DOCX_SPECS.items()]
+        + [("csv", f"{name}.csv", make_csv, n) for name, n in CSV_SPECS.items()]
+        + [("json", f"{name}.json", make_json, n) for name, n in JSON_SPECS.items()]
+        + [("image", f"{name}.png", make_image, n) for name, n in IMAGE_SPECS.items()]
+    )
+    for kind, filename, builder, arg in plan:
+        data = builder(arg, rng)
+        if not data:
+            continue
+        path = out_dir / filename
+        path.write_bytes(data)
+        corpus[kind].append(path)
+    return corpus
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成压测语料")
+    parser.add_argument("--out", default="bench_corpus")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    for kind, paths in generate(Path(args.out), args.seed).items():
+        for path in paths:
+            print(f"{kind:6s} {path} ({path.stat().st_size / 1024:.1f}KB)")
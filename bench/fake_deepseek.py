@@ -0,0 +1,78 @@
+"""本地 DeepSeek chat-completions 桩服务，供压测使用
+
+可单独运行：
+    python bench/fake_deepseek.py --port 9000 --latency 0.5
+然后设置 DEEPSEEK_BASE_URL=http://127.0.0.1:9000/v1/chat/completions
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from aiohttp import web
+
+
+def create_app(latency: float = 0.2, chunk_delay: float = 0.02, reply_tokens: int = 50) -> web.Application:
+    """创建桩服务
+
+    Args:
+        latency (float): 返回首个字节前的等待时间（秒）
+        chunk_delay (float): 流式模式下相邻数据块的间隔（秒）
+        reply_tokens (int): 回复包含的片段数
+    """
+    stats = {"requests": 0, "stream_requests": 0}
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        stats["requests"] += 1
+        pieces = [f"token{i} " for i in range(reply_tokens)]
+        await asyncio.sleep(latency)
+        if not payload.get("stream"):
+            return web.json_response({
+                "id": "bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(pieces)}, "finish_reason": "stop"}],
+            })
+        stats["stream_requests"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for piece in pieces:
+            chunk = {"choices": [{"index": 0, "delta": {"content": piece}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            await asyncio.sleep(chunk_delay)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+async def start(host: str = "127.0.0.1", port: int = 9000, **kwargs) -> web.AppRunner:
+    """在当前事件循环中启动桩服务，返回 runner，调用方负责 runner.cleanup()"""
+    runner = web.AppRunner(create_app(**kwargs))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地 DeepSeek 桩服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    parser.add_argument("--reply-tokens", type=int, default=50)
+    args = parser.parse_args()
+    web.run_app(
+        create_app(args.latency, args.chunk_delay, args.reply_tokens),
+        host=args.host,
+        port=args.port,
+    )
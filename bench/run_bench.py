@@ -0,0 +1,338 @@
+"""doc_service / ocr_service 压测脚本
+
+默认会生成语料、启动本地 DeepSeek 桩服务，并以子进程方式启动两个服务
+（关闭结果缓存），按场景压测后输出 JSON：
+
+    python bench/run_bench.py --concurrency 8 --requests 100 --output bench_result.json
+
+压测已在运行的服务时加 --no-spawn，此时不统计服务进程内存。
+
+默认每个请求的内容各不相同，避免相同请求被服务端的并发合并（SingleFlight）吸收；
+加 --same-payload 时所有请求发送同一份内容，用于衡量合并的效果。
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).parent))
+import corpus  # noqa: E402
+import fake_deepseek  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCH_TOKEN = "bench-token"
+
+SAMPLE_CODE = "\n".join(
+    f"def handler_{i}(request):\n    data = request.json()\n    return {{'id': {i}, 'ok': bool(data)}}\n"
+    for i in range(50)
+)
+
+
+def _process_tree_rss(pid: int) -> int:
+    """返回进程及其所有子进程的 RSS 之和（字节），仅支持 Linux /proc"""
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    stack.extend(int(c) for c in f.read().split())
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+    return total
+
+
+class RSSSampler:
+    """后台定期采样服务进程树的 RSS，记录峰值"""
+
+    def __init__(self, pids: Dict[str, int], interval: float = 0.1):
+        self.pids = pids
+        self.interval = interval
+        self.peaks = {name: 0 for name in pids}
+        self._task: Optional[asyncio.Task] = None
+
+    def reset(self):
+        self.peaks = {name: 0 for name in self.pids}
+
+    async def _run(self):
+        while True:
+            for name, pid in self.pids.items():
+                self.peaks[name] = max(self.peaks[name], _process_tree_rss(pid))
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.pids and sys.platform.startswith("linux"):
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # nearest-rank 定义
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Scenario:
+    # send(session, index)：index 为场景内的请求序号，用于生成互不相同的请求内容
+    def __init__(self, name: str, service: str, send: Callable[[aiohttp.ClientSession, int], "asyncio.Future"]):
+        self.name = name
+        self.service = service
+        self.send = send
+
+
+def build_scenarios(files: Dict[str, List[Path]], doc_url: str, ocr_url: str, unique: bool = True) -> List[Scenario]:
+    """unique 为 True 时每个请求的内容互不相同：
+
+    - /extract 按序号调整 max_chars（参与服务端的去重键，文本上限只相差请求数个字符）
+    - 图片在 PNG 结束块之后附加序号，解码时被忽略
+    - 代码分析在末尾附加一行注释
+    """
+    headers = {"Authorization": f"Bearer {BENCH_TOKEN}"}
+
+    def upload(url: str, path: Path, field: str = "file", vary: Optional[str] = None):
+        content = path.read_bytes()
+
+        async def send(session: aiohttp.ClientSession, index: int):
+            data = aiohttp.FormData()
+            body = content + f"bench-{index}".encode() if unique and vary == "trailer" else content
+            data.add_field(field, body, filename=path.name)
+            if unique and vary == "max_chars":
+                data.add_field("max_chars", str(5000 + index))
+            async with session.post(url, headers=headers, data=data) as resp:
+                await resp.read()
+                return resp.status, None
+        return send
+
+    def analyze(payload: dict):
+        async def send(session: aiohttp.ClientSession, index: int):
+            start = time.perf_counter()
+            first_byte = None
+            body = {**payload, "code": f"{payload['code']}\n# bench request {index}\n"} if unique else payload
+            async with session.post(f"{doc_url}/v1/analyze", headers=headers, json=body) as resp:
+                async for _ in resp.content.iter_any():
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - start
+            return resp.status, first_byte
+        return send
+
+    scenarios = []
+    for kind in ("pdf", "docx", "csv", "json"):
+        for path in files.get(kind, []):
+            scenarios.append(Scenario(
+                f"extract_{kind}_{path.stem}", "doc_service", upload(f"{doc_url}/extract", path, vary="max_chars"),
+            ))
+    for path in files.get("image", []):
+        scenarios.append(Scenario(f"ocr_{path.stem}", "ocr_service", upload(f"{ocr_url}/ocr", path, vary="trailer")))
+    scenarios.append(Scenario("analyze_ast", "doc_service", analyze({"code": SAMPLE_CODE})))
+    scenarios.append(Scenario("analyze_llm", "doc_service", analyze({"code": SAMPLE_CODE, "use_deepseek": True})))
+    scenarios.append(Scenario(
+        "analyze_llm_stream", "doc_service",
+        analyze({"code": SAMPLE_CODE, "use_deepseek": True, "stream": True}),
+    ))
+    for path in files.get("image", [])[:1]:
+        scenarios.append(Scenario(
+            f"ocr_and_analyze_{path.stem}", "ocr_service",
+            upload(f"{ocr_url}/ocr_and_analyze", path, vary="trailer"),
+        ))
+    return scenarios
+
+
+async def run_scenario(scenario: Scenario, session: aiohttp.ClientSession, total: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    first_bytes: List[float] = []
+    errors: Dict[str, int] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker():
+        while True:
+            try:
+                index = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                status, first_byte = await scenario.send(session, index)
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            if status != 200:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            if first_byte is not None:
+                first_bytes.append(first_byte)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    def summary(values: List[float]) -> dict:
+        return {
+            "p50": round(percentile(values, 50) * 1000, 2),
+            "p95": round(percentile(values, 95) * 1000, 2),
+            "p99": round(percentile(values, 99) * 1000, 2),
+            "mean": round(statistics.mean(values) * 1000, 2) if values else 0.0,
+            "max": round(max(values) * 1000, 2) if values else 0.0,
+        }
+
+    result = {
+        "service": scenario.service,
+        "requests": total,
+        "ok": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": summary(latencies),
+    }
+    if first_bytes:
+        result["first_byte_ms"] = summary(first_bytes)
+    return result
+
+
+def spawn_service(name: str, port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT / name,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_healthy(session: aiohttp.ClientSession, url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(f"{url}/health") as resp:
+                if resp.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.3)
+    raise RuntimeError(f"服务未在 {timeout}s 内就绪: {url}")
+
+
+async def main(args) -> dict:
+    corpus_dir = Path(args.corpus) if args.corpus else Path(tempfile.mkdtemp(prefix="bench_corpus_"))
+    files = corpus.generate(corpus_dir)
+    stub = await fake_deepseek.start(
+        port=args.llm_port, latency=args.llm_latency, chunk_delay=args.llm_chunk_delay,
+    )
+    processes: Dict[str, subprocess.Popen] = {}
+    doc_url, ocr_url = args.doc_url, args.ocr_url
+    if args.spawn:
+        env = dict(
+            os.environ,
+            TOKEN=BENCH_TOKEN,
+            DEEPSEEK_API_KEY="bench",
+            DEEPSEEK_BASE_URL=f"http://127.0.0.1:{args.llm_port}/v1/chat/completions",
+        )
+        if not args.with_cache:
+            env["RESULT_CACHE_MAX_BYTES"] = "0"
+            env["RESULT_CACHE_DB"] = ""
+        processes["doc_service"] = spawn_service("doc_service", args.doc_port, env)
+        # ocr_and_analyze 调用本次启动的 doc_service，而不是 .env 或环境中配置的地址
+        processes["ocr_service"] = spawn_service("ocr_service", args.ocr_port, dict(
+            env, DOC_SERVICE_URL=f"http://127.0.0.1:{args.doc_port}", DOC_SERVICE_SOCKET="",
+        ))
+        doc_url, ocr_url = f"http://127.0.0.1:{args.doc_port}", f"http://127.0.0.1:{args.ocr_port}"
+
+    sampler = RSSSampler({name: p.pid for name, p in processes.items()})
+    connector = aiohttp.TCPConnector(limit=args.concurrency * 2)
+    results = {}
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as session:
+            for url in (doc_url, ocr_url):
+                await wait_healthy(session, url)
+            sampler.start()
+            for scenario in build_scenarios(files, doc_url, ocr_url, unique=not args.same_payload):
+                if args.scenarios and not any(scenario.name.startswith(s) for s in args.scenarios):
+                    continue
+                sampler.reset()
+                result = await run_scenario(scenario, session, args.requests, args.concurrency)
+                if scenario.service in sampler.peaks:
+                    result["peak_rss_mb"] = round(sampler.peaks[scenario.service] / 1024 / 1024, 1)
+                results[scenario.name] = result
+                print(
+                    f"{scenario.name:32s} rps={result['rps']:8.2f} p50={result['latency_ms']['p50']:9.2f}ms "
+                    f"p99={result['latency_ms']['p99']:9.2f}ms errors={sum(result['errors'].values())}",
+                    file=sys.stderr,
+                )
+    finally:
+        sampler.stop()
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        await stub.cleanup()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "llm_latency": args.llm_latency,
+            "cache": args.with_cache,
+            "same_payload": args.same_payload,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="doc_service / ocr_service 压测")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50, help="每个场景的请求数")
+    parser.add_argument("--scenarios", nargs="*", help="只运行名称以这些前缀开头的场景")
+    parser.add_argument("--output", help="结果 JSON 输出路径，默认打印到标准输出")
+    parser.add_argument("--corpus", help="语料目录，默认使用临时目录")
+    parser.add_argument("--no-spawn", dest="spawn", action="store_false", help="压测已在运行的服务")
+    parser.add_argument("--with-cache", action="store_true", help="启动服务时保留结果缓存")
+    parser.add_argument("--same-payload", action="store_true", help="所有请求发送相同内容（会被服务端并发合并）")
+    parser.add_argument("--doc-url", default="http://127.0.0.1:4000")
+    parser.add_argument("--ocr-url", default="http://127.0.0.1:4001")
+    parser.add_argument("--doc-port", type=int, default=4000)
+    parser.add_argument("--ocr-port", type=int, default=4001)
+    parser.add_argument("--llm-port", type=int, default=19000)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-chunk-delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        print(output)
@@ -0,0 +1,98 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List
+
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+_WORD_PATTERN = re.compile(r'[A-Za-z0-9_]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+')
+_CAMEL_PATTERN = re.compile(r'[A-Z]?[a-z0-9]+|[A-Z]+(?![a-z])')
+
+
+def estimate_tokens(text: str) -> int:
+    """本地粗略估算 token 数：中日韩字符约1个/字，其余约4字符/个，另加每条消息的固定开销"""
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk) // 4 + 4
+
+
+def tokenize(text: str) -> List[str]:
+    """检索用分词：英文/标识符按 snake_case、camelCase 拆分并小写，中日韩文本按二元组切分"""
+    terms = []
+    for word in _WORD_PATTERN.findall(text):
+        if _CJK_PATTERN.match(word):
+            if len(word) == 1:
+                terms.append(word)
+            terms.extend(word[i:i + 2] for i in range(len(word) - 1))
+            continue
+        lower = word.lower()
+        terms.append(lower)
+        parts = [p.lower() for piece in word.split('_') for p in _CAMEL_PATTERN.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+def split_chunks(content: str, chunk_tokens: int = 400, overlap_lines: int = 2) -> List[Dict]:
+    """按行把内容切成约 chunk_tokens 大小的片段，相邻片段重叠 overlap_lines 行
+
+    Returns:
+        List[Dict]: 每个片段含 text、start_line、end_line（从1开始）
+    """
+    # 过长的行（如服务端压缩成一行的文档文本）先按字符切开，行号仍指向原始行
+    lines, line_numbers = [], []
+    for number, line in enumerate(content.splitlines(), 1):
+        tokens = estimate_tokens(line)
+        width = max(1, len(line) * chunk_tokens // tokens) if tokens > chunk_tokens else len(line) or 1
+        for i in range(0, max(len(line), 1), width):
+            lines.append(line[i:i + width])
+            line_numbers.append(number)
+    chunks = []
+    start = 0
+    while start < len(lines):
+        end = start
+        tokens = 0
+        while end < len(lines) and (tokens == 0 or tokens + estimate_tokens(lines[end]) <= chunk_tokens):
+            tokens += estimate_tokens(lines[end])
+            end += 1
+        chunks.append({
+            "text": "\n".join(lines[start:end]),
+            "start_line": line_numbers[start],
+            "end_line": line_numbers[end - 1],
+        })
+        if end >= len(lines):
+            break
+        start = max(end - overlap_lines, start + 1)
+    return chunks
+
+
+class ChunkIndex:
+    """内存 BM25 索引，用于为每个问题挑选最相关的片段"""
+
+    def __init__(self, chunks: List[Dict], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self._tfs = [Counter(tokenize(c["text"])) for c in chunks]
+        self._lengths = [sum(tf.values()) for tf in self._tfs]
+        self._avg_len = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        df = Counter()
+        for tf in self._tfs:
+            df.update(tf.keys())
+        n = len(chunks)
+        self._idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def search(self, query: str, top_k: int = 4) -> List[Dict]:
+        """返回得分最高的 top_k 个片段，按原文顺序排列；无任何匹配时返回开头的片段"""
+        terms = set(tokenize(query))
+        scores = []
+        for i, tf in enumerate(self._tfs):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / (self._avg_len or 1))
+            for t in terms:
+                f = tf.get(t)
+                if f:
+                    score += self._idf[t] * f * (self.k1 + 1) / (f + norm)
+            scores.append(score)
+        ranked = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        picked = [i for i in ranked[:top_k] if scores[i] > 0] or list(range(min(top_k, len(self.chunks))))
+        return [self.chunks[i] for i in sorted(picked)]
+
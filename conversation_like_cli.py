@@ -1,33 +1,152 @@
+import time
+# 尽早记录，用于统计启动耗时
+_IMPORT_START = time.perf_counter()
 import asyncio
 import json
 import os
-import aiohttp
+import re
 from pathlib import Path
-from typing import List, Dict
+from typing import TYPE_CHECKING, List, Dict, Callable, Optional, Tuple
 from dotenv import load_dotenv
+from context_index import ChunkIndex, estimate_tokens, split_chunks
+from llm_cache import LLMCache, cache_key, cacheable
+
+if TYPE_CHECKING:
+    # aiohttp 导入较慢，首次发起网络请求时才导入
+    import aiohttp
 
 # 加载环境变量
 load_dotenv()
 
-# 调试：验证 .env 文件加载
-print(f"🔍 当前工作目录: {os.getcwd()}")
-print(f"🔍 .env 文件是否存在: {Path('.env').exists()}")
-print(f"🔍 TOKEN 值: {os.getenv('TOKEN')}")
-print(f"🔍 DEEPSEEK_API_KEY 值: {os.getenv('DEEPSEEK_API_KEY')[:10] if os.getenv('DEEPSEEK_API_KEY') else 'None'}...")
-print("-" * 50)
+def print_diagnostics(started: float):
+    """CLI_DEBUG=1 时打印 .env 加载情况和启动耗时"""
+    print(f"🔍 当前工作目录: {os.getcwd()}")
+    print(f"🔍 .env 文件是否存在: {Path('.env').exists()}")
+    print(f"🔍 TOKEN 值: {os.getenv('TOKEN')[:10] if os.getenv('TOKEN') else 'None'}...")
+    print(f"🔍 DEEPSEEK_API_KEY 值: {os.getenv('DEEPSEEK_API_KEY')[:10] if os.getenv('DEEPSEEK_API_KEY') else 'None'}...")
+    print(f"🔍 启动耗时: 导入 {(started - _IMPORT_START) * 1000:.0f}ms, 初始化 {(time.perf_counter() - started) * 1000:.0f}ms")
+    print("-" * 50)
+
+# 本地直接读取、交给文档服务、交给 OCR 服务的文件类型
+LOCAL_TYPES = ('.py', '.js', '.java', '.cpp', '.c', '.go', '.md', '.yaml', '.yml', '.sh', '.txt')
+DOC_SERVICE_TYPES = ('.pdf', '.docx', '.json', '.csv')
+OCR_SERVICE_TYPES = ('.png', '.jpg', '.jpeg')
+SUPPORTED_TYPES = LOCAL_TYPES + DOC_SERVICE_TYPES + OCR_SERVICE_TYPES
+# 上传目录时跳过的子目录（另外跳过所有隐藏目录）
+SKIP_DIRS = {'__pycache__', 'node_modules', 'venv', 'env', 'dist', 'build'}
+
+class SharedSession:
+    """CLI 进程内共享的 aiohttp 会话，复用 keep-alive 连接"""
 
-class DeepSeekAPI:
     def __init__(self):
+        self._session = None
+        self.connections_created = 0
+        self.connections_reused = 0
+
+    async def get(self) -> "aiohttp.ClientSession":
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            trace = aiohttp.TraceConfig()
+
+            async def on_create(session, ctx, params):
+                self.connections_created += 1
+
+            async def on_reuse(session, ctx, params):
+                self.connections_reused += 1
+
+            trace.on_connection_create_end.append(on_create)
+            trace.on_connection_reuseconn.append(on_reuse)
+            connector = aiohttp.TCPConnector(
+                limit=int(os.getenv("HTTP_POOL_LIMIT", "20")),
+                limit_per_host=int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "10")),
+                ttl_dns_cache=int(os.getenv("HTTP_DNS_TTL", "300")),
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    total=float(os.getenv("HTTP_TIMEOUT", "120")),
+                    connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", "10")),
+                ),
+                trace_configs=[trace],
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+class ConversationHistory:
+    """按 token 预算压缩的对话历史
+
+    最近的消息原样保留；超出预算时最早的消息被移出窗口，只保留截断后的
+    摘要行，并作为一条 system 消息放在窗口之前。文件内容由调用方作为上下文
+    单独传入，不写入历史，保证每轮请求中只出现一次。
+    """
+
+    def __init__(self, budget: int = None, keep_messages: int = 4, summary_chars: int = 200, max_summary_lines: int = 20):
+        self.budget = budget or int(os.getenv("CLI_HISTORY_TOKENS", "6000"))
+        self.keep_messages = keep_messages
+        self.summary_chars = summary_chars
+        self.max_summary_lines = max_summary_lines
+        self.messages: List[Dict] = []
+        self.summary: List[str] = []
+    
+    def append(self, role: str, content: str):
+        self.messages.append({"role": role, "content": content})
+    
+    def clear(self):
+        self.messages = []
+        self.summary = []
+    
+    def _summary_message(self) -> Optional[Dict]:
+        if not self.summary:
+            return None
+        return {"role": "system", "content": "此前对话摘要：\n" + "\n".join(self.summary)}
+    
+    def _tokens(self) -> int:
+        total = sum(estimate_tokens(m["content"]) for m in self.messages)
+        summary = self._summary_message()
+        return total + (estimate_tokens(summary["content"]) if summary else 0)
+    
+    def compact(self, reserved: int = 0):
+        """把历史压缩到 budget - reserved 以内（reserved 为上下文和本轮输入占用的 token）"""
+        limit = self.budget - reserved
+        while len(self.messages) > self.keep_messages and self._tokens() > limit:
+            evicted = self.messages.pop(0)
+            line = re.sub(r'\s+', ' ', evicted["content"]).strip()[:self.summary_chars]
+            self.summary.append(f"{'用户' if evicted['role'] == 'user' else '助手'}: {line}")
+            self.summary = self.summary[-self.max_summary_lines:]
+    
+    def build(self, reserved: int = 0) -> List[Dict]:
+        """压缩后返回要发送的历史消息"""
+        self.compact(reserved)
+        summary = self._summary_message()
+        return ([summary] if summary else []) + list(self.messages)
+
+class DeepSeekAPI:
+    def __init__(self, http: SharedSession):
+        self.http = http
         self.api_key = os.getenv("DEEPSEEK_API_KEY")
-        self.base_url = "https://api.deepseek.com/v1/chat/completions"
+        self.base_url = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1/chat/completions")
+        self.temperature = float(os.getenv("CLI_TEMPERATURE", "0.7"))
+        # 回复缓存，默认放在用户目录下，跨会话复用
+        self.cache = LLMCache(os.getenv("LLM_CACHE_DB") or str(Path.home() / ".cache" / "ds_cli" / "llm_cache.db"))
     
-    async def call(self, prompt: str):
+    async def call(self, prompt: str, on_token: Optional[Callable[[str], None]] = None, **cache_options):
         """单次调用"""
         messages = [{"role": "user", "content": prompt}]
-        return await self.call_with_history(messages)
+        return await self.call_with_history(messages, on_token, **cache_options)
     
-    async def call_with_history(self, messages: List[Dict]):
-        """带历史记录的调用"""
+    async def call_with_history(self, messages: List[Dict], on_token: Optional[Callable[[str], None]] = None,
+                                cache: bool = False, force_cache: bool = False):
+        """带历史记录的调用
+
+        传入 on_token 时以流式方式请求，每收到一段内容就回调一次，最终仍返回完整回复。
+        cache=True 且 temperature 为 0（或 force_cache=True）时先查回复缓存，
+        命中则直接返回（流式模式下一次性回调完整回复）。
+        """
         try:
             headers = {
                 "Authorization": f"Bearer {self.api_key}",
@@ -37,34 +156,88 @@ class DeepSeekAPI:
             data = {
                 "model": "deepseek-coder",
                 "messages": messages,
-                "temperature": 0.7,
+                "temperature": self.temperature,
                 "max_tokens": 2000
             }
+            key = cache_key(data)
+            use_cache = cache and cacheable(data, force_cache)
+            if use_cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    if on_token is not None:
+                        on_token(cached["content"])
+                    return cached["content"]
+            import aiohttp
+
+            kwargs = {}
+            if on_token is not None:
+                data["stream"] = True
+                # 流式响应不限总时长，只限制数据块间隔
+                kwargs["timeout"] = aiohttp.ClientTimeout(total=None, sock_read=float(os.getenv("HTTP_TIMEOUT", "120")))
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.base_url, headers=headers, json=data) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise Exception(f"DeepSeek API错误 (状态码: {response.status}): {error_text}")
-                    
+            session = await self.http.get()
+            async with session.post(self.base_url, headers=headers, json=data, **kwargs) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise Exception(f"DeepSeek API错误 (状态码: {response.status}): {error_text}")
+                
+                if on_token is not None:
+                    content = await self._read_stream(response, on_token)
+                else:
                     result = await response.json()
                     if "choices" not in result or not result["choices"]:
                         print(f"⚠️ DeepSeek API返回异常: {result}")
                         return "DeepSeek API调用失败，无法获取响应"
-                    
-                    return result["choices"][0]["message"]["content"]
+                    content = result["choices"][0]["message"]["content"]
+            if use_cache:
+                self.cache.set(key, {"content": content})
+            return content
         except Exception as e:
             print(f"❌ DeepSeek API调用失败: {e}")
             return f"DeepSeek API调用失败: {str(e)}"
+    
+    @staticmethod
+    async def _read_stream(response: "aiohttp.ClientResponse", on_token: Callable[[str], None]) -> str:
+        """解析 SSE 流（data: {...} 行），逐段回调并拼接完整回复"""
+        parts = []
+        async for line in response.content:
+            line = line.decode('utf-8').strip()
+            if not line.startswith("data:"):
+                continue
+            chunk = line[5:].strip()
+            if chunk == "[DONE]":
+                break
+            choices = json.loads(chunk).get("choices") or []
+            content = choices[0].get("delta", {}).get("content") if choices else None
+            if content:
+                parts.append(content)
+                on_token(content)
+        return "".join(parts)
 
 class CursorLikeCLI:
     def __init__(self):
-        self.deepseek_api = DeepSeekAPI()
-        self.conversation_history = []
+        self.http = SharedSession()
+        self.deepseek_api = DeepSeekAPI(self.http)
+        self.conversation_history = ConversationHistory()
         self.current_context = {}
+        # 已上传的文件（按路径），多个文件时合并为 project 上下文
+        self.context_files: Dict[str, Dict] = {}
+        # 多文件上传：并发数与单次最多文件数
+        self.upload_concurrency = int(os.getenv("CLI_UPLOAD_CONCURRENCY", "8"))
+        self.upload_max_files = int(os.getenv("CLI_UPLOAD_MAX_FILES", "200"))
+        # 大文件检索：内容超过阈值时只发送与问题最相关的片段
+        self.context_index = None
+        self.retrieval_threshold = int(os.getenv("CLI_RETRIEVAL_THRESHOLD", "3000"))
+        self.chunk_tokens = int(os.getenv("CLI_CHUNK_TOKENS", "400"))
+        self.top_k = int(os.getenv("CLI_TOP_K", "4"))
         self.doc_service_url = "http://47.106.218.33:4000"
         self.ocr_service_url = "http://47.106.218.33:4001"
         self.token = os.getenv("TOKEN")
+        # 流式输出：逐段打印回复，设置 CLI_STREAM=0 可关闭
+        self.stream = os.getenv("CLI_STREAM", "1") != "0"
+        # 回复缓存：CLI_LLM_CACHE=1 在 temperature 为 0 时启用，=force 时总是启用
+        cache_mode = os.getenv("CLI_LLM_CACHE", "0")
+        self.cache_options = {"cache": cache_mode in ("1", "force"), "force_cache": cache_mode == "force"}
         
         # 如果 .env 文件没有加载成功，手动设置 TOKEN
         if not self.token:
@@ -85,91 +258,143 @@ class CursorLikeCLI:
         else:
             print("✅ DeepSeek API Key 已加载")
     
-    async def upload_and_process(self, file_path: str):
-        """上传并预处理文件"""
-        file_path = Path(file_path)
+    async def upload_and_process(self, target: str):
+        """上传并预处理文件，target 可以是文件、目录或通配符（如 src/**/*.py）
+
+        多个文件并发处理（最多 upload_concurrency 个同时进行），共用同一个连接池；
+        处理结果加入多文件上下文，已上传的同路径文件被替换。
+        """
+        paths = self._expand_target(target)
+        if not paths:
+            print(f"❌ 没有找到可处理的文件：{target}")
+            return
+        if len(paths) > self.upload_max_files:
+            print(f"⚠️ 匹配到 {len(paths)} 个文件，只处理前 {self.upload_max_files} 个")
+            paths = paths[:self.upload_max_files]
         
-        if not file_path.exists():
-            print(f"❌ 文件不存在：{file_path}")
+        print(f"📁 正在处理 {len(paths)} 个文件（并发 {self.upload_concurrency}）")
+        semaphore = asyncio.Semaphore(self.upload_concurrency)
+        
+        async def load(path: Path) -> Tuple[Path, Optional[Dict]]:
+            async with semaphore:
+                return path, await self._load_file(path)
+        
+        loaded = 0
+        for done, next_done in enumerate(asyncio.as_completed([load(p) for p in paths]), 1):
+            path, entry = await next_done
+            if entry is None:
+                print(f"   [{done}/{len(paths)}] ❌ {path}")
+                continue
+            self.context_files[entry["file_path"]] = entry
+            loaded += 1
+            print(f"   [{done}/{len(paths)}] ✅ {path} (~{estimate_tokens(entry['content'])} tokens)")
+        if not loaded:
             return
         
-        print(f"📁 正在处理文件：{file_path}")
-        #更新支持
-        supported_local_types = ['.py', '.js', '.java', '.cpp', '.c', '.go', '.md','.yaml','.yml','txt','.sh','.txt','csv','json']
-        doc_service_types = ['.pdf', '.docx', '.yaml', '.yml', '.json', '.csv']
+        # 合并多文件上下文，大内容建立检索索引，然后初始化对话
+        self._refresh_context()
+        self._build_index()
+        await self.initialize_conversation()
+    
+    def _expand_target(self, target: str) -> List[Path]:
+        """把 upload 参数展开为待处理文件列表：目录递归查找支持的类型，通配符按 glob 匹配"""
+        path = Path(target).expanduser()
+        if any(c in target for c in "*?["):
+            anchor = Path(path.anchor) if path.is_absolute() else Path(".")
+            pattern = str(path.relative_to(anchor)) if path.is_absolute() else target
+            candidates = anchor.glob(pattern)
+        elif path.is_dir():
+            candidates = (p for p in path.rglob("*") if not any(
+                part in SKIP_DIRS or part.startswith(".") for part in p.relative_to(path).parts[:-1]
+            ))
+        elif path.exists():
+            return [path]
+        else:
+            return []
+        return sorted(p for p in candidates if p.is_file() and p.suffix.lower() in SUPPORTED_TYPES)
+    
+    async def _load_file(self, file_path: Path) -> Optional[Dict]:
+        """读取或调用服务提取单个文件的内容，失败返回 None"""
         file_ext = file_path.suffix.lower()
-        if file_ext in supported_local_types:
-            #直接读取
+        if file_ext in LOCAL_TYPES:
+            # 直接读取
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                self.current_context = {
-                    "type": "code" if file_path.suffix.lower() != '.md' else "markdown",
-                    "language": file_path.suffix[1:],
-                    "content": content,
-                    "file_path": str(file_path)
-                }
+                content = await asyncio.to_thread(file_path.read_text, encoding='utf-8')
             except Exception as e:
-                print(f"❌ 文件读取失败: {e}")
-                return
-        elif file_ext in doc_service_types:
-            # 调用文档服务的文件类型
-            content = await self._call_doc_service(file_path)
-            self.current_context = {
-                "type": "document",
-                "content": content,
-                "file_path": str(file_path)
-            }
-        elif file_ext in ocr_service_types:
-            # 调用 OCR 服务的文件类型
-            content = await self._call_ocr_service(file_path)
-            self.current_context = {
-                "type": "image",
-                "content": content,
-                "file_path": str(file_path)
-            }
-            # 代码文件或 Markdown
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            self.current_context = {
-                "type": "code" if file_path.suffix.lower() != '.md' else "markdown",
-                "language": file_path.suffix[1:],
+                print(f"❌ 文件读取失败: {file_path}, {e}")
+                return None
+            return {
+                "type": "code" if file_ext != '.md' else "markdown",
+                "language": file_ext[1:],
                 "content": content,
                 "file_path": str(file_path)
             }
-            
-        elif file_path.suffix.lower() in ['.png', '.jpg', '.jpeg']:
+        if file_ext in DOC_SERVICE_TYPES:
+            # 调用文档服务的文件类型
+            content = await self._call_doc_service(file_path)
+            if content is None:
+                return None
+            return {"type": "document", "content": content, "file_path": str(file_path)}
+        if file_ext in OCR_SERVICE_TYPES:
             # 图片文件 - 调用 OCR 服务
             content = await self._call_ocr_service(file_path)
-            self.current_context = {
-                "type": "image",
-                "content": content,
-                "file_path": str(file_path)
-            }
-            
-        elif file_path.suffix.lower() in ['.pdf', '.docx']:
-            # 文档文件 - 调用文档服务
-            content = await self._call_doc_service(file_path)
-            self.current_context = {
-                "type": "document",
-                "content": content,
-                "file_path": str(file_path)
-            }
-        else:
-            print(f"❌ 不支持的文件类型：{file_path.suffix}")
+            if content is None:
+                return None
+            return {"type": "image", "content": content, "file_path": str(file_path)}
+        print(f"❌ 不支持的文件类型：{file_path.suffix}")
+        return None
+    
+    def _refresh_context(self):
+        """由已上传的文件生成 current_context：单个文件保持原样，多个文件合并为 project 上下文"""
+        files = list(self.context_files.values())
+        if len(files) == 1:
+            self.current_context = dict(files[0])
             return
-        
-        # 初始化对话
-        await self.initialize_conversation()
+        sections = []
+        for entry in files:
+            fence = entry.get("language", "")
+            sections.append(f"### {entry['file_path']}\n```{fence}\n{entry['content']}\n```")
+        self.current_context = {
+            "type": "project",
+            "content": "\n\n".join(sections),
+            "file_path": f"{len(files)} 个文件",
+            "files": [entry["file_path"] for entry in files]
+        }
+    
+    def _build_index(self):
+        content = self.current_context.get("content") or ""
+        if estimate_tokens(content) > self.retrieval_threshold:
+            # 按文件分别切段，片段记录所属文件，检索结果可以标注来源
+            chunks = []
+            for entry in self.context_files.values():
+                for chunk in split_chunks(entry["content"], self.chunk_tokens):
+                    chunks.append({**chunk, "file_path": entry["file_path"]})
+            self.context_index = ChunkIndex(chunks)
+            print(f"📚 内容较大，已切分为 {len(self.context_index.chunks)} 段，每轮只发送最相关的 {self.top_k} 段")
+        else:
+            self.context_index = None
     
-    async def _call_ocr_service(self, file_path: Path):
-        """调用 OCR 服务"""
+    def _context_content(self, query: str = "") -> str:
+        """返回本轮要发送的文件内容：小文件为全文，大文件为检索出的片段"""
+        if self.context_index is None:
+            return self.current_context["content"]
+        chunks = self.context_index.search(query, self.top_k)
+        multi = len(self.context_files) > 1
+        sections = [
+            f"[{c['file_path'] + ' ' if multi else ''}第 {c['start_line']}-{c['end_line']} 行]\n{c['text']}" for c in chunks
+        ]
+        return "（内容较大，以下为节选）\n" + "\n...\n".join(sections)
+    
+    async def _call_ocr_service(self, file_path: Path) -> Optional[str]:
+        """调用 OCR 服务，返回识别文本，失败返回 None"""
+        import aiohttp
+
         try:
             headers = {"Authorization": f"Bearer {self.token}"}
-            data = aiohttp.FormData()
-            data.add_field('file', open(file_path, 'rb'), filename=file_path.name)
-            
-            async with aiohttp.ClientSession() as session:
+            session = await self.http.get()
+            with open(file_path, 'rb') as f:
+                data = aiohttp.FormData()
+                data.add_field('file', f, filename=file_path.name)
                 async with session.post(f"{self.ocr_service_url}/ocr", headers=headers, data=data) as response:
                     if response.status != 200:
                         error_text = await response.text()
@@ -178,20 +403,24 @@ class CursorLikeCLI:
                     result = await response.json()
                     if "text" not in result:
                         print(f"⚠️ OCR服务返回异常: {result}")
-                        return "OCR识别失败，无法获取文本内容"
+                        return None
                     return result["text"]
         except Exception as e:
             print(f"❌ OCR服务调用失败: {e}")
-            return f"OCR处理失败: {str(e)}"
+            return None
     
-    async def _call_doc_service(self, file_path: Path):
-        """调用文档服务"""
+    async def _call_doc_service(self, file_path: Path) -> Optional[str]:
+        """调用文档服务，返回提取的文本，失败返回 None"""
+        import aiohttp
+
         try:
             headers = {"Authorization": f"Bearer {self.token}"}
-            data = aiohttp.FormData()
-            data.add_field('file', open(file_path, 'rb'), filename=file_path.name)
-            
-            async with aiohttp.ClientSession() as session:
+            session = await self.http.get()
+            with open(file_path, 'rb') as f:
+                data = aiohttp.FormData()
+                data.add_field('file', f, filename=file_path.name)
+                # 大文档由本地检索裁剪，向服务端请求更长的文本
+                data.add_field('max_chars', os.getenv("CLI_DOC_MAX_CHARS", "200000"))
                 async with session.post(f"{self.doc_service_url}/extract", headers=headers, data=data) as response:
                     if response.status != 200:
                         error_text = await response.text()
@@ -200,15 +429,16 @@ class CursorLikeCLI:
                     result = await response.json()
                     if "text" not in result:
                         print(f"⚠️ 文档服务返回异常: {result}")
-                        return "文档解析失败，无法获取文本内容"
+                        return None
                     return result["text"]
         except Exception as e:
             print(f"❌ 文档服务调用失败: {e}")
-            return f"文档处理失败: {str(e)}"
+            return None
     
     async def initialize_conversation(self):
         """初始化与 DeepSeek 的对话"""
         context_info = self.current_context
+        content = self._context_content()
         
         if context_info["type"] in ["code", "markdown"]:
             prompt = f"""
@@ -216,7 +446,7 @@ class CursorLikeCLI:
             
             文件内容：
             ```{context_info['language']}
-            {context_info['content']}
+            {content}
             ```
             
             请分析这个文件，并告诉我你理解了什么。你可以：
@@ -227,19 +457,40 @@ class CursorLikeCLI:
             
             现在你可以回答我的问题或接受我的指令。
             """
+        elif context_info["type"] == "project":
+            file_list = "\n".join(f"- {path}" for path in context_info["files"])
+            prompt = f"""
+            我已经上传了 {context_info['file_path']}：
+            {file_list}
+            
+            文件内容：
+            {content}
+            
+            请概括这些文件的整体结构和各自的作用，以及它们之间的关系。现在你可以回答我的问题或接受我的指令。
+            """
         else:
             prompt = f"""
             我已经上传了一个文件：{context_info['file_path']}
             
             提取的内容：
-            {context_info['content']}
+            {content}
             
             请分析这个内容，并告诉我你理解了什么。现在你可以回答我的问题或接受我的指令。
             """
         
-        response = await self.deepseek_api.call(prompt)
-        self.conversation_history.append({"role": "assistant", "content": response})
-        print(f"\n🤖 DeepSeek: {response}\n")
+        if self.stream:
+            print("\n🤖 DeepSeek: ", end="", flush=True)
+            response = await self.deepseek_api.call(prompt, on_token=self._print_token, **self.cache_options)
+            print("\n")
+        else:
+            response = await self.deepseek_api.call(prompt, **self.cache_options)
+            print(f"\n🤖 DeepSeek: {response}\n")
+        # 初始化提示中已包含文件内容，这里只记录回复；文件内容由 chat 作为上下文统一发送
+        self.conversation_history.append("assistant", response)
+    
+    @staticmethod
+    def _print_token(chunk: str):
+        print(chunk, end="", flush=True)
     
     async def chat(self, user_input: str):
         """多轮对话"""
@@ -248,6 +499,7 @@ class CursorLikeCLI:
         
         # 添加上下文
         context_info = self.current_context
+        content = self._context_content(user_input)
         if context_info["type"] in ["code", "markdown"]:
             messages.append({
                 "role": "system",
@@ -255,7 +507,16 @@ class CursorLikeCLI:
             })
             messages.append({
                 "role": "user", 
-                "content": f"文件内容：\n```{context_info['language']}\n{context_info['content']}\n```"
+                "content": f"文件内容：\n```{context_info['language']}\n{content}\n```"
+            })
+        elif context_info["type"] == "project":
+            messages.append({
+                "role": "system",
+                "content": f"你是一个专业的代码与文档分析助手，正在分析包含 {len(context_info['files'])} 个文件的项目。"
+            })
+            messages.append({
+                "role": "user",
+                "content": f"项目文件内容：\n{content}"
             })
         else:
             messages.append({
@@ -264,30 +525,43 @@ class CursorLikeCLI:
             })
             messages.append({
                 "role": "user",
-                "content": f"文档内容：\n{context_info['content']}"
+                "content": f"文档内容：\n{content}"
             })
         
-        # 添加对话历史
-        messages.extend(self.conversation_history)
+        # 添加对话历史（按 token 预算压缩，扣除上下文和本轮输入占用）
+        reserved = sum(estimate_tokens(m["content"]) for m in messages) + estimate_tokens(user_input)
+        messages.extend(self.conversation_history.build(reserved))
         
         # 添加当前用户输入
         messages.append({"role": "user", "content": user_input})
         
-        # 调用 DeepSeek API
-        response = await self.deepseek_api.call_with_history(messages)
+        # 调用 DeepSeek API（流式模式下边收边打印）
+        if self.stream:
+            print("\n🤖 DeepSeek: ", end="", flush=True)
+            response = await self.deepseek_api.call_with_history(messages, on_token=self._print_token, **self.cache_options)
+            print("\n")
+        else:
+            response = await self.deepseek_api.call_with_history(messages, **self.cache_options)
         
         # 更新对话历史
-        self.conversation_history.append({"role": "user", "content": user_input})
-        self.conversation_history.append({"role": "assistant", "content": response})
+        self.conversation_history.append("user", user_input)
+        self.conversation_history.append("assistant", response)
         
         return response
     
     async def interactive_mode(self):
         """交互模式"""
+        try:
+            await self._interactive_loop()
+        finally:
+            await self.http.close()
+            print(f"🔌 连接统计: 新建 {self.http.connections_created}, 复用 {self.http.connections_reused}")
+
+    async def _interactive_loop(self):
         print("🚀 欢迎使用 Cursor-like CLI！")
         print("📁 请先上传文件：")
         print("   支持：.py, .js, .java, .cpp, .c, .go, .md, .png, .jpg, .jpeg, .pdf, .docx")
-        print("   命令：upload <文件路径>")
+        print("   命令：upload <文件路径|目录|通配符>，可多次上传，文件会加入同一上下文")
         print("   退出：quit 或 exit")
         
         while True:
@@ -304,17 +578,20 @@ class CursorLikeCLI:
                     await self.upload_and_process(file_path)
                 elif user_input.startswith('clear'):
                     # 清除对话历史
-                    self.conversation_history = []
+                    self.conversation_history.clear()
                     self.current_context = {}
+                    self.context_files = {}
+                    self.context_index = None
                     print("🧹 对话历史已清除")
                 else:
                     # 普通对话
                     if not self.current_context:
-                        print("❌ 请先上传文件！使用 'upload <文件路径>' 命令")
+                        print("❌ 请先上传文件！使用 'upload <文件路径|目录|通配符>' 命令")
                         continue
                     
                     response = await self.chat(user_input)
-                    print(f"\n🤖 DeepSeek: {response}\n")
+                    if not self.stream:
+                        print(f"\n🤖 DeepSeek: {response}\n")
                     
             except KeyboardInterrupt:
                 print("\n👋 再见！")
@@ -324,5 +601,8 @@ class CursorLikeCLI:
 
 # 使用示例
 if __name__ == "__main__":
+    started = time.perf_counter()
     cli = CursorLikeCLI()
+    if os.getenv("CLI_DEBUG") == "1":
+        print_diagnostics(started)
     asyncio.run(cli.interactive_mode())
\ No newline at end of file
@@ -0,0 +1,232 @@
+import ast
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+# 分析结果格式版本，变更输出结构时递增，使旧的缓存结果失效
+ANALYSIS_VERSION = 1
+# 可用于过滤的记录类型
+NODE_TYPES = ("import", "class", "function", "method")
+
+# 每出现一次即增加一条分支路径的节点
+_BRANCH_NODES = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp, ast.ExceptHandler, ast.Assert)
+_DEF_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def text_statistics(text: str) -> Dict[str, Any]:
+    """非 Python 文本的简单统计"""
+    lines = text.split('\n')
+    return {
+        "type": "Text",
+        "statistics": {
+            "lines": len(lines),
+            "characters": len(text),
+            "words": len(text.split()),
+            "paragraphs": sum(1 for line in lines if line.strip())
+        }
+    }
+
+
+def _dotted(node: ast.AST) -> Optional[str]:
+    """把调用目标还原为 a.b.c 形式，无法还原（如 f().g）时只保留属性名"""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = _dotted(node.value)
+        return f"{base}.{node.attr}" if base else node.attr
+    return None
+
+
+def _body_nodes(func: ast.AST) -> Iterator[ast.AST]:
+    """遍历函数体，不进入嵌套的函数和类（它们单独统计）"""
+    stack = list(ast.iter_child_nodes(func))
+    while stack:
+        node = stack.pop()
+        yield node
+        if not isinstance(node, _DEF_NODES):
+            stack.extend(ast.iter_child_nodes(node))
+
+
+def _function_metrics(func: ast.AST) -> Dict[str, Any]:
+    """圈复杂度（1 + 分支数）与按首次出现排序的被调用名称"""
+    complexity = 1
+    calls: List[tuple] = []
+    for node in _body_nodes(func):
+        if isinstance(node, _BRANCH_NODES):
+            complexity += 1
+        elif isinstance(node, ast.BoolOp):
+            complexity += len(node.values) - 1
+        elif isinstance(node, ast.comprehension):
+            complexity += 1 + len(node.ifs)
+        elif isinstance(node, ast.match_case):
+            complexity += 1
+        elif isinstance(node, ast.Call):
+            name = _dotted(node.func)
+            if name:
+                calls.append((node.lineno, node.col_offset, name))
+    seen: Set[str] = set()
+    ordered = []
+    for _, _, name in sorted(calls):
+        if name not in seen:
+            seen.add(name)
+            ordered.append(name)
+    return {"complexity": complexity, "calls": ordered}
+
+
+def _import_record(node: ast.AST, scope: str, depth: int) -> Dict[str, Any]:
+    if isinstance(node, ast.Import):
+        module, names = None, [alias.name for alias in node.names]
+    else:
+        module = "." * node.level + (node.module or "")
+        names = [alias.name for alias in node.names]
+    record = {"kind": "import", "module": module, "names": names, "line": node.lineno, "depth": depth}
+    if scope:
+        record["scope"] = scope
+    return record
+
+
+def iter_records(tree: ast.Module, max_depth: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """按源码顺序逐条产出 import 与类/函数定义记录
+
+    depth 为定义的嵌套层级（顶层为1），import 的 depth 为所在作用域的层级（模块为0）。
+    max_depth 限制输出的最大层级，超过的部分不再遍历。
+    """
+
+    def visit(parent: ast.AST, scope: str, depth: int, in_class: bool) -> Iterator[Dict[str, Any]]:
+        for node in ast.iter_child_nodes(parent):
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                yield _import_record(node, scope, depth)
+            elif isinstance(node, _DEF_NODES):
+                level = depth + 1
+                if max_depth is not None and level > max_depth:
+                    continue
+                qualname = f"{scope}.{node.name}" if scope else node.name
+                record = {
+                    "name": node.name,
+                    "qualname": qualname,
+                    "line": node.lineno,
+                    "end_line": getattr(node, "end_lineno", None),
+                    "depth": level,
+                    "decorators": [d for d in (_dotted(getattr(dec, "func", dec)) for dec in node.decorator_list) if d],
+                }
+                if isinstance(node, ast.ClassDef):
+                    record["kind"] = "class"
+                    record["bases"] = [b for b in (_dotted(base) for base in node.bases) if b]
+                else:
+                    record["kind"] = "method" if in_class else "function"
+                    record["async"] = isinstance(node, ast.AsyncFunctionDef)
+                    record["args"] = [a.arg for a in node.args.posonlyargs + node.args.args + node.args.kwonlyargs]
+                    record.update(_function_metrics(node))
+                yield record
+                yield from visit(node, qualname, level, isinstance(node, ast.ClassDef))
+            else:
+                yield from visit(node, scope, depth, in_class)
+
+    yield from visit(tree, "", 0, False)
+
+
+def build_analysis(records: Iterable[Dict[str, Any]], lines: int) -> Dict[str, Any]:
+    """把记录汇总为紧凑的分析结果：summary、imports、definitions、call_graph"""
+    imports, definitions, call_graph = [], [], {}
+    for record in records:
+        if record["kind"] == "import":
+            imports.append(record)
+            continue
+        calls = record.pop("calls", None)
+        if calls:
+            call_graph[record["qualname"]] = calls
+        definitions.append(record)
+    return {
+        "type": "Module",
+        "summary": summarize(imports + definitions, lines),
+        "imports": imports,
+        "definitions": definitions,
+        "call_graph": call_graph,
+    }
+
+
+def summarize(records: Iterable[Dict[str, Any]], lines: int) -> Dict[str, Any]:
+    counts = {kind: 0 for kind in NODE_TYPES}
+    complexities = []
+    for record in records:
+        counts[record["kind"]] += 1
+        if "complexity" in record:
+            complexities.append(record["complexity"])
+    return {
+        "lines": lines,
+        "imports": counts["import"],
+        "classes": counts["class"],
+        "functions": counts["function"],
+        "methods": counts["method"],
+        "max_complexity": max(complexities, default=0),
+        "avg_complexity": round(sum(complexities) / len(complexities), 2) if complexities else 0,
+    }
+
+
+def analyze_python(text: str) -> Dict[str, Any]:
+    """完整分析（不做过滤），不是合法 Python 时返回文本统计"""
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return text_statistics(text)
+    return build_analysis(iter_records(tree), text.count('\n') + 1)
+
+
+def _keep(record: Dict[str, Any], depth: Optional[int], node_types: Optional[List[str]]) -> bool:
+    return (depth is None or record["depth"] <= depth) and (not node_types or record["kind"] in node_types)
+
+
+def filter_analysis(analysis: Dict[str, Any], depth: Optional[int] = None,
+                    node_types: Optional[List[str]] = None) -> Dict[str, Any]:
+    """按层级和记录类型裁剪分析结果，summary 保持为全量统计"""
+    if analysis.get("type") != "Module" or (depth is None and not node_types):
+        return analysis
+
+    def keep(record: Dict[str, Any]) -> bool:
+        return _keep(record, depth, node_types)
+
+    definitions = [d for d in analysis["definitions"] if keep(d)]
+    kept = {d["qualname"] for d in definitions}
+    return {
+        **analysis,
+        "imports": [i for i in analysis["imports"] if keep(i)],
+        "definitions": definitions,
+        "call_graph": {name: calls for name, calls in analysis["call_graph"].items() if name in kept},
+    }
+
+
+def analysis_events(analysis: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """把分析结果拆成逐行输出的事件：每条 import/定义一行，最后是 summary"""
+    if analysis.get("type") != "Module":
+        yield analysis
+        return
+    yield from analysis["imports"]
+    for record in analysis["definitions"]:
+        calls = analysis["call_graph"].get(record["qualname"])
+        yield {**record, "calls": calls} if calls else record
+    yield {"kind": "summary", **analysis["summary"]}
+
+
+def stream_python(text: str, depth: Optional[int] = None, node_types: Optional[List[str]] = None,
+                  on_complete: Optional[Callable[[Dict[str, Any]], None]] = None) -> Iterator[Dict[str, Any]]:
+    """边遍历语法树边按源码顺序产出事件，summary 最后输出
+
+    depth/node_types 只裁剪输出的记录，summary 与 filter_analysis 一样为全模块统计。
+    遍历结束后把完整结果（同 analyze_python）交给 on_complete，供调用方写入缓存。
+    """
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        stats = text_statistics(text)
+        if on_complete is not None:
+            on_complete(stats)
+        yield stats
+        return
+    records = []
+    for record in iter_records(tree):
+        records.append(record)
+        if _keep(record, depth, node_types):
+            # 与 analysis_events 一致：没有调用时不输出 calls
+            yield {k: v for k, v in record.items() if k != "calls" or v}
+    analysis = build_analysis(records, text.count('\n') + 1)
+    if on_complete is not None:
+        on_complete(analysis)
+    yield {"kind": "summary", **analysis["summary"]}
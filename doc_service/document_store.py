@@ -0,0 +1,149 @@
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from code_analysis import build_analysis
+from language_backends import get_backend, point_at
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentNotFound(Exception):
+    """文档不存在或已被淘汰，客户端应重新发送完整代码"""
+
+
+class VersionConflict(Exception):
+    """编辑基于的版本与服务端当前版本不一致"""
+
+
+class _Document:
+    def __init__(self, language: str, text: str):
+        self.language = language
+        self.text = text
+        self.source = text.encode("utf-8")
+        self.tree: Any = None
+        # 定义记录缓存，供 tree-sitter 后端复用未变化的函数和类
+        self.cache: Dict[tuple, tuple] = {}
+        self.version = 0
+        self.lock = threading.Lock()
+
+
+class DocumentStore:
+    """已分析文档的内存存储（按最近使用淘汰），支持按编辑增量重解析
+
+    客户端首次发送完整代码得到 document_id，之后只发送编辑
+    [{start, end, text}]（字符偏移，按顺序应用，每条基于前一条应用后的文本）。
+    tree-sitter 后端在旧语法树上标记编辑后增量解析，并复用未变化定义的记录；
+    其他后端在应用编辑后整体重新解析。
+    """
+
+    def __init__(self, max_documents: Optional[int] = None):
+        self.max_documents = max_documents or int(os.getenv("ANALYZE_MAX_DOCUMENTS", "256"))
+        self._docs: "OrderedDict[str, _Document]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.full_parses = 0
+        self.incremental_parses = 0
+
+    def _get(self, document_id: str) -> Optional[_Document]:
+        with self._lock:
+            doc = self._docs.get(document_id)
+            if doc is not None:
+                self._docs.move_to_end(document_id)
+            return doc
+
+    def _put(self, document_id: str, doc: _Document):
+        with self._lock:
+            self._docs[document_id] = doc
+            self._docs.move_to_end(document_id)
+            while len(self._docs) > self.max_documents:
+                self._docs.popitem(last=False)
+
+    def analyze(self, language: Optional[str], code: Optional[str] = None, document_id: Optional[str] = None,
+                edits: Optional[List[Dict[str, Any]]] = None, base_version: Optional[int] = None) -> Dict[str, Any]:
+        """分析新文档（code）或对已有文档应用编辑（document_id + edits）后重新分析
+
+        language 为空时沿用已有文档的语言，新文档默认为 python。文档不存在时若同时
+        给了 code，则把 code 视为编辑后的完整文本重新建档（多进程部署时文档只在
+        处理首次请求的进程中）。
+
+        Raises:
+            DocumentNotFound: 只给了 document_id/edits 而文档不存在
+            VersionConflict: base_version 与当前版本不一致
+            ValueError: 编辑范围越界
+        """
+        doc = self._get(document_id) if document_id else None
+        language = language or (doc.language if doc is not None else "python")
+        if edits and doc is None and code is None:
+            raise DocumentNotFound(document_id)
+        if doc is None or (code is not None and not edits) or doc.language != language:
+            # 新文档，或客户端重新发送了完整代码
+            if code is None:
+                raise DocumentNotFound(document_id)
+            document_id = document_id or uuid.uuid4().hex
+            doc = _Document(language, code)
+            self._put(document_id, doc)
+            with doc.lock:
+                return self._reanalyze(document_id, doc, incremental=False)
+        with doc.lock:
+            if base_version is not None and base_version != doc.version:
+                raise VersionConflict(f"文档当前版本为 {doc.version}，编辑基于版本 {base_version}")
+            if edits:
+                self._apply_edits(doc, edits)
+                doc.version += 1
+            return self._reanalyze(document_id, doc, incremental=bool(edits))
+
+    def _apply_edits(self, doc: _Document, edits: List[Dict[str, Any]]):
+        backend = get_backend(doc.language)
+        text, source, tree = doc.text, doc.source, doc.tree
+        for edit in edits:
+            start, end, new_text = edit["start"], edit["end"], edit.get("text", "")
+            if not 0 <= start <= end <= len(text):
+                # 之前的编辑可能已标记到语法树上，丢弃旧树，下次整体解析
+                doc.tree, doc.cache = None, {}
+                raise ValueError(f"编辑范围越界: [{start}, {end})，文档长度 {len(text)}")
+            start_byte = len(text[:start].encode("utf-8"))
+            old_end_byte = start_byte + len(text[start:end].encode("utf-8"))
+            new_bytes = new_text.encode("utf-8")
+            new_source = source[:start_byte] + new_bytes + source[old_end_byte:]
+            if backend.incremental and tree is not None:
+                tree.edit(
+                    start_byte=start_byte,
+                    old_end_byte=old_end_byte,
+                    new_end_byte=start_byte + len(new_bytes),
+                    start_point=point_at(source, start_byte),
+                    old_end_point=point_at(source, old_end_byte),
+                    new_end_point=point_at(new_source, start_byte + len(new_bytes)),
+                )
+            text = text[:start] + new_text + text[end:]
+            source = new_source
+        doc.text, doc.source, doc.tree = text, source, tree
+
+    def _reanalyze(self, document_id: str, doc: _Document, incremental: bool) -> Dict[str, Any]:
+        backend = get_backend(doc.language)
+        old_tree = doc.tree if incremental and backend.incremental else None
+        doc.tree = backend.parse(doc.source, old_tree)
+        if old_tree is not None:
+            self.incremental_parses += 1
+        else:
+            self.full_parses += 1
+            doc.cache = {}
+        analysis = build_analysis(backend.records(doc.tree, doc.source, doc.cache), doc.text.count("\n") + 1)
+        return {
+            **analysis,
+            "language": doc.language,
+            "backend": backend.name,
+            "document_id": document_id,
+            "version": doc.version,
+            "incremental": old_tree is not None,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self._docs),
+            "max_documents": self.max_documents,
+            "full_parses": self.full_parses,
+            "incremental_parses": self.incremental_parses,
+        }
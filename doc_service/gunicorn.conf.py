@@ -0,0 +1,82 @@
+"""生产环境启动配置：gunicorn -c gunicorn.conf.py main:app
+
+进程数按容器的 CPU 配额和内存上限推算，所有参数可在 .env 中覆盖。
+"""
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=Path(__file__).parent.parent / '.env')
+
+_MB = 1024 * 1024
+
+
+def _read(path: str) -> str:
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return ""
+
+
+def cpu_limit() -> int:
+    """可用 CPU 核数：cgroup 配额（v2/v1）与 CPU 亲和性取较小值"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota, period = (_read("/sys/fs/cgroup/cpu.max").split() + ["max", "100000"])[:2]
+    if quota == "max":
+        quota, period = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us"), _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota.isdigit() and period.isdigit() and int(period) > 0:
+        cpus = min(cpus, max(1, -(-int(quota) // int(period))))
+    return max(1, cpus)
+
+
+def memory_limit() -> int:
+    """可用内存字节数：cgroup 上限（v2/v1），未限制时为物理内存"""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        value = _read(path)
+        # v1 未限制时是一个接近 2^63 的数
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+def default_workers(cpus: int, memory: int) -> int:
+    """每核一个进程，并保证每个进程至少有 WEB_WORKER_MEMORY_MB 内存"""
+    per_worker = int(os.getenv("WEB_WORKER_MEMORY_MB", "512")) * _MB
+    workers = cpus
+    if memory:
+        workers = min(workers, memory // per_worker)
+    return max(1, workers)
+
+
+CPUS = cpu_limit()
+
+bind = os.getenv("BIND", "0.0.0.0:4000")
+workers = int(os.getenv("WEB_WORKERS", "0")) or default_workers(CPUS, memory_limit())
+# uvicorn 自带的 uvicorn.workers 已弃用，使用独立的 uvicorn-worker 包；
+# uvicorn[standard] 已安装时自动使用 uvloop 与 httptools
+worker_class = "uvicorn_worker.UvicornWorker"
+# 处理一定请求数后重启进程，限制内存泄漏的累积；jitter 避免所有进程同时重启
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", str(max_requests // 10)))
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("WEB_KEEPALIVE", "5"))
+# 不预加载应用：收到 HUP 时各进程重新导入代码，实现平滑重载
+preload_app = False
+accesslog = os.getenv("WEB_ACCESS_LOG") or None
+
+# 各 Web 进程各自持有 OCR/PDF 进程池，未显式配置时按进程数平分 CPU，避免超额订阅
+_pool_size = str(max(1, CPUS // workers))
+os.environ.setdefault("OCR_WORKERS", _pool_size)
+os.environ.setdefault("PDF_WORKERS", _pool_size)
+
+
+def on_starting(server):
+    server.log.info(f"workers={workers}, cpus={CPUS}, pool_size={_pool_size}, max_requests={max_requests}")
@@ -0,0 +1,364 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 处理函数：(参数, [(文件名, 本地路径)...]) -> 可 JSON 序列化的结果
+JobHandler = Callable[[Dict[str, Any], List[Tuple[str, str]]], Awaitable[Any]]
+
+FINISHED = ("done", "failed", "cancelled")
+
+
+class JobQueueFull(Exception):
+    """排队任务数已达上限"""
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """sqlite 持久化的后台任务队列
+
+    - 按 priority 降序、提交时间升序调度，最多 workers 个任务并发执行
+    - 上传文件落盘到 spool_dir，任务结束后即删除；结果保留 retention 秒
+    - 排队中的任务直接取消；执行中的任务由所属进程取消其协程并清理文件
+    - 服务重启后，原进程已退出的 running 任务重新排队（最多 max_attempts 次）
+
+    多个服务进程可共用同一个数据库，认领任务时加写锁保证不重复执行。
+    数据库操作在线程中执行，不阻塞事件循环。
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        workers: Optional[int] = None,
+        retention: Optional[float] = None,
+        max_queued: Optional[int] = None,
+        timeout: Optional[float] = None,
+        spool_dir: Optional[str] = None,
+        max_attempts: int = 3,
+    ):
+        self.db_path = db_path or os.getenv("JOB_DB", "jobs.db")
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "1"))
+        self.retention = retention if retention is not None else float(os.getenv("JOB_RETENTION", "86400"))
+        self.max_queued = max_queued or int(os.getenv("JOB_MAX_QUEUED", "100"))
+        self.timeout = timeout or float(os.getenv("JOB_TIMEOUT", "3600"))
+        self.spool_dir = Path(spool_dir or os.getenv("JOB_SPOOL_DIR", "") or Path(self.db_path).parent / "job_files")
+        self.max_attempts = max_attempts
+        self._handlers: Dict[str, JobHandler] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT, status TEXT, priority INTEGER, "
+            "params TEXT, files TEXT, result TEXT, error TEXT, owner INTEGER, attempts INTEGER DEFAULT 0, "
+            "created REAL, started REAL, finished REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created)")
+
+    def register(self, kind: str, handler: JobHandler):
+        """注册某类任务的处理函数"""
+        self._handlers[kind] = handler
+
+    async def start(self):
+        # submit/cancel 在线程池中调用，通过 call_soon_threadsafe 回到事件循环
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        await asyncio.to_thread(self._recover)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.ensure_future(self._maintain()))
+        self._tasks.append(asyncio.ensure_future(self._watch_cancelled()))
+        logger.info(f"任务队列已启动: {self.db_path}, workers={self.workers}")
+
+    async def close(self):
+        """停止调度；执行中的任务保持 running，重启后由 _recover 重新排队"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(
+        self,
+        kind: str,
+        params: Dict[str, Any],
+        files: List[Tuple[str, BinaryIO]] = (),
+        priority: int = 0,
+    ) -> dict:
+        """提交任务，上传文件复制到 spool 目录
+
+        Raises:
+            KeyError: 未注册的任务类型
+            JobQueueFull: 排队任务数已达上限
+        """
+        if kind not in self._handlers:
+            raise KeyError(kind)
+        with self._lock:
+            queued = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        if queued >= self.max_queued:
+            raise JobQueueFull(f"排队任务已达上限: {self.max_queued}")
+
+        job_id = uuid.uuid4().hex
+        job_dir = self.spool_dir / job_id
+        job_dir.mkdir(parents=True, exist_ok=True)
+        stored = []
+        for index, (filename, stream) in enumerate(files):
+            path = job_dir / f"{index}_{Path(filename).name}"
+            stream.seek(0)
+            with open(path, "wb") as out:
+                shutil.copyfileobj(stream, out, 1024 * 1024)
+            stored.append([filename, str(path)])
+
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, status, priority, params, files, created) VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, priority, json.dumps(params, ensure_ascii=False), json.dumps(stored, ensure_ascii=False), time.time()),
+            )
+        self._call_soon(self._wakeup.set if self._wakeup is not None else None)
+        logger.info(f"任务已提交: {job_id} ({kind}, priority={priority}, files={len(stored)})")
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            "id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "priority": row["priority"],
+            "created": row["created"],
+            "started": row["started"],
+            "finished": row["finished"],
+        }
+        if row["status"] == "queued":
+            with self._lock:
+                job["position"] = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                    "(priority > ? OR (priority = ? AND created < ?))",
+                    (row["priority"], row["priority"], row["created"]),
+                ).fetchone()[0]
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            job["error"] = row["error"]
+        return job
+
+    def _call_soon(self, callback: Optional[Callable[[], Any]]):
+        """在事件循环中执行回调（可从其他线程调用）"""
+        if callback is None or self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            # 事件循环已关闭（服务退出中）
+            pass
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """取消排队中或执行中的任务；已结束的任务原样返回
+
+        排队中的任务直接删除上传文件；执行中的任务只由所属进程停止并清理，
+        其他进程执行的任务由该进程在 _watch_cancelled 中发现取消后自行处理。
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT status, owner FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is not None and row["status"] in ("queued", "running"):
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ?", (time.time(), job_id)
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is not None and row["status"] == "queued":
+            self._remove_files(job_id)
+            logger.info(f"任务已取消: {job_id}")
+        elif row is not None and row["status"] == "running":
+            if row["owner"] == os.getpid():
+                task = self._running.get(job_id)
+                self._call_soon(task.cancel if task is not None else None)
+            logger.info(f"任务已取消: {job_id} (执行中, pid={row['owner']})")
+        return self.get(job_id)
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """原子地认领优先级最高的排队任务"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', started = ?, owner = ?, attempts = attempts + 1 WHERE id = ?",
+                        (time.time(), os.getpid(), row["id"]),
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return row
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None):
+        raw = json.dumps(result, ensure_ascii=False) if result is not None else None
+        with self._lock:
+            # 已被取消的任务不再覆盖状态
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ? AND status = 'running'",
+                (status, raw, error, time.time(), job_id),
+            )
+        self._remove_files(job_id)
+
+    async def _worker(self):
+        errors = 0
+        while True:
+            self._wakeup.clear()
+            try:
+                row = await asyncio.to_thread(self._claim)
+                if row is not None:
+                    await self._execute(row)
+            except Exception as e:
+                # 如其他进程长时间持有写锁（database is locked），退避后重试，不让 worker 退出
+                errors += 1
+                delay = min(30.0, 0.5 * 2 ** errors)
+                logger.error(f"任务调度失败，{delay:.1f}s 后重试: {e}")
+                await asyncio.sleep(delay)
+                continue
+            errors = 0
+            if row is None:
+                # 其他进程提交的任务不会触发本进程的事件，定期轮询兜底
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _execute(self, row: sqlite3.Row):
+        job_id, kind = row["id"], row["kind"]
+        handler = self._handlers.get(kind)
+        if handler is None:
+            await asyncio.to_thread(self._finish, job_id, "failed", error=f"Unknown job kind: {kind}")
+            return
+        files = [tuple(f) for f in json.loads(row["files"])]
+        task = asyncio.ensure_future(handler(json.loads(row["params"]), files))
+        self._running[job_id] = task
+        start = time.perf_counter()
+        try:
+            # 用 wait 而不是直接 await：任务被取消时不影响 worker 本身
+            done, _ = await asyncio.wait({task}, timeout=self.timeout)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            self._running.pop(job_id, None)
+        if not done:
+            task.cancel()
+            logger.error(f"任务超时: {job_id}")
+            await asyncio.to_thread(self._finish, job_id, "failed", error=f"Job timed out after {self.timeout:.0f}s")
+        elif task.cancelled():
+            await asyncio.to_thread(self._remove_files, job_id)
+        elif task.exception() is not None:
+            logger.error(f"任务失败: {job_id}, {task.exception()}")
+            await asyncio.to_thread(self._finish, job_id, "failed", error=str(task.exception()))
+        else:
+            logger.info(f"任务完成: {job_id} ({kind}), 耗时 {time.perf_counter() - start:.2f}s")
+            await asyncio.to_thread(self._finish, job_id, "done", result=task.result())
+
+    def _recover(self):
+        """原进程已退出的 running 任务重新排队，超过重试次数则标记失败"""
+        with self._lock:
+            rows = self._db.execute("SELECT id, owner, attempts FROM jobs WHERE status = 'running'").fetchall()
+            for row in rows:
+                # 本进程的任务以 _running 为准（容器内 PID 可能与重启前相同）
+                if row["owner"] == os.getpid():
+                    if row["id"] in self._running:
+                        continue
+                elif _pid_alive(row["owner"] or 0):
+                    continue
+                if row["attempts"] >= self.max_attempts:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'failed', error = 'Worker exited too many times', finished = ? WHERE id = ?",
+                        (time.time(), row["id"]),
+                    )
+                else:
+                    self._db.execute("UPDATE jobs SET status = 'queued', owner = NULL WHERE id = ?", (row["id"],))
+                    logger.warning(f"任务重新排队: {row['id']}")
+
+    def purge_expired(self):
+        """删除结束超过 retention 秒的任务"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished <= ?",
+                (time.time() - self.retention,),
+            ).fetchall()
+            self._db.executemany("DELETE FROM jobs WHERE id = ?", [(row["id"],) for row in rows])
+        for row in rows:
+            self._remove_files(row["id"])
+        if rows:
+            logger.info(f"清理过期任务: {len(rows)}")
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(60)
+            try:
+                await asyncio.to_thread(self._recover)
+                await asyncio.to_thread(self.purge_expired)
+            except Exception as e:
+                logger.error(f"任务队列维护失败: {e}")
+
+    def _cancelled(self, job_ids: List[str]) -> List[str]:
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id FROM jobs WHERE status = 'cancelled' AND id IN ({','.join('?' * len(job_ids))})", job_ids
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    async def _watch_cancelled(self):
+        """停止在其他进程中被取消的本进程任务，上传文件由 _execute 清理"""
+        while True:
+            await asyncio.sleep(1.0)
+            if not self._running:
+                continue
+            try:
+                cancelled = await asyncio.to_thread(self._cancelled, list(self._running))
+            except Exception as e:
+                logger.error(f"检查任务取消状态失败: {e}")
+                continue
+            for job_id in cancelled:
+                task = self._running.get(job_id)
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def _remove_files(self, job_id: str):
+        shutil.rmtree(self.spool_dir / job_id, ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        stats = {status: counts.get(status, 0) for status in ("queued", "running") + FINISHED}
+        stats["workers"] = self.workers
+        stats["active"] = len(self._running)
+        return stats
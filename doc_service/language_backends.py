@@ -0,0 +1,375 @@
+import ast
+import hashlib
+import importlib
+import logging
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from code_analysis import iter_records
+
+logger = logging.getLogger(__name__)
+
+try:
+    from tree_sitter import Language, Parser
+except ImportError:  # 未安装时各语言退回正则提取
+    Language = Parser = None
+
+# 语言别名（含 CLI 传来的扩展名）-> 规范语言名
+LANGUAGE_ALIASES = {
+    "python": "python", "py": "python",
+    "javascript": "javascript", "js": "javascript", "jsx": "javascript", "mjs": "javascript", "cjs": "javascript",
+    "java": "java",
+    "go": "go", "golang": "go",
+    "cpp": "cpp", "c++": "cpp", "cc": "cpp", "cxx": "cpp", "hpp": "cpp", "hh": "cpp",
+    "c": "c", "h": "c",
+}
+
+# tree-sitter 节点类型 -> 记录类型；branches 为计入圈复杂度的节点
+TREE_SITTER_SPECS: Dict[str, Dict[str, Any]] = {
+    "javascript": {
+        "module": "tree_sitter_javascript",
+        "classes": {"class_declaration"},
+        "functions": {"function_declaration", "generator_function_declaration", "method_definition",
+                      "arrow_function", "function_expression"},
+        "methods": {"method_definition"},
+        "scopes": set(),
+        "imports": {"import_statement"},
+        "calls": {"call_expression", "new_expression"},
+        "branches": {"if_statement", "for_statement", "for_in_statement", "while_statement", "do_statement",
+                     "switch_case", "catch_clause", "ternary_expression"},
+    },
+    "java": {
+        "module": "tree_sitter_java",
+        "classes": {"class_declaration", "interface_declaration", "enum_declaration", "record_declaration"},
+        "functions": {"method_declaration", "constructor_declaration"},
+        "methods": set(),
+        "scopes": set(),
+        "imports": {"import_declaration"},
+        "calls": {"method_invocation", "object_creation_expression"},
+        "branches": {"if_statement", "for_statement", "enhanced_for_statement", "while_statement", "do_statement",
+                     "switch_block_statement_group", "switch_rule", "catch_clause", "ternary_expression"},
+    },
+    "go": {
+        "module": "tree_sitter_go",
+        "classes": {"type_spec"},
+        "functions": {"function_declaration", "method_declaration"},
+        "methods": {"method_declaration"},
+        "scopes": set(),
+        "imports": {"import_spec"},
+        "calls": {"call_expression"},
+        "branches": {"if_statement", "for_statement", "expression_case", "type_case", "communication_case"},
+    },
+    "cpp": {
+        "module": "tree_sitter_cpp",
+        "classes": {"class_specifier", "struct_specifier"},
+        "functions": {"function_definition"},
+        "methods": set(),
+        "scopes": {"namespace_definition"},
+        "imports": {"preproc_include"},
+        "calls": {"call_expression"},
+        "branches": {"if_statement", "for_statement", "for_range_loop", "while_statement", "do_statement",
+                     "case_statement", "catch_clause", "conditional_expression"},
+    },
+    "c": {
+        "module": "tree_sitter_c",
+        "classes": {"struct_specifier"},
+        "functions": {"function_definition"},
+        "methods": set(),
+        "scopes": set(),
+        "imports": {"preproc_include"},
+        "calls": {"call_expression"},
+        "branches": {"if_statement", "for_statement", "while_statement", "do_statement", "case_statement",
+                     "conditional_expression"},
+    },
+}
+
+# 未安装 tree-sitter 时的正则提取规则：(记录类型, 模式)，名称在第一个分组
+REGEX_SPECS: Dict[str, List[Tuple[str, re.Pattern]]] = {
+    "javascript": [
+        ("import", re.compile(r"^\s*import\s.*?from\s+['\"]([^'\"]+)['\"]|^\s*import\s+['\"]([^'\"]+)['\"]", re.M)),
+        ("class", re.compile(r"^\s*(?:export\s+(?:default\s+)?)?class\s+([A-Za-z_$][\w$]*)", re.M)),
+        ("function", re.compile(r"^\s*(?:export\s+(?:default\s+)?)?(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)", re.M)),
+        ("function", re.compile(r"^\s*(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>)", re.M)),
+    ],
+    "java": [
+        ("import", re.compile(r"^\s*import\s+(?:static\s+)?([\w.*]+)\s*;", re.M)),
+        ("class", re.compile(r"^\s*(?:(?:public|private|protected|abstract|final|static)\s+)*(?:class|interface|enum|record)\s+(\w+)", re.M)),
+        ("method", re.compile(r"^\s*(?:(?:public|private|protected|abstract|final|static|synchronized)\s+)+[\w<>\[\],\s]+?\s+(\w+)\s*\([^;]*?\)\s*(?:throws\s+[\w.,\s]+)?\{", re.M)),
+    ],
+    "go": [
+        ("import", re.compile(r"^\s*(?:import\s+)?(?:\w+\s+)?\"([^\"]+)\"\s*$", re.M)),
+        ("class", re.compile(r"^\s*type\s+(\w+)\s+(?:struct|interface)\b", re.M)),
+        ("method", re.compile(r"^func\s+\([^)]*\)\s*(\w+)\s*\(", re.M)),
+        ("function", re.compile(r"^func\s+(\w+)\s*[\[(]", re.M)),
+    ],
+    "cpp": [
+        ("import", re.compile(r"^\s*#\s*include\s*[<\"]([^>\"]+)[>\"]", re.M)),
+        ("class", re.compile(r"^\s*(?:class|struct)\s+(\w+)[^;]*?\{", re.M)),
+        ("function", re.compile(r"^[\w:<>,\s\*&~]+?\b([\w:~]+)\s*\([^;{}]*\)\s*(?:const\s*)?(?:noexcept\s*)?\{", re.M)),
+    ],
+}
+REGEX_SPECS["c"] = REGEX_SPECS["cpp"]
+
+_KEYWORDS = {"if", "for", "while", "switch", "return", "catch", "else", "do", "new", "sizeof"}
+
+
+def normalize_language(language: Optional[str]) -> Optional[str]:
+    """把语言名或扩展名规范化，不支持时返回 None"""
+    if not language:
+        return None
+    return LANGUAGE_ALIASES.get(language.lower().lstrip("."))
+
+
+class PythonBackend:
+    """标准库 ast 解析；不支持增量，编辑后整体重新解析（C 实现，速度足够快）"""
+
+    name = "ast"
+    incremental = False
+
+    def parse(self, source: bytes, old_tree: Any = None) -> Optional[ast.Module]:
+        try:
+            return ast.parse(source)
+        except (SyntaxError, ValueError):
+            return None
+
+    def records(self, tree: Optional[ast.Module], source: bytes, cache: Dict[tuple, tuple]) -> Iterator[Dict[str, Any]]:
+        if tree is not None:
+            yield from iter_records(tree)
+
+
+class RegexBackend:
+    """按行首模式提取定义和导入的轻量后端，不计算复杂度和调用关系"""
+
+    name = "regex"
+    incremental = False
+
+    def __init__(self, language: str):
+        self.patterns = REGEX_SPECS[language]
+
+    def parse(self, source: bytes, old_tree: Any = None) -> str:
+        return source.decode("utf-8", errors="replace")
+
+    def records(self, text: str, source: bytes, cache: Dict[tuple, tuple]) -> Iterator[Dict[str, Any]]:
+        found = []
+        for kind, pattern in self.patterns:
+            for match in pattern.finditer(text):
+                name = next(g for g in match.groups() if g) if any(match.groups()) else match.group(0)
+                if name in _KEYWORDS:
+                    continue
+                line = text.count("\n", 0, match.start(match.lastindex or 0)) + 1
+                if kind == "import":
+                    found.append((line, {"kind": "import", "module": name, "names": [], "line": line, "depth": 0}))
+                else:
+                    found.append((line, {"name": name, "qualname": name, "kind": kind, "line": line,
+                                         "end_line": None, "depth": 1}))
+        seen = set()
+        for line, record in sorted(found, key=lambda item: item[0]):
+            key = (line, record.get("name") or record.get("module"))
+            if key not in seen:
+                seen.add(key)
+                yield record
+
+
+class TreeSitterBackend:
+    """tree-sitter 解析，支持增量重解析
+
+    定义节点的记录按 (源码哈希, 类型, 名称, 作用域, 层级) 缓存，编辑后未变化的函数和类
+    直接复用（只平移行号），遍历和统计的开销与改动量成正比。
+    """
+
+    name = "tree-sitter"
+    incremental = True
+
+    def __init__(self, language: str, grammar):
+        self.spec = TREE_SITTER_SPECS[language]
+        self.language = Language(grammar.language())
+        self.parser = Parser(self.language)
+
+    def parse(self, source: bytes, old_tree: Any = None):
+        if old_tree is None:
+            return self.parser.parse(source)
+        tree = self.parser.parse(source, old_tree)
+        if tree.root_node.has_error:
+            # 有语法错误时增量解析的错误恢复可能与整体解析不同，改为整体解析保证结果一致
+            tree = self.parser.parse(source)
+        return tree
+
+    @staticmethod
+    def _text(node) -> str:
+        return node.text.decode("utf-8", errors="replace")
+
+    def _name(self, node) -> Optional[str]:
+        """定义的名称：name 字段，C/C++ 从声明符中取，匿名函数取所赋值的变量名"""
+        name = node.child_by_field_name("name")
+        if name is not None:
+            return self._text(name)
+        declarator = node.child_by_field_name("declarator")
+        while declarator is not None:
+            if declarator.type in ("identifier", "field_identifier", "qualified_identifier", "destructor_name",
+                                   "operator_name", "type_identifier"):
+                return self._text(declarator)
+            declarator = declarator.child_by_field_name("declarator")
+        parent = node.parent
+        if parent is not None and parent.type in ("variable_declarator", "pair", "assignment_expression"):
+            target = parent.child_by_field_name("name") or parent.child_by_field_name("key") \
+                or parent.child_by_field_name("left")
+            if target is not None:
+                return self._text(target)
+        return None
+
+    def _is_definition(self, node) -> bool:
+        if node.type in self.spec["classes"]:
+            if node.type == "type_spec":
+                # Go 只把 struct/interface 类型当作类
+                body = node.child_by_field_name("type")
+                return body is not None and body.type in ("struct_type", "interface_type")
+            # 只有声明没有主体的 struct/class（如前置声明、变量类型）不算定义
+            return node.child_by_field_name("body") is not None
+        return node.type in self.spec["functions"]
+
+    def _function_metrics(self, func) -> Dict[str, Any]:
+        """圈复杂度与被调用名称，不进入嵌套的定义"""
+        complexity = 1
+        calls: List[str] = []
+        stack = list(reversed(func.named_children))
+        while stack:
+            node = stack.pop()
+            if self._is_definition(node) and self._name(node):
+                continue
+            kind = node.type
+            if kind in self.spec["branches"]:
+                complexity += 1
+            elif kind == "binary_expression":
+                operator = node.child_by_field_name("operator")
+                if operator is not None and operator.type in ("&&", "||"):
+                    complexity += 1
+            elif kind in self.spec["calls"]:
+                target = (node.child_by_field_name("function") or node.child_by_field_name("constructor")
+                          or node.child_by_field_name("type"))
+                if kind == "method_invocation":
+                    obj, name = node.child_by_field_name("object"), node.child_by_field_name("name")
+                    call = f"{self._text(obj)}.{self._text(name)}" if obj is not None else self._text(name)
+                else:
+                    call = self._text(target) if target is not None else None
+                if call and len(call) <= 100 and call not in calls:
+                    calls.append(call)
+            stack.extend(reversed(node.named_children))
+        return {"complexity": complexity, "calls": calls}
+
+    def _import_record(self, node, scope: str, depth: int) -> Dict[str, Any]:
+        target = node.child_by_field_name("source") or node.child_by_field_name("path")
+        if target is None and node.named_children:
+            target = node.named_children[0]
+        module = self._text(target).strip("\"'<>` ") if target is not None else self._text(node)
+        record = {"kind": "import", "module": module, "names": [], "line": node.start_point[0] + 1, "depth": depth}
+        if scope:
+            record["scope"] = scope
+        return record
+
+    def _owner(self, node, scope: str) -> str:
+        """定义所属的作用域：Go 方法挂在接收者类型下，其余沿用外层作用域"""
+        receiver = node.child_by_field_name("receiver")
+        if receiver is None:
+            return scope
+        types = [self._text(n) for n in receiver.named_children]
+        owner = re.findall(r"\b([A-Za-z_]\w*)\s*(?:\[[^\]]*\])?\s*$", types[0]) if types else []
+        return owner[-1] if owner else scope
+
+    def _definition(self, node, name: str, scope: str, depth: int, in_class: bool,
+                    cache: Dict[tuple, tuple], reuse: Dict[tuple, tuple], keys: List[tuple]) -> List[Dict[str, Any]]:
+        """一个定义节点及其内部的全部记录，行号相对节点起始行
+
+        缓存条目为 (记录, 嵌套定义的键)；整体复用时嵌套定义的条目一并保留，
+        之后只修改其中某个方法时仍能复用其余方法。
+        """
+        # 名称可能来自节点之外（如 const f = () => ...），与节点类型、实际作用域一并计入键
+        key = (hashlib.sha1(node.text).digest(), node.type, name, self._owner(node, scope), depth, in_class)
+        # 含语法错误的节点，同样的文本在不同上下文中可能恢复成不同结构，不复用
+        entry = None if node.has_error else reuse.get(key)
+        if entry is None:
+            nested: List[tuple] = []
+            entry = (list(self._build_definition(node, name, scope, depth, in_class, cache, reuse, nested)), nested)
+        else:
+            pending = list(entry[1])
+            while pending:
+                inner = pending.pop()
+                if inner in reuse:
+                    cache[inner] = reuse[inner]
+                    pending.extend(reuse[inner][1])
+        cache[key] = entry
+        keys.append(key)
+        return entry[0]
+
+    def _build_definition(self, node, name, scope, depth, in_class, cache, reuse, keys) -> Iterator[Dict[str, Any]]:
+        base = node.start_point[0]
+        scope = self._owner(node, scope)
+        qualname = f"{scope}.{name}" if scope else name
+        record = {"name": name, "qualname": qualname, "line": 1,
+                  "end_line": node.end_point[0] - base + 1, "depth": depth}
+        is_class = node.type in self.spec["classes"]
+        if is_class:
+            record["kind"] = "class"
+        else:
+            record["kind"] = "method" if in_class or node.type in self.spec["methods"] else "function"
+            record.update(self._function_metrics(node))
+        yield record
+        for child in self._visit(node, qualname, depth, is_class, cache, reuse, keys):
+            yield {**child, "line": child["line"] - base,
+                   **({"end_line": child["end_line"] - base} if child.get("end_line") else {})}
+
+    def _visit(self, parent, scope: str, depth: int, in_class: bool,
+               cache: Dict[tuple, tuple], reuse: Dict[tuple, tuple], keys: List[tuple]) -> Iterator[Dict[str, Any]]:
+        """产出 parent 之下的记录（绝对行号）"""
+        for node in parent.named_children:
+            if node.type in self.spec["imports"]:
+                yield self._import_record(node, scope, depth)
+            elif self._is_definition(node) and self._name(node):
+                offset = node.start_point[0]
+                for record in self._definition(node, self._name(node), scope, depth + 1, in_class, cache, reuse, keys):
+                    shifted = {**record, "line": record["line"] + offset}
+                    if record.get("end_line"):
+                        shifted["end_line"] = record["end_line"] + offset
+                    yield shifted
+            elif node.type in self.spec["scopes"]:
+                name = node.child_by_field_name("name")
+                inner = f"{scope}.{self._text(name)}" if scope and name is not None else (
+                    self._text(name) if name is not None else scope)
+                yield from self._visit(node, inner, depth, in_class, cache, reuse, keys)
+            else:
+                yield from self._visit(node, scope, depth, in_class, cache, reuse, keys)
+
+    def records(self, tree, source: bytes, cache: Dict[tuple, tuple]) -> Iterator[Dict[str, Any]]:
+        """cache 为上一次分析的定义缓存，调用后被替换为本次用到的条目"""
+        reuse = dict(cache)
+        cache.clear()
+        yield from self._visit(tree.root_node, "", 0, False, cache, reuse, [])
+
+
+_backends: Dict[str, Any] = {}
+
+
+def get_backend(language: str):
+    """返回语言对应的解析后端：Python 用 ast；其他语言优先 tree-sitter，缺少依赖时用正则"""
+    backend = _backends.get(language)
+    if backend is not None:
+        return backend
+    if language == "python":
+        backend = PythonBackend()
+    else:
+        backend = None
+        if Language is not None:
+            try:
+                grammar = importlib.import_module(TREE_SITTER_SPECS[language]["module"])
+                backend = TreeSitterBackend(language, grammar)
+            except ImportError:
+                logger.warning(f"未安装 {TREE_SITTER_SPECS[language]['module']}，{language} 使用正则提取")
+        if backend is None:
+            backend = RegexBackend(language)
+    _backends[language] = backend
+    return backend
+
+
+def point_at(source: bytes, offset: int) -> Tuple[int, int]:
+    """字节偏移 -> tree-sitter 的 (行, 列字节)"""
+    row = source.count(b"\n", 0, offset)
+    return row, offset - (source.rfind(b"\n", 0, offset) + 1)
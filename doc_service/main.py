@@ -1,32 +1,52 @@
+import time
+# 尽早记录，用于统计模块导入耗时
+_IMPORT_START = time.perf_counter()
 import os
-from fastapi import FastAPI, UploadFile, File, HTTPException, Header, status
-from fastapi.responses import JSONResponse
+import shutil
+import tempfile
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Header, status
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from dotenv import load_dotenv
-import docx2txt
-import PyPDF2
-import io
 import re
 import logging
-import markdown
-import ast
 from pathlib import Path
 from fastapi import Request, Body
-from typing import Optional, Dict, Any
+from starlette.routing import Match
+from typing import Optional, Dict, Any, AsyncIterator, Awaitable, BinaryIO, Iterator, List, Tuple
 from pydantic import BaseModel
 import datetime
 import asyncio
 import json
 import aiohttp
-import csv
-import json
+from result_cache import ResultCache, make_key
+from http_client import HTTPClient
+from pdf_extract import PDFExtractor
+from structured_extract import extract_csv, extract_json
+from job_queue import JobQueue, JobQueueFull
+from single_flight import SingleFlight
+from llm_cache import LLMCache, cache_key, cacheable
+from upstream_gateway import CircuitOpenError, UpstreamError, UpstreamGateway, parse_retry_after
+from upload_limits import DOCUMENT_TYPES, BodySizeLimitMiddleware, check_upload, single_file_limit
+from code_analysis import (ANALYSIS_VERSION, NODE_TYPES, analysis_events, analyze_python, filter_analysis,
+                           stream_python)
+from document_store import DocumentStore, DocumentNotFound, VersionConflict
+from language_backends import LANGUAGE_ALIASES, TREE_SITTER_SPECS, get_backend, normalize_language
+from startup import StartupTimer
+import metrics
+from metrics import stage
 
 # 加载.env文件
 load_dotenv(dotenv_path=Path(__file__).parent.parent / '.env')
 
 # 读取token和API key
 API_TOKEN = os.getenv("TOKEN")
+# /metrics 的 token，可与业务 TOKEN 分开配置给监控系统
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or API_TOKEN
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 
+# 直接从上传的临时文件增量解析的格式
+STREAMED_EXTENSIONS = ('.pdf', '.csv', '.json', '.docx')
+
 # 日志配置
 logging.basicConfig(
     level=logging.INFO,
@@ -44,16 +64,108 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# 边读取边限制请求体大小，超限立即返回 413；单文件接口按所接受类型中最大的上限限制
+UPLOAD_ROUTE_LIMIT = single_file_limit(DOCUMENT_TYPES)
+app.add_middleware(BodySizeLimitMiddleware, routes={"/extract": UPLOAD_ROUTE_LIMIT, "/jobs": UPLOAD_ROUTE_LIMIT})
+
+# 解析结果缓存：按文件内容 SHA-256 + 文件类型
+result_cache = ResultCache()
+
+# 共享HTTP连接池，供 DeepSeek 调用复用
+http_client = HTTPClient()
+
+# 合并并发的相同请求：文档解析按内容哈希 + 参数，DeepSeek 按请求体
+extract_flight = SingleFlight("extract")
+llm_flight = SingleFlight("llm")
+
+# DeepSeek 调用网关：并发限制、限速、重试与熔断
+deepseek_gateway = UpstreamGateway()
+
+# DeepSeek 回复的持久化缓存，按请求开启（AnalyzeRequest.cache）
+llm_cache = LLMCache()
+
+# 多进程PDF提取引擎，页数较少时仍走单进程
+pdf_extractor = PDFExtractor()
+
+# 后台任务队列：大文件提取走 /jobs，不占用交互请求的连接
+job_queue = JobQueue()
+
+# 多语言结构分析的文档存储，支持按编辑增量重解析
+document_store = DocumentStore()
+
+# 导入/启动/预热耗时；PDF、DOCX 解析库在首次用到时才导入
+startup_timer = StartupTimer(_IMPORT_START)
+
+metrics.register_stats("result_cache", result_cache.stats)
+metrics.register_stats("http_pool", lambda: http_client.stats())
+metrics.register_stats("pdf_pool", pdf_extractor.stats)
+metrics.register_stats("jobs", job_queue.stats)
+metrics.register_stats("extract_flight", extract_flight.stats)
+metrics.register_stats("llm_flight", llm_flight.stats)
+metrics.register_stats("llm_cache", llm_cache.stats)
+metrics.register_stats("deepseek_gateway", deepseek_gateway.stats)
+metrics.register_stats("documents", document_store.stats)
+metrics.register_stats("startup", startup_timer.stats)
+
+def route_label(request: Request) -> str:
+    """返回请求匹配的路由模板，避免路径参数造成指标标签爆炸"""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    """记录每个接口的请求数、进行中请求数和耗时"""
+    endpoint = route_label(request)
+    metrics.IN_FLIGHT.inc(endpoint=endpoint)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        metrics.IN_FLIGHT.dec(endpoint=endpoint)
+        metrics.REQUESTS.inc(method=request.method, endpoint=endpoint, status=status_code)
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, method=request.method, endpoint=endpoint)
+
+@app.on_event("startup")
+async def startup():
+    await http_client.start()
+    pdf_extractor.start()
+    await job_queue.start()
+    startup_timer.ready(modules=("PyPDF2", "docx2txt", "csv"), hooks=(warm_up_backends,))
+
+async def warm_up_backends():
+    """预先加载 tree-sitter 语法包"""
+    await asyncio.to_thread(lambda: [get_backend(language) for language in TREE_SITTER_SPECS])
+
+@app.on_event("shutdown")
+async def shutdown():
+    startup_timer.cancel()
+    await job_queue.close()
+    await http_client.close()
+    pdf_extractor.shutdown()
+
 class AnalysisResponse(BaseModel):
     text: str
     ast: Dict[str, Any]
 
 class DeepSeekClient:
-    def __init__(self):
+    def __init__(self, http: HTTPClient, gateway: UpstreamGateway):
+        self.http = http
+        self.gateway = gateway
         self.api_key = os.getenv("DEEPSEEK_API_KEY")
-        self.base_url = "https://api.deepseek.com/v1/chat/completions"
+        self.base_url = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1/chat/completions")
+        self.timeout = aiohttp.ClientTimeout(total=float(os.getenv("DEEPSEEK_TIMEOUT", "30")))
+        # 单次尝试的超时；含重试的总时长由网关的 DEEPSEEK_DEADLINE 限制
+        # 流式响应总时长不设上限，只限制两个数据块之间的间隔
+        self.stream_timeout = aiohttp.ClientTimeout(total=None, sock_read=float(os.getenv("DEEPSEEK_TIMEOUT", "30")))
 
-    async def analyze_code(self, code: str, prompt: str = None) -> dict:
+    def _build_request(self, code: str, prompt: str = None, stream: bool = False,
+                       temperature: Optional[float] = None) -> Tuple[dict, dict]:
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -67,26 +179,125 @@ class DeepSeekClient:
             "messages": [{"role": "user", "content": final_prompt}],
             "max_tokens": 2000
         }
+        if temperature is not None:
+            payload["temperature"] = temperature
+        if stream:
+            payload["stream"] = True
+        return headers, payload
+
+    async def analyze_code(self, code: str, prompt: str = None, temperature: Optional[float] = None,
+                           cache: bool = False, force_cache: bool = False, caller: str = "") -> dict:
+        """调用 DeepSeek 分析代码
+
+        Args:
+            temperature (Optional[float]): 采样温度，默认使用 API 默认值
+            cache (bool): 是否使用持久化回复缓存，仅 temperature=0 时生效
+            force_cache (bool): temperature 非 0 时也使用缓存
+            caller (str): 调用方 token，用于网关的单调用方并发限制
+
+        Returns:
+            dict: content 或 error；命中缓存时带 cached=True
+        """
+        headers, payload = self._build_request(code, prompt, temperature=temperature)
+        key = cache_key(payload)
+        use_cache = cache and cacheable(payload, force_cache)
+        if use_cache:
+            # 缓存读写（sqlite，命中时还要更新访问时间）在线程中执行，不阻塞事件循环
+            cached = await asyncio.to_thread(llm_cache.get, key)
+            if cached is not None:
+                return {**cached, "cached": True}
+
+        async def fetch() -> dict:
+            result = await self._post(headers, payload, caller)
+            if use_cache and "error" not in result:
+                await asyncio.to_thread(llm_cache.set, key, result)
+            return result
+
+        # 请求体（模型、消息、参数）相同的并发调用只请求一次；
+        # 开启缓存的请求单独合并，保证其结果一定写入缓存
+        return await llm_flight.do(f"{key}:cache" if use_cache else key, fetch)
+
+    async def _send(self, headers: dict, payload: dict) -> str:
+        """发起一次请求，返回响应文本；非200时抛出 UpstreamError 由网关决定是否重试"""
+        session = await self.http.session()
+        async with session.post(self.base_url, headers=headers, json=payload, timeout=self.timeout) as response:
+            raw_text = await response.text()
+            logger.debug(f"DeepSeek status: {response.status}, raw response: {raw_text}")
+            if response.status != 200:
+                raise UpstreamError(response.status, raw_text[:500], parse_retry_after(response.headers.get("Retry-After")))
+            return raw_text
+
+    async def _post(self, headers: dict, payload: dict, caller: str = "") -> dict:
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.base_url, headers=headers, json=payload, timeout=30) as response:
-                    raw_text = await response.text()
-                    logger.error(f"DeepSeek status: {response.status}")
-                    logger.error(f"DeepSeek raw response: {raw_text}")
-                    if response.status != 200:
-                        logger.error(f"DeepSeek API错误 (状态码: {response.status}): {raw_text}")
-                        return {"error": f"DeepSeek API错误: {raw_text}"}
-                    try:
-                        result = json.loads(raw_text)
-                    except Exception as e:
-                        logger.error(f"JSON解析失败: {e}")
-                        return {"error": f"JSON解析失败: {e}, 原始内容: {raw_text}"}
-                    if "choices" in result and result["choices"]:
-                        return {"content": result["choices"][0]["message"]["content"]}
-                    return result
-        except Exception as e:
-            logger.error(f"DeepSeek API调用失败: {e}")
+            raw_text = await self.gateway.call(lambda: self._send(headers, payload), caller)
+        except CircuitOpenError as e:
             return {"error": str(e)}
+        except UpstreamError as e:
+            logger.error(str(e))
+            return {"error": f"DeepSeek API错误: {e.text}"}
+        except Exception as e:
+            logger.error(f"DeepSeek API调用失败: {e!r}")
+            return {"error": str(e) or repr(e)}
+        try:
+            result = json.loads(raw_text)
+        except Exception as e:
+            logger.error(f"JSON解析失败: {e}")
+            return {"error": f"JSON解析失败: {e}, 原始内容: {raw_text[:500]}"}
+        if "choices" in result and result["choices"]:
+            return {"content": result["choices"][0]["message"]["content"]}
+        return result
+
+    async def stream_code(self, code: str, prompt: str = None, temperature: Optional[float] = None,
+                          cache: bool = False, force_cache: bool = False, caller: str = "") -> AsyncIterator[str]:
+        """流式调用 DeepSeek，逐段产出回复内容
+
+        缓存和 caller 参数同 analyze_code；命中缓存时一次性产出完整回复，
+        未命中时在流正常结束后写入缓存。建立连接前的失败由网关重试，
+        开始输出后中断不再重试。
+
+        Raises:
+            CircuitOpenError: 熔断中
+            UpstreamError: DeepSeek 重试后仍返回非200状态
+            Exception: 连接失败时抛出
+        """
+        headers, payload = self._build_request(code, prompt, stream=True, temperature=temperature)
+        key = cache_key(payload)
+        use_cache = cache and cacheable(payload, force_cache)
+        if use_cache:
+            cached = await asyncio.to_thread(llm_cache.get, key)
+            if cached is not None:
+                yield cached["content"]
+                return
+        parts = []
+        async for chunk in self._stream(headers, payload, caller):
+            parts.append(chunk)
+            yield chunk
+        if use_cache:
+            await asyncio.to_thread(llm_cache.set, key, {"content": "".join(parts)})
+
+    async def _open_stream(self, headers: dict, payload: dict) -> aiohttp.ClientResponse:
+        session = await self.http.session()
+        response = await session.post(self.base_url, headers=headers, json=payload, timeout=self.stream_timeout)
+        if response.status != 200:
+            raw_text = await response.text()
+            response.release()
+            raise UpstreamError(response.status, raw_text[:500], parse_retry_after(response.headers.get("Retry-After")))
+        return response
+
+    async def _stream(self, headers: dict, payload: dict, caller: str = "") -> AsyncIterator[str]:
+        async with self.gateway.stream(lambda: self._open_stream(headers, payload), caller) as response:
+            async for line in response.content:
+                line = line.decode('utf-8').strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or []
+                if choices and choices[0].get("delta", {}).get("content"):
+                    yield choices[0]["delta"]["content"]
+
+deepseek_client = DeepSeekClient(http_client, deepseek_gateway)
 
 def verify_token(token: str):
     """验证API Token
@@ -105,60 +316,105 @@ def verify_token(token: str):
             headers={"WWW-Authenticate": "Bearer"}
         )
 
-def parse_ast(text: str) -> Dict[str, Any]:
-    """解析文本的抽象语法树
+def decode_text(content: bytes, encodings: List[str]) -> str:
+    """按顺序尝试多种编码解码文本
+
+    Args:
+        content (bytes): 文件内容
+        encodings (List[str]): 依次尝试的编码
+
+    Raises:
+        HTTPException: 所有编码均失败时抛出400错误
+    """
+    for encoding in encodings:
+        try:
+            return content.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    logger.error(f"文件编码解析失败，已尝试: {encodings}")
+    raise HTTPException(400, "Unsupported file encoding")
+
+def spool_copy(stream: BinaryIO) -> BinaryIO:
+    """复制文件对象（超过 1MB 落盘），副本由调用方关闭"""
+    copy = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    stream.seek(0)
+    shutil.copyfileobj(stream, copy, 1024 * 1024)
+    copy.seek(0)
+    return copy
+
+def parse_ast(text: str, depth: Optional[int] = None, node_types: Optional[List[str]] = None) -> Dict[str, Any]:
+    """分析 Python 代码结构：定义、导入、调用关系和每个函数的圈复杂度
+
+    完整结果按源码哈希缓存，depth/node_types 过滤在缓存结果上进行。
 
     Args:
         text (str): 要解析的文本内容
+        depth (Optional[int]): 只返回嵌套层级不超过 depth 的定义（顶层为1）
+        node_types (Optional[List[str]]): 只返回这些类型的记录（import/class/function/method）
 
     Returns:
-        Dict[str, Any]: 解析后的AST结构
+        Dict[str, Any]: 分析结果；不是合法 Python 时返回文本统计
+    """
+    key = make_key(text.encode('utf-8'), analysis="ast", version=ANALYSIS_VERSION)
+    analysis = result_cache.get(key)
+    if analysis is None:
+        analysis = analyze_python(text)
+        result_cache.set(key, analysis)
+    return filter_analysis(analysis, depth, node_types)
 
-    Raises:
-        Exception: 解析失败时抛出异常
+def ast_events(text: str, depth: Optional[int] = None, node_types: Optional[List[str]] = None) -> Iterator[str]:
+    """以 NDJSON 逐行输出分析结果：每条 import/定义一行，最后一行为 summary
+
+    已缓存时直接输出缓存结果，否则边遍历语法树边输出，结束后写入缓存。
     """
-    try:
-        # 尝试解析Python代码的AST
-        tree = ast.parse(text)
-        return {
-            "type": "Module",
-            "body": [{
-                "type": node.__class__.__name__,
-                "line": node.lineno if hasattr(node, 'lineno') else None,
-                "col": node.col_offset if hasattr(node, 'col_offset') else None
-            } for node in ast.walk(tree)]
-        }
-    except SyntaxError:
-        # 如果不是Python代码，返回简单的文本结构分析
-        lines = text.split('\n')
-        return {
-            "type": "Text",
-            "statistics": {
-                "lines": len(lines),
-                "characters": len(text),
-                "words": len(text.split()),
-                "paragraphs": sum(1 for line in lines if line.strip())
-            }
-        }
+    key = make_key(text.encode('utf-8'), analysis="ast", version=ANALYSIS_VERSION)
+    analysis = result_cache.get(key)
+    if analysis is not None:
+        events = analysis_events(filter_analysis(analysis, depth, node_types))
+    else:
+        # 输出完毕后写入缓存，之后的请求（含非流式）直接复用
+        events = stream_python(text, depth, node_types, on_complete=lambda result: result_cache.set(key, result))
+    for event in events:
+        yield json.dumps(event, ensure_ascii=False) + "\n"
+
+class TextEdit(BaseModel):
+    start: int  # 替换范围起点（字符偏移）
+    end: int  # 替换范围终点（不含）
+    text: str = ""  # 替换后的文本
 
 class AnalyzeRequest(BaseModel):
     code: str = None
     use_deepseek: bool = False
     prompt: str = None  # 新增字段，允许用户自定义指令
+    stream: bool = False  # use_deepseek 时以 SSE 逐段返回，否则以 NDJSON 逐条返回结构分析
+    depth: Optional[int] = None  # 结构分析只返回嵌套层级不超过 depth 的定义
+    node_types: Optional[List[str]] = None  # 结构分析只返回这些类型：import/class/function/method
+    temperature: Optional[float] = None  # 采样温度，默认使用 DeepSeek 默认值
+    cache: bool = False  # 使用持久化回复缓存，仅 temperature=0 时生效
+    force_cache: bool = False  # temperature 非 0 时也使用缓存
+    language: Optional[str] = None  # 结构分析的语言（python/javascript/java/go/cpp/c 或扩展名）
+    document_id: Optional[str] = None  # 之前分析返回的文档ID，配合 edits 增量重解析
+    edits: Optional[List[TextEdit]] = None  # 相对文档当前文本的编辑，按顺序应用
+    base_version: Optional[int] = None  # 编辑基于的文档版本，不一致时返回 409
 
-@app.post("/extract", response_model=Dict[str, str])
+@app.post("/extract", response_model=Dict[str, Any])
 async def extract_text(
-    file: UploadFile = File(..., max_size=10_000_000),  # 限制10MB
-    authorization: str = Header(None)
+    file: UploadFile = File(...),
+    authorization: str = Header(None),
+    pages: Optional[str] = Form(None),
+    max_chars: int = Form(5000, gt=0)
 ):
     """提取文档中的文本内容
 
     Args:
         file (UploadFile): 上传的文件（PDF/DOCX/MD）
         authorization (str): Bearer token
+        pages (Optional[str]): PDF 页码范围，如 "1-3,5"，默认全部
+        max_chars (int): 返回文本的字符上限，PDF/CSV/JSON 达到上限后不再解析剩余内容
 
     Returns:
-        Dict[str, str]: 提取的文本内容
+        Dict[str, Any]: 提取的文本内容；cached 表示是否命中缓存，truncated 表示是否被截断；
+        CSV/JSON 额外返回 summary（列/字段类型与行数，截断时为估算值）
 
     Raises:
         HTTPException: 文件处理失败时抛出相应的错误
@@ -172,90 +428,233 @@ async def extract_text(
         )
     token = authorization.split(" ")[1]
     verify_token(token)
+    check_upload(file.filename, file.file)
 
-    content = await file.read()
-    text = ""
+    result = await extract_document(file.filename, file.file, pages, max_chars)
+    return JSONResponse(content=result)
 
-    logger.info(f"收到文件: {file.filename} ({len(content)/1024:.1f}KB)")
+async def extract_document(filename: str, stream: BinaryIO, pages: Optional[str] = None, max_chars: int = 5000) -> Dict[str, Any]:
+    """按扩展名解析文档，/extract 与后台任务共用
 
-    try:
-        if file.filename.endswith('.pdf'):
-            reader = PyPDF2.PdfReader(io.BytesIO(content))
-            for page in reader.pages:
-                text += page.extract_text() or ""
-        elif file.filename.endswith('.docx'):
-            text = docx2txt.process(io.BytesIO(content))
-        elif file.filename.endswith('.txt'):
-            text = decode_text(content, encodings=['utf-8', 'gbk', 'latin-1'])
-        elif file.filename.endswith('.sh'):
-            text = decode_text(content, encodings=['utf-8'])
-        elif file.filename.endswith('.yaml') or file.filename.endswith('.yml'):
-            text = decode_text(content, encodings=['utf-8'])
-        elif file.filename.endswith('.json'):
-            try:
-                #先解码尝试
-                content_str = content.decode('utf-8')
-                json_data = json.loads(content_str)
-                #保持该格式可读性
-                text = json.dumps(json_data, indent=2, ensure_ascii=False)
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON文件解析失败: {e}")
-                raise HTTPException(400, "JSON文件解析失败")
-            except UnicodeDecodeError:
+    Args:
+        filename (str): 原始文件名，用于判断格式
+        stream (BinaryIO): 可 seek 的文件对象
+        pages (Optional[str]): PDF 页码范围
+        max_chars (int): 返回文本的字符上限
+
+    Returns:
+        Dict[str, Any]: text / truncated / cached，CSV/JSON 另有 summary
+
+    Raises:
+        HTTPException: 文件处理失败时抛出相应的错误
+    """
+    ext = Path(filename).suffix.lower()
+    is_pdf = ext == '.pdf'
+    # PDF/CSV/JSON/DOCX 直接使用上传的临时文件解析，不整体读入内存
+    streamed = ext in STREAMED_EXTENSIONS
+    if streamed:
+        content = None
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+    else:
+        with stage("read"):
+            stream.seek(0)
+            content = await asyncio.to_thread(stream.read)
+        size = len(content)
+
+    logger.info(f"收到文件: {filename} ({size/1024:.1f}KB)")
+
+    with stage("hash"):
+        # 大文件哈希耗时可达数百毫秒，在线程中计算
+        cache_key = await asyncio.to_thread(
+            make_key,
+            stream if streamed else content,
+            ext=ext,
+            pages=pages if is_pdf else None,
+            max_chars=max_chars
+        )
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"缓存命中: {filename}")
+        return {**cached, "cached": True}
+
+    # 合并的解析任务可能比发起请求活得更久（发起者断开后其上传文件即被关闭），
+    # 流式解析的文件先复制一份交给任务持有，任务结束时关闭
+    owned = await asyncio.to_thread(spool_copy, stream) if streamed else None
+
+    async def parse() -> Dict[str, Any]:
+        text = ""
+        truncated = False
+        summary = None
+        parse_start = time.perf_counter()
+        try:
+            if is_pdf:
                 try:
-                    content_str = content.decode('gbk')
-                    json_data = json.loads(content_str)
-                    text = json.dumps(json_data, indent=2, ensure_ascii=False)
-                except Exception as e:
-                    logger.error(f"JSON文件解析失败: {e}")
-                    raise HTTPException(400, "JSON文件解析失败")    
-        elif file.filename.endswith('.csv'):
-            try:
-                content_str = content.decode('utf-8-sig')
-                csv_reader = csv.DictReader(content_str.splitlines())
-                rows = list(csv_reader)
-                if len(rows) > 0:
-                    #有表头，获取
-                    csv_reader = csv.DictReader(content_str.splitlines())
-                    text = json.dumps(list(csv_reader), indent=2, ensure_ascii=False)
-                else:
-                    text = '[]' #空CSV文件
-            except Exception as e:
-                logger.error(f"CSV文件解析失败: {e}")
-                raise HTTPException(400, "CSV文件解析失败")
-        elif file.filename.endswith('.md'):
-            # 尝试 utf-8 和 gbk 解码
-            try:
-                text = content.decode('utf-8')
-            except UnicodeDecodeError:
+                    text, truncated = await pdf_extractor.extract(owned, pages, max_chars)
+                except ValueError as e:
+                    raise HTTPException(400, f"Invalid pages: {e}")
+            elif ext == '.docx':
+                import docx2txt
+                text = await asyncio.to_thread(docx2txt.process, owned)
+            elif ext == '.txt':
+                text = decode_text(content, encodings=['utf-8', 'gbk', 'latin-1'])
+            elif ext == '.sh':
+                text = decode_text(content, encodings=['utf-8'])
+            elif ext in ('.yaml', '.yml'):
+                text = decode_text(content, encodings=['utf-8'])
+            elif ext in ('.json', '.csv'):
+                extractor = extract_json if ext == '.json' else extract_csv
                 try:
-                    text = content.decode('gbk')
-                except Exception as e:
-                    logger.error(f"文件编码解析失败: {e}")
-                    raise HTTPException(400, "Unsupported file encoding")
-        else:
-            supported_formats = ['.pdf', '.docx', '.md','.txt','.sh','.yaml','.yml','.json','.csv']
+                    text, truncated, summary = await asyncio.to_thread(extractor, owned, max_chars)
+                except ValueError as e:
+                    logger.error(f"{ext[1:].upper()}文件解析失败: {e}")
+                    raise HTTPException(400, f"{ext[1:].upper()}文件解析失败")
+            elif ext == '.md':
+                # 尝试 utf-8 和 gbk 解码
+                try:
+                    text = content.decode('utf-8')
+                except UnicodeDecodeError:
+                    try:
+                        text = content.decode('gbk')
+                    except Exception as e:
+                        logger.error(f"文件编码解析失败: {e}")
+                        raise HTTPException(400, "Unsupported file encoding")
+            else:
+                supported_formats = ['.pdf', '.docx', '.md','.txt','.sh','.yaml','.yml','.json','.csv']
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unsupported file type. Supported formats: {', '.join(supported_formats)}"
+                )
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"文档解析失败: {str(e)}")
             raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported file type. Supported formats: {', '.join(supported_formats)}"
+                status_code=500,
+                detail=f"Document parsing failed: {str(e)}"
             )
-    except Exception as e:
-        logger.error(f"文档解析失败: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Document parsing failed: {str(e)}"
-        )
+        finally:
+            metrics.STAGE_LATENCY.observe(time.perf_counter() - parse_start, stage="parse")
+            if owned is not None:
+                owned.close()
 
-    # 简化文本，移除多余空白字符
-    text = re.sub(r'\s+', ' ', text).strip()
+        # 简化文本，移除多余空白字符
+        with stage("normalize"):
+            text = re.sub(r'\s+', ' ', text).strip()
     
-    # 如果文本超过5000字符，记录日志
-    if len(text) > 5000:
-        logger.warning(f"文本内容已截断，原始长度: {len(text)}")
-        text = text[:5000]
+        # 如果文本超过上限，截断并记录日志
+        if len(text) > max_chars:
+            logger.warning(f"文本内容已截断，原始长度: {len(text)}")
+            text = text[:max_chars]
+            truncated = True
     
-    logger.info(f"文档解析成功: {file.filename}, 长度: {len(text)}")
-    return JSONResponse(content={"text": text})
+        result = {"text": text, "truncated": truncated}
+        if summary is not None:
+            result["summary"] = summary
+        result_cache.set(cache_key, result)
+        logger.info(f"文档解析成功: {filename}, 长度: {len(text)}, 截断: {truncated}")
+        return {**result, "cached": False}
+
+    led = False
+
+    def lead() -> Awaitable[Dict[str, Any]]:
+        nonlocal led
+        led = True
+        return parse()
+
+    # 相同内容与参数的并发请求只解析一次
+    try:
+        return await extract_flight.do(cache_key, lead)
+    finally:
+        if owned is not None and not led:
+            # 合并到了进行中的解析，副本没有用到
+            owned.close()
+
+async def run_extract_job(params: Dict[str, Any], files: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """后台任务：解析单个已落盘的文件"""
+    filename, path = files[0]
+    with open(path, 'rb') as stream:
+        try:
+            return await extract_document(filename, stream, params.get("pages"), params["max_chars"])
+        except HTTPException as e:
+            raise RuntimeError(e.detail)
+
+job_queue.register("extract", run_extract_job)
+
+def check_auth(authorization: Optional[str]):
+    """校验 Bearer token"""
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(
+            status_code=401,
+            detail="Missing or invalid Authorization header",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    verify_token(authorization.split(" ")[1])
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    file: UploadFile = File(...),
+    authorization: str = Header(None),
+    pages: Optional[str] = Form(None),
+    max_chars: int = Form(5000, gt=0),
+    priority: int = Form(0)
+):
+    """提交后台提取任务，参数同 /extract
+
+    Args:
+        priority (int): 优先级，越大越先执行
+
+    Returns:
+        Dict[str, Any]: 任务信息，用 GET /jobs/{id} 轮询状态和结果
+    """
+    check_auth(authorization)
+    check_upload(file.filename, file.file)
+    try:
+        job = await asyncio.to_thread(
+            job_queue.submit, "extract", {"pages": pages, "max_chars": max_chars},
+            [(file.filename, file.file)], priority
+        )
+    except JobQueueFull as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=503, detail="Job queue full", headers={"Retry-After": "30"})
+    return JSONResponse(status_code=202, content=job)
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, authorization: str = Header(None)):
+    """查询任务状态；status 为 done 时包含 result，failed 时包含 error"""
+    check_auth(authorization)
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str, authorization: str = Header(None)):
+    """取消排队中或执行中的任务"""
+    check_auth(authorization)
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+async def sse_events(code: str, prompt: str = None, **options) -> AsyncIterator[str]:
+    """把 DeepSeek 流式输出转换为 Server-Sent Events
+
+    每段内容一个 data 事件；出错时发送 error 事件；结束时发送 [DONE]。
+    """
+    start = time.perf_counter()
+    try:
+        async for chunk in deepseek_client.stream_code(code, prompt, **options):
+            if start is not None:
+                # 流式调用记录首个数据块的到达时间
+                metrics.STAGE_LATENCY.observe(time.perf_counter() - start, stage="llm_first_token")
+                start = None
+            yield f"data: {json.dumps({'content': chunk}, ensure_ascii=False)}\n\n"
+    except Exception as e:
+        logger.error(f"DeepSeek 流式调用失败: {e}")
+        yield f"event: error\ndata: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+    yield "data: [DONE]\n\n"
 
 @app.post("/v1/analyze", response_model=AnalysisResponse)
 async def analyze_text(
@@ -265,7 +664,7 @@ async def analyze_text(
     code = request.code
     use_deepseek = request.use_deepseek
     prompt = request.prompt
-    if not code:
+    if not code and not (request.document_id and request.edits and not use_deepseek):
         raise HTTPException(400, "需要提供文件或代码")
 
     # Token验证
@@ -275,17 +674,51 @@ async def analyze_text(
             detail="Invalid authorization",
             headers={"WWW-Authenticate": "Bearer"}
         )
-    verify_token(authorization.split(" ")[1])
+    token = authorization.split(" ")[1]
+    verify_token(token)
+    if request.node_types and set(request.node_types) - set(NODE_TYPES):
+        raise HTTPException(400, f"node_types 只能是: {', '.join(NODE_TYPES)}")
+    if request.depth is not None and request.depth < 1:
+        raise HTTPException(400, "depth 必须大于等于1")
+    language = normalize_language(request.language)
+    if request.language and language is None:
+        raise HTTPException(400, f"不支持的语言: {request.language}，可选: {', '.join(sorted(set(LANGUAGE_ALIASES.values())))}")
+    # 指定了非 Python 语言或使用文档ID时走文档存储（支持增量重解析）
+    use_documents = (language not in (None, "python") or request.document_id or request.edits) and not use_deepseek
 
     try:
         text = code
+        options = {"temperature": request.temperature, "cache": request.cache, "force_cache": request.force_cache,
+                   "caller": token}
+        if use_deepseek and request.stream:
+            return StreamingResponse(sse_events(text, prompt, **options), media_type="text/event-stream")
         if use_deepseek:
-            deepseek_client = DeepSeekClient()
-            ds_result = await deepseek_client.analyze_code(text, prompt)
+            with stage("llm"):
+                ds_result = await deepseek_client.analyze_code(text, prompt, **options)
             return AnalysisResponse(text=text[:5000], ast=ds_result)
+        elif use_documents:
+            with stage("ast"):
+                analysis = await asyncio.to_thread(
+                    document_store.analyze, language, code, request.document_id,
+                    [{"start": e.start, "end": e.end, "text": e.text} for e in request.edits or []], request.base_version
+                )
+            analysis = filter_analysis(analysis, request.depth, request.node_types)
+            if request.stream:
+                events = (json.dumps(event, ensure_ascii=False) + "\n" for event in analysis_events(analysis))
+                return StreamingResponse(events, media_type="application/x-ndjson")
+            return AnalysisResponse(text=(text or "")[:5000], ast=analysis)
+        elif request.stream:
+            return StreamingResponse(ast_events(text, request.depth, request.node_types), media_type="application/x-ndjson")
         else:
-            ast_tree = parse_ast(text)
+            with stage("ast"):
+                ast_tree = await asyncio.to_thread(parse_ast, text, request.depth, request.node_types)
             return AnalysisResponse(text=text[:5000], ast=ast_tree)
+    except DocumentNotFound:
+        raise HTTPException(404, "文档不存在或已过期，请重新发送完整代码")
+    except VersionConflict as e:
+        raise HTTPException(409, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     except Exception as e:
         logger.error(f"分析失败: {str(e)}")
         raise HTTPException(
@@ -293,6 +726,14 @@ async def analyze_text(
             detail=f"Analysis failed: {str(e)}"
         )
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint(authorization: str = Header(None)):
+    """Prometheus 格式的指标，需要 METRICS_TOKEN（未设置时为 TOKEN）作为 Bearer token"""
+    if authorization != f"Bearer {METRICS_TOKEN}" or not METRICS_TOKEN:
+        logger.warning("指标接口Token校验失败")
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 def health():
     """健康检查接口
@@ -303,5 +744,14 @@ def health():
     return {
         "status": "ok",
         "version": "1.0.0",
-        "timestamp": datetime.datetime.now().isoformat()
-    }
\ No newline at end of file
+        "timestamp": datetime.datetime.now().isoformat(),
+        "cache": result_cache.stats(),
+        "http_pool": http_client.stats(),
+        "pdf_pool": pdf_extractor.stats(),
+        "jobs": job_queue.stats(),
+        "deepseek_gateway": deepseek_gateway.stats(),
+        "startup": startup_timer.stats()
+    }
+
+# 模块导入到此结束
+startup_timer.imported()
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, BinaryIO, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import PyPDF2
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def parse_page_ranges(spec: Optional[str], total: int) -> List[int]:
+    """解析页码范围，如 "1-3,5,10-"（从1开始，含两端）
+
+    Args:
+        spec (Optional[str]): 页码范围，为空时表示全部页
+        total (int): PDF 总页数
+
+    Returns:
+        List[int]: 从0开始的页索引，按出现顺序去重
+
+    Raises:
+        ValueError: 格式不合法时抛出
+    """
+    if not spec or not spec.strip():
+        return list(range(total))
+    indices: List[int] = []
+    seen = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start_s, end_s = part.split('-', 1)
+            start = int(start_s) if start_s.strip() else 1
+            end = int(end_s) if end_s.strip() else total
+        else:
+            start = end = int(part)
+        if start < 1 or end < start:
+            raise ValueError(f"非法页码范围: {part}")
+        for i in range(start - 1, min(end, total)):
+            if i not in seen:
+                seen.add(i)
+                indices.append(i)
+    return indices
+
+
+def _page_text(reader: "PyPDF2.PdfReader", index: int) -> str:
+    return _WHITESPACE.sub(' ', reader.pages[index].extract_text() or "").strip()
+
+
+def _extract_pages(path: str, indices: List[int]) -> List[str]:
+    """子进程任务：打开 PDF 并提取指定页，返回压缩空白后的逐页文本"""
+    import PyPDF2
+
+    with open(path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        return [_page_text(reader, i) for i in indices]
+
+
+def _unlink(path: str):
+    """删除临时文件；Windows 上被取消的分片仍打开该文件时删除会失败，只记录日志"""
+    try:
+        os.unlink(path)
+    except OSError as e:
+        logger.warning(f"临时文件删除失败: {path}, {e}")
+
+
+def _join_pages(parts: List[str], max_chars: int, truncated: bool) -> Tuple[str, bool]:
+    text = ' '.join(p for p in parts if p)
+    if len(text) > max_chars:
+        text = text[:max_chars]
+        truncated = True
+    return text, truncated
+
+
+def _extract_from_reader(reader: "PyPDF2.PdfReader", indices: List[int], max_chars: int) -> Tuple[str, bool]:
+    parts: List[str] = []
+    length = 0
+    truncated = False
+    for pos, i in enumerate(indices):
+        page_text = _page_text(reader, i)
+        if not page_text:
+            continue
+        parts.append(page_text)
+        length += len(page_text) + 1
+        if length > max_chars:
+            # 已达到上限，剩余页面不再解析
+            truncated = pos < len(indices) - 1
+            break
+    return _join_pages(parts, max_chars, truncated)
+
+
+class PDFExtractor:
+    """多进程 PDF 提取引擎
+
+    页数不足 min_pages 时在线程中单进程解析；否则把剩余页索引按 shard_pages
+    切片分发到进程池，按原顺序合并。分片按波次提交（每波 workers 个），
+    累计长度超过 max_chars 后不再提交后续波次，保留提前停止的效果。
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        min_pages: Optional[int] = None,
+        shard_pages: Optional[int] = None,
+    ):
+        self.workers = workers or int(os.getenv("PDF_WORKERS", "0")) or (os.cpu_count() or 1)
+        self.min_pages = min_pages or int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+        self.shard_pages = shard_pages or int(os.getenv("PDF_SHARD_PAGES", "8"))
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        if self._executor is None and self.workers > 1:
+            # spawn 启动的子进程不继承服务监听套接字等文件描述符
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info(f"PDF进程池已启动: workers={self.workers}, min_pages={self.min_pages}")
+
+    def shutdown(self):
+        if self._executor is not None:
+            # 等待子进程退出，避免服务停止后残留孤儿进程
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            logger.info("PDF进程池已关闭")
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "min_pages": self.min_pages,
+            "shard_pages": self.shard_pages,
+        }
+
+    async def extract(
+        self,
+        stream: BinaryIO,
+        pages: Optional[str] = None,
+        max_chars: int = 5000,
+    ) -> Tuple[str, bool]:
+        """流式提取 PDF 文本
+
+        PdfReader 直接读取上传的临时文件，页面按需解析；每页压缩空白后
+        累加长度，达到 max_chars 即停止，不再解析剩余页面。
+
+        Args:
+            stream (BinaryIO): 可 seek 的 PDF 文件对象
+            pages (Optional[str]): 页码范围，见 parse_page_ranges
+            max_chars (int): 输出字符上限
+
+        Returns:
+            Tuple[str, bool]: 提取的文本，以及是否被截断
+        """
+        import PyPDF2
+
+        stream.seek(0)
+        reader = await asyncio.to_thread(PyPDF2.PdfReader, stream)
+        indices = parse_page_ranges(pages, len(reader.pages))
+        if self.workers <= 1 or len(indices) < self.min_pages:
+            return await asyncio.to_thread(_extract_from_reader, reader, indices, max_chars)
+
+        # 先单进程解析首个分片，估算每页字符数：若剩余预算只需少量页面即可填满，
+        # 继续单进程解析比分发到进程池更省
+        head, rest = indices[:self.shard_pages], indices[self.shard_pages:]
+        parts = await asyncio.to_thread(lambda: [_page_text(reader, i) for i in head])
+        length = sum(len(p) + 1 for p in parts if p)
+        if length > max_chars or not rest:
+            return _join_pages(parts, max_chars, bool(rest))
+        budget = max_chars - length
+        avg = length / len(head)
+        if avg and budget / avg < self.min_pages:
+            text, truncated = await asyncio.to_thread(_extract_from_reader, reader, rest, budget)
+        else:
+            self.start()
+            # 子进程通过路径打开文件，避免把整份 PDF 序列化给每个分片；
+            # 先关闭再提交分片，Windows 上仍被打开的临时文件不能被其他进程读取
+            tmp = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+            try:
+                with tmp:
+                    stream.seek(0)
+                    await asyncio.to_thread(shutil.copyfileobj, stream, tmp)
+                text, truncated = await self._extract_sharded(tmp.name, rest, budget)
+            finally:
+                _unlink(tmp.name)
+        return _join_pages(parts + [text], max_chars, truncated)
+
+    async def _extract_sharded(self, path: str, indices: List[int], max_chars: int) -> Tuple[str, bool]:
+        loop = asyncio.get_running_loop()
+        shards = [indices[i:i + self.shard_pages] for i in range(0, len(indices), self.shard_pages)]
+        parts: List[str] = []
+        length = 0
+        for wave_start in range(0, len(shards), self.workers):
+            wave = shards[wave_start:wave_start + self.workers]
+            results = await asyncio.gather(*[
+                loop.run_in_executor(self._executor, _extract_pages, path, shard)
+                for shard in wave
+            ])
+            for shard_texts in results:
+                for page_text in shard_texts:
+                    if page_text:
+                        parts.append(page_text)
+                        length += len(page_text) + 1
+            if length > max_chars:
+                remaining = wave_start + self.workers < len(shards)
+                return _join_pages(parts, max_chars, remaining)
+        return _join_pages(parts, max_chars, False)
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, BinaryIO, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(content: Union[bytes, BinaryIO], **options) -> str:
+    """按上传内容的 SHA-256 与解析参数生成缓存键
+
+    content 可以是 bytes，也可以是可 seek 的文件对象（分块计算摘要，完成后回到开头）。
+    """
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        digest = hashlib.sha256(content).hexdigest()
+    else:
+        h = hashlib.sha256()
+        content.seek(0)
+        for chunk in iter(lambda: content.read(1024 * 1024), b""):
+            h.update(chunk)
+        content.seek(0)
+        digest = h.hexdigest()
+    if not options:
+        return digest
+    opts = json.dumps(options, sort_keys=True, ensure_ascii=False)
+    return f"{digest}:{hashlib.sha256(opts.encode('utf-8')).hexdigest()[:16]}"
+
+
+class ResultCache:
+    """两级结果缓存
+
+    - 内存层：按字节预算淘汰的 LRU
+    - 磁盘层（可选）：sqlite，按 TTL 过期
+
+    值需可 JSON 序列化。
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        db_path: Optional[str] = None,
+        ttl: Optional[float] = None,
+    ):
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.db_path = db_path if db_path is not None else os.getenv("RESULT_CACHE_DB", "")
+        self.ttl = ttl if ttl is not None else float(os.getenv("RESULT_CACHE_TTL", "86400"))
+        self._memory: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        if self.db_path:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+            )
+            self._db.commit()
+            self.purge_expired()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            raw = None
+            entry = self._memory.get(key)
+            if entry is not None:
+                raw = entry[0]
+                self._memory.move_to_end(key)
+            elif self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row[1] > time.time():
+                    raw = row[0]
+                    self._put_memory(key, raw)
+                elif row:
+                    self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    self._db.commit()
+            if raw is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any):
+        raw = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._put_memory(key, raw)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                    (key, raw, time.time() + self.ttl),
+                )
+                self._db.commit()
+
+    def _put_memory(self, key: str, raw: str):
+        size = len(raw.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old[1]
+        self._memory[key] = (raw, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    def purge_expired(self):
+        """清理磁盘层中已过期的条目"""
+        if self._db is None:
+            return
+        with self._lock:
+            cur = self._db.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+            self._db.commit()
+        if cur.rowcount:
+            logger.info(f"缓存清理过期条目: {cur.rowcount}")
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._memory),
+            "bytes": self._memory_bytes,
+            "max_bytes": self.max_bytes,
+            "disk": bool(self._db),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
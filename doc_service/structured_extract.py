@@ -0,0 +1,299 @@
+import codecs
+import io
+import json
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+_CHUNK_SIZE = 64 * 1024
+_WHITESPACE = ' \t\r\n'
+# 解码错误出现在缓冲区末尾这么多字符以内时，可能只是值还没读完（被截断的数字、字面量、转义）
+_INCOMPLETE_TAIL = 16
+
+
+def _infer_type(value: Any) -> str:
+    """推断单个值的类型，CSV 中可解析为数字的字符串记为 number"""
+    if value is None or value == "":
+        return "empty"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        try:
+            float(value)
+            return "number"
+        except ValueError:
+            return "string"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, list):
+        return "array"
+    return type(value).__name__
+
+
+def _merge_schema(schema: Dict[str, str], row: Dict[str, Any]):
+    """按样本行推断列类型，出现多种非空类型时记为 mixed"""
+    for key, value in row.items():
+        kind = _infer_type(value)
+        current = schema.get(key)
+        if current is None or current == "empty":
+            schema[key] = kind
+        elif kind != "empty" and kind != current:
+            schema[key] = "mixed"
+
+
+def _size(stream: BinaryIO) -> int:
+    """返回流的总字节数，不改变当前位置"""
+    pos = stream.tell()
+    stream.seek(0, io.SEEK_END)
+    size = stream.tell()
+    stream.seek(pos)
+    return size
+
+
+def _estimate(count: int, sampled: int, total: int) -> Optional[int]:
+    """按样本平均每条字节数估算总条数"""
+    if count <= 0 or sampled <= 0:
+        return None
+    return int(count * total / sampled)
+
+
+def extract_csv(stream: BinaryIO, max_chars: int = 5000) -> Tuple[str, bool, Dict[str, Any]]:
+    """增量解析 CSV：逐行读取，输出达到 max_chars 即停止
+
+    Args:
+        stream (BinaryIO): 可 seek 的上传文件
+        max_chars (int): 输出字符上限
+
+    Returns:
+        Tuple[str, bool, Dict[str, Any]]: 样本行（JSON 数组，只包含完整的行）、
+        是否截断，以及列名/类型/行数摘要
+
+    Raises:
+        ValueError: 文件无法按 UTF-8 解码或不是合法 CSV
+    """
+    import csv
+
+    total = _size(stream)
+    stream.seek(0)
+    wrapper = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(wrapper)
+    parts: List[str] = []
+    length = 2
+    schema: Dict[str, str] = {}
+    rows = 0
+    sampled = 0
+    truncated = False
+    try:
+        for row in reader:
+            piece = json.dumps(row, ensure_ascii=False)
+            if length + len(piece) + 2 > max_chars:
+                truncated = True
+                break
+            parts.append(piece)
+            length += len(piece) + 2
+            rows += 1
+            # 按原始 CSV 行长度近似样本字节数（忽略引号）
+            sampled += len(','.join(v for v in row.values() if isinstance(v, str)).encode('utf-8')) + 1
+            _merge_schema(schema, row)
+        columns = reader.fieldnames or []
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ValueError(str(e))
+    finally:
+        # 解除包装，避免 wrapper 回收时关闭上传文件
+        wrapper.detach()
+    summary = {
+        "format": "csv",
+        "columns": [{"name": c, "type": schema.get(c, "empty")} for c in columns],
+        "rows_sampled": rows,
+        "rows_total": None if truncated else rows,
+    }
+    if truncated:
+        header = len(','.join(columns).encode('utf-8')) + 1
+        summary["rows_estimated"] = _estimate(rows, sampled, total - header)
+    return "[" + ", ".join(parts) + "]", truncated, summary
+
+
+class _JSONStream:
+    """在分块读取的文本缓冲区上逐个解码 JSON 值"""
+
+    def __init__(self, stream: BinaryIO, encoding: str, max_buffer: int):
+        self._stream = stream
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._json = json.JSONDecoder()
+        self._max_buffer = max_buffer
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self._stream.read(_CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            self.buffer += self._decoder.decode(b"", final=True)
+            return True
+        # 丢弃已消费部分，避免缓冲区随文件增长
+        self.buffer = self.buffer[self.pos:] + self._decoder.decode(chunk)
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """跳过空白，返回下一个字符；文件结束时返回空串"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"位置 {self.pos} 处应为 '{char}'")
+        self.pos += 1
+
+    def value(self) -> Tuple[Any, str]:
+        """解码下一个值，返回 (值, 原始文本)
+
+        值必须后跟其他字符（或已到文件末尾）才算完整，避免把被分块截断的数字当成完整值。
+        解码错误不在缓冲区末尾时即为格式错误，立即抛出，不会因继续读取而被当成值过大。
+
+        Raises:
+            ValueError: JSON 格式错误
+            BufferError: 单个值超过缓冲区上限，且已读到的部分是合法的 JSON 开头
+        """
+        self.peek()
+        while True:
+            try:
+                obj, end = self._json.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof:
+                    raw = self.buffer[self.pos:end]
+                    self.pos = end
+                    return obj, raw
+            except json.JSONDecodeError as e:
+                if self.eof or not self._incomplete(e):
+                    raise
+            if len(self.buffer) - self.pos > self._max_buffer:
+                raise BufferError("单个 JSON 值过大")
+            self._fill()
+
+    def _incomplete(self, error: json.JSONDecodeError) -> bool:
+        """解码失败是否可能只因值还没有完整读入缓冲区
+
+        解码按顺序进行，出错位置之前的内容都是合法的；字符串未结束时错误位置为字符串开头。
+        """
+        return error.msg.startswith("Unterminated string") or error.pos >= len(self.buffer) - _INCOMPLETE_TAIL
+
+
+def _iter_members(js: _JSONStream, close: str, keyed: bool) -> Iterator[Tuple[Optional[str], Any, str]]:
+    """逐个产出数组元素或对象成员：(键, 值, 原始文本)"""
+    if js.peek() == close:
+        js.pos += 1
+        return
+    while True:
+        key = None
+        if keyed:
+            key, _ = js.value()
+            if not isinstance(key, str):
+                raise ValueError("对象键必须是字符串")
+            js.expect(':')
+        obj, raw = js.value()
+        yield key, obj, raw
+        char = js.peek()
+        if char == ',':
+            js.pos += 1
+        elif char == close:
+            js.pos += 1
+            return
+        else:
+            raise ValueError(f"位置 {js.pos} 处应为 ',' 或 '{close}'")
+
+
+def _extract_json(stream: BinaryIO, encoding: str, max_chars: int) -> Tuple[str, bool, Dict[str, Any]]:
+    total = _size(stream)
+    stream.seek(0)
+    js = _JSONStream(stream, encoding, max_buffer=max(4 * max_chars, 1024 * 1024))
+    first = js.peek()
+    if first == '\ufeff':
+        js.pos += 1
+        first = js.peek()
+    if first not in ('[', '{'):
+        try:
+            obj, raw = js.value()
+        except BufferError:
+            # 合法但过大的标量（超长字符串或数字）：输出已读到的原文开头
+            text = js.buffer[js.pos:js.pos + max_chars]
+            return text, True, {"format": "json", "type": "string" if first == '"' else "number"}
+        if js.peek():
+            raise ValueError("JSON 顶层值之后存在多余内容")
+        text = json.dumps(obj, ensure_ascii=False)
+        truncated = len(text) > max_chars
+        return text[:max_chars], truncated, {"format": "json", "type": _infer_type(obj)}
+
+    keyed = first == '{'
+    js.pos += 1
+    close = '}' if keyed else ']'
+    parts: List[str] = []
+    length = 2
+    count = 0
+    sampled = 0
+    schema: Dict[str, str] = {}
+    truncated = False
+    try:
+        for key, obj, raw in _iter_members(js, close, keyed):
+            piece = json.dumps(obj, ensure_ascii=False)
+            if keyed:
+                piece = f"{json.dumps(key, ensure_ascii=False)}: {piece}"
+            if length + len(piece) + 2 > max_chars:
+                truncated = True
+                break
+            parts.append(piece)
+            length += len(piece) + 2
+            count += 1
+            sampled += len(raw.encode(encoding)) + 1
+            if keyed:
+                sampled += len(key.encode(encoding)) + 3
+            # 只对记录数组推断字段类型，顶层对象的键已体现在样本中
+            if not keyed and isinstance(obj, dict):
+                _merge_schema(schema, obj)
+    except BufferError:
+        # 单个元素过大（已读到的部分合法），与达到输出上限一样视为截断
+        truncated = True
+    if not truncated and js.peek():
+        raise ValueError("JSON 顶层值之后存在多余内容")
+
+    label = "keys" if keyed else "items"
+    summary: Dict[str, Any] = {
+        "format": "json",
+        "type": "object" if keyed else "array",
+        f"{label}_sampled": count,
+        f"{label}_total": None if truncated else count,
+    }
+    if schema:
+        summary["fields"] = [{"name": k, "type": v} for k, v in schema.items()]
+    if truncated:
+        summary[f"{label}_estimated"] = _estimate(count, sampled, total)
+    text = ("{" if keyed else "[") + ", ".join(parts) + close
+    return text, truncated, summary
+
+
+def extract_json(stream: BinaryIO, max_chars: int = 5000) -> Tuple[str, bool, Dict[str, Any]]:
+    """增量解析 JSON：顶层为数组或对象时逐个解码元素，输出达到 max_chars 即停止
+
+    先按 UTF-8 解码，失败时回退到 GBK。
+
+    Returns:
+        Tuple[str, bool, Dict[str, Any]]: 样本（只包含完整元素的合法 JSON）、
+        是否截断，以及类型/字段/数量摘要
+
+    Raises:
+        ValueError: JSON 格式错误或编码无法识别
+    """
+    try:
+        return _extract_json(stream, 'utf-8', max_chars)
+    except UnicodeDecodeError:
+        try:
+            return _extract_json(stream, 'gbk', max_chars)
+        except UnicodeDecodeError as e:
+            raise ValueError(str(e))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 服务模块按脚本目录导入（与 uvicorn main:app 一致）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
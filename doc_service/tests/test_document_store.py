@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from document_store import DocumentStore
+
+SOURCES = {
+    "javascript": """import x from "mod";
+const alpha = () => { if (a) { b(); } };
+const beta = function () { return c(); };
+class Foo {
+  bar() { return alpha(); }
+  baz() { if (x && y) { z(); } }
+}
+function gamma(n) { while (n) { n--; } }
+let delta = (q) => q ? one() : two();
+""",
+    "go": """package main
+import "fmt"
+type A struct { x int }
+type B struct { y int }
+func (a *A) Run() { if a.x > 0 { fmt.Println(a) } }
+func (b B) Run() { for { b.y++ } }
+func helper(n int) int { return n }
+""",
+    "cpp": """#include <vector>
+namespace ns {
+struct P { int v; };
+int f(int a) { if (a) return g(a); return 0; }
+class Q { public: void m() { while (1) {} } };
+}
+int main() { return ns::f(1); }
+""",
+}
+PIECES = ["alpha", "beta", "A", "B", "x", "(", ")", "{", "}", ";", "\n", " ", "if (a) {}", "Run",
+          "= () => 1;", "const k ", ""]
+
+
+def _comparable(result):
+    return {k: v for k, v in result.items() if k not in ("document_id", "version", "incremental")}
+
+
+@pytest.mark.parametrize("language", sorted(SOURCES))
+def test_incremental_matches_full_parse(language):
+    pytest.importorskip(f"tree_sitter_{language}")
+    rnd = random.Random(language)
+    text = SOURCES[language]
+    store = DocumentStore()
+    document_id = store.analyze(language, code=text)["document_id"]
+    for _ in range(300):
+        start = rnd.randrange(len(text) + 1)
+        end = min(len(text), start + rnd.choice((0, 0, 1, 3, 6)))
+        piece = rnd.choice(PIECES)
+        text = text[:start] + piece + text[end:]
+        incremental = store.analyze(language, document_id=document_id,
+                                    edits=[{"start": start, "end": end, "text": piece}])
+        assert incremental["incremental"]
+        assert _comparable(incremental) == _comparable(DocumentStore().analyze(language, code=text)), text
@@ -0,0 +1,169 @@
+import asyncio
+import io
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from job_queue import JobQueue
+
+
+def _queue(tmp_path, **kwargs) -> JobQueue:
+    queue = JobQueue(db_path=str(tmp_path / "jobs.db"), spool_dir=str(tmp_path / "files"), **kwargs)
+
+    async def echo(params, files):
+        return params
+
+    queue.register("echo", echo)
+    return queue
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_claim_order_follows_priority_then_submission(tmp_path):
+    queue = _queue(tmp_path)
+    low = queue.submit("echo", {"n": 1}, priority=0)
+    high = queue.submit("echo", {"n": 2}, priority=5)
+    low_later = queue.submit("echo", {"n": 3}, priority=0)
+    assert queue.get(low_later["id"])["position"] == 2
+    claimed = [queue._claim()["id"] for _ in range(3)]
+    assert claimed == [high["id"], low["id"], low_later["id"]]
+    assert queue._claim() is None
+
+
+def test_cancel_queued_job_removes_files(tmp_path):
+    queue = _queue(tmp_path)
+    job = queue.submit("echo", {}, [("a.txt", io.BytesIO(b"data"))])
+    assert (tmp_path / "files" / job["id"]).exists()
+    assert queue.cancel(job["id"])["status"] == "cancelled"
+    assert not (tmp_path / "files" / job["id"]).exists()
+    # 已取消的任务不会被认领
+    assert queue._claim() is None
+
+
+def test_cancel_running_job_stops_handler(tmp_path):
+    queue = _queue(tmp_path)
+    started = threading.Event()
+    stopped = []
+
+    async def block(params, files):
+        started.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            stopped.append(True)
+            raise
+
+    queue.register("block", block)
+
+    async def run():
+        await queue.start()
+        try:
+            job = await asyncio.to_thread(queue.submit, "block", {}, [("a.txt", io.BytesIO(b"data"))])
+            await asyncio.to_thread(started.wait, 5)
+            cancelled = await asyncio.to_thread(queue.cancel, job["id"])
+            assert cancelled["status"] == "cancelled"
+            for _ in range(50):
+                if stopped and not (tmp_path / "files" / job["id"]).exists():
+                    break
+                await asyncio.sleep(0.05)
+            return job
+        finally:
+            await queue.close()
+
+    job = asyncio.run(run())
+    assert stopped == [True]
+    assert not (tmp_path / "files" / job["id"]).exists()
+    assert queue.get(job["id"])["status"] == "cancelled"
+
+
+def test_cancel_from_other_instance_is_picked_up_by_owner(tmp_path):
+    owner = _queue(tmp_path)
+    other = _queue(tmp_path)
+    started = threading.Event()
+
+    async def block(params, files):
+        started.set()
+        await asyncio.sleep(60)
+
+    owner.register("block", block)
+    other.register("block", block)
+
+    async def run():
+        await owner.start()
+        try:
+            job = await asyncio.to_thread(owner.submit, "block", {})
+            await asyncio.to_thread(started.wait, 5)
+            # other 没有该任务的协程，只更新状态，由 owner 的 _watch_cancelled 停止
+            await asyncio.to_thread(other.cancel, job["id"])
+            for _ in range(60):
+                if not owner._running:
+                    break
+                await asyncio.sleep(0.05)
+            return owner._running
+        finally:
+            await owner.close()
+
+    assert asyncio.run(run()) == {}
+
+
+@pytest.mark.parametrize("attempts, status", [(1, "queued"), (3, "failed")])
+def test_recover_requeues_jobs_of_dead_owner(tmp_path, attempts, status):
+    queue = _queue(tmp_path)
+    job = queue.submit("echo", {})
+    queue._claim()
+    queue._db.execute("UPDATE jobs SET owner = ?, attempts = ? WHERE id = ?", (_dead_pid(), attempts, job["id"]))
+    queue._recover()
+    assert queue.get(job["id"])["status"] == status
+
+
+def test_recover_keeps_jobs_of_live_owner(tmp_path):
+    queue = _queue(tmp_path)
+    job = queue.submit("echo", {})
+    queue._claim()
+    queue._db.execute("UPDATE jobs SET owner = 1 WHERE id = ?", (job["id"],))
+    queue._recover()
+    assert queue.get(job["id"])["status"] == "running"
+
+
+def test_purge_after_retention(tmp_path):
+    queue = _queue(tmp_path, retention=60)
+    old = queue.submit("echo", {})
+    recent = queue.submit("echo", {})
+    queued = queue.submit("echo", {"n": 1}, priority=-1)
+    queue.cancel(old["id"])
+    queue.cancel(recent["id"])
+    queue._db.execute("UPDATE jobs SET finished = ? WHERE id = ?", (time.time() - 120, old["id"]))
+    queue.purge_expired()
+    assert queue.get(old["id"]) is None
+    assert queue.get(recent["id"])["status"] == "cancelled"
+    assert queue.get(queued["id"])["status"] == "queued"
+
+
+def test_two_instances_never_claim_the_same_job(tmp_path):
+    first = _queue(tmp_path, max_queued=500)
+    second = _queue(tmp_path, max_queued=500)
+    submitted = {first.submit("echo", {"n": i})["id"] for i in range(200)}
+    claimed = {id(first): [], id(second): []}
+
+    def drain(queue):
+        while True:
+            row = queue._claim()
+            if row is None:
+                return
+            claimed[id(queue)].append(row["id"])
+
+    threads = [threading.Thread(target=drain, args=(queue,)) for queue in (first, second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ids = claimed[id(first)] + claimed[id(second)]
+    assert len(ids) == len(set(ids))
+    assert set(ids) == submitted
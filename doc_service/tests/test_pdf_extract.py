@@ -0,0 +1,75 @@
+import asyncio
+import io
+import tempfile
+
+import pytest
+
+from pdf_extract import PDFExtractor, parse_page_ranges
+
+
+def _pdf(pages: int) -> bytes:
+    """生成每页一行文字的最小 PDF"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for i in range(pages):
+        content = f"BT /F1 12 Tf 72 720 Td (Page {i + 1} text) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("spec, total, expected", [
+    (None, 3, [0, 1, 2]),
+    ("  ", 3, [0, 1, 2]),
+    ("1-3,5", 10, [0, 1, 2, 4]),
+    ("8-", 10, [7, 8, 9]),
+    ("-2", 10, [0, 1]),
+    ("3,1-3", 10, [2, 0, 1]),
+    ("5-20", 6, [4, 5]),
+    ("1,,2", 3, [0, 1]),
+])
+def test_parse_page_ranges(spec, total, expected):
+    assert parse_page_ranges(spec, total) == expected
+
+
+@pytest.mark.parametrize("spec", ["0", "3-1", "a", "1-b"])
+def test_parse_page_ranges_rejects_invalid(spec):
+    with pytest.raises(ValueError):
+        parse_page_ranges(spec, 10)
+
+
+@pytest.mark.parametrize("max_chars", [100_000, 200])
+def test_sharded_output_matches_single_process(max_chars, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    data = _pdf(40)
+    single = PDFExtractor(workers=1)
+    sharded = PDFExtractor(workers=2, min_pages=2, shard_pages=4)
+
+    async def run():
+        try:
+            return (await single.extract(io.BytesIO(data), max_chars=max_chars),
+                    await sharded.extract(io.BytesIO(data), max_chars=max_chars))
+        finally:
+            sharded.shutdown()
+
+    expected, actual = asyncio.run(run())
+    assert actual == expected
+    assert expected[0].startswith("Page 1 text Page 2 text")
+    assert expected[1] == (max_chars == 200)
+    # 分片用的临时文件已删除
+    assert list(tmp_path.iterdir()) == []
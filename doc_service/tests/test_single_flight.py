@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_follower_gets_result_when_leader_is_cancelled():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def run():
+        release = asyncio.Event()
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return "result"
+
+        leader = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == "result"
+    assert calls == [1]
+    assert flight.stats() == {"inflight": 0, "leaders": 1, "coalesced": 1}
+
+
+def test_exception_reaches_every_waiter_and_releases_key():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def run():
+        release = asyncio.Event()
+
+        async def fail():
+            calls.append(1)
+            await release.wait()
+            raise ValueError("boom")
+
+        waiters = [asyncio.ensure_future(flight.do("key", fail)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        inflight = flight.stats()["inflight"]
+
+        async def succeed():
+            calls.append(2)
+            return "ok"
+
+        # 出错后 key 已释放，再次调用重新计算
+        return results, inflight, await flight.do("key", succeed)
+
+    results, inflight, retried = asyncio.run(run())
+    assert all(isinstance(r, ValueError) and str(r) == "boom" for r in results)
+    assert inflight == 0
+    assert retried == "ok"
+    assert calls == [1, 2]
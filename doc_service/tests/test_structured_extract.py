@@ -0,0 +1,34 @@
+import io
+import json
+
+import pytest
+
+from structured_extract import extract_json
+
+_BIG = "x" * 3_000_000
+
+
+def test_oversized_scalar_is_truncated():
+    text, truncated, summary = extract_json(io.BytesIO(json.dumps(_BIG).encode()), 100)
+    assert truncated
+    assert summary["type"] == "string"
+    assert len(text) == 100
+
+
+def test_invalid_json_deep_in_large_file_is_value_error():
+    data = "[" + "1, " * 10 + "tru x, " + "2, " * 1_000_000 + "3]"
+    with pytest.raises(ValueError):
+        extract_json(io.BytesIO(data.encode()), 10_000_000)
+
+
+def test_scalar_with_trailing_content_is_value_error():
+    with pytest.raises(ValueError):
+        extract_json(io.BytesIO(b'"abc" x'))
+
+
+def test_oversized_member_is_truncated():
+    data = '{"a": 1, "b": ' + json.dumps(_BIG) + "}"
+    text, truncated, summary = extract_json(io.BytesIO(data.encode()), 100)
+    assert truncated
+    assert text == '{"a": 1}'
+    assert summary["keys_total"] is None
@@ -0,0 +1,65 @@
+import asyncio
+from typing import List
+
+import httpx
+from fastapi import FastAPI, File, UploadFile
+
+from upload_limits import BodySizeLimitMiddleware, multi_file_limit, single_file_limit
+
+_BOUNDARY = "limit-test"
+
+
+def _app(calls: list) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=10_000_000, routes={"/small": 64 * 1024})
+
+    @app.post("/small")
+    async def small(files: List[UploadFile] = File(...)):
+        calls.append("small")
+        return {"files": len(files)}
+
+    @app.post("/large")
+    async def large(files: List[UploadFile] = File(...)):
+        calls.append("large")
+        return {"files": len(files)}
+
+    return app
+
+
+async def _chunks(size: int):
+    """分块发送的 multipart 请求体，不带 Content-Length"""
+    yield (f"--{_BOUNDARY}\r\nContent-Disposition: form-data; name=\"files\"; filename=\"a.png\"\r\n"
+           "Content-Type: image/png\r\n\r\n").encode()
+    for _ in range(size // 8192):
+        yield b"x" * 8192
+    yield f"\r\n--{_BOUNDARY}--\r\n".encode()
+
+
+def _post(app: FastAPI, path: str, size: int) -> httpx.Response:
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(path, content=_chunks(size),
+                                     headers={"Content-Type": f"multipart/form-data; boundary={_BOUNDARY}"})
+    return asyncio.run(run())
+
+
+def test_streamed_body_over_route_limit_rejected_before_handler():
+    calls = []
+    response = _post(_app(calls), "/small", 256 * 1024)
+    assert response.status_code == 413
+    assert calls == []
+
+
+def test_other_routes_use_global_limit():
+    calls = []
+    app = _app(calls)
+    assert _post(app, "/small", 32 * 1024).status_code == 200
+    assert _post(app, "/large", 256 * 1024).status_code == 200
+    assert calls == ["small", "large"]
+
+
+def test_multi_file_limit_scales_with_count():
+    single = single_file_limit([".png"])
+    assert multi_file_limit([".png"], 1) == single
+    assert multi_file_limit([".png"], 3) == 3 * (single - 1024 * 1024) + 1024 * 1024
@@ -0,0 +1,76 @@
+import asyncio
+
+from upstream_gateway import CLOSED, HALF_OPEN, UpstreamError, UpstreamGateway
+
+
+def _tripped_gateway() -> UpstreamGateway:
+    gateway = UpstreamGateway(retries=0, rate=0, breaker_threshold=1, breaker_cooldown=0.01)
+
+    async def fail():
+        raise UpstreamError(503, "unavailable")
+
+    async def trip():
+        try:
+            await gateway.call(fail)
+        except UpstreamError:
+            pass
+        await asyncio.sleep(0.02)
+
+    asyncio.run(trip())
+    return gateway
+
+
+def test_cancelled_probe_releases_half_open_slot():
+    gateway = _tripped_gateway()
+
+    async def run():
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(60)
+
+        probe = asyncio.ensure_future(gateway.call(hang))
+        await started.wait()
+        assert gateway.state == HALF_OPEN
+        probe.cancel()
+        try:
+            await probe
+        except asyncio.CancelledError:
+            pass
+
+        async def ok():
+            return "ok"
+
+        return await gateway.call(ok)
+
+    assert asyncio.run(run()) == "ok"
+    assert gateway.state == CLOSED
+
+
+def test_cancelled_stream_probe_releases_half_open_slot():
+    gateway = _tripped_gateway()
+
+    async def run():
+        async def hang():
+            await asyncio.sleep(60)
+
+        async def open_stream():
+            async with gateway.stream(hang):
+                pass
+
+        probe = asyncio.ensure_future(open_stream())
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        try:
+            await probe
+        except asyncio.CancelledError:
+            pass
+
+        async def ok():
+            return "ok"
+
+        return await gateway.call(ok)
+
+    assert asyncio.run(run()) == "ok"
+    assert gateway.state == CLOSED
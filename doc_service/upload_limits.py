@@ -0,0 +1,148 @@
+import logging
+import os
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+_MB = 1024 * 1024
+
+# 各类型单个文件的默认字节上限，可用 UPLOAD_MAX_<扩展名>（如 UPLOAD_MAX_PDF）覆盖
+DEFAULT_LIMITS: Dict[str, int] = {
+    ".pdf": 50 * _MB,
+    ".docx": 20 * _MB,
+    ".csv": 100 * _MB,
+    ".json": 100 * _MB,
+    ".md": 10 * _MB,
+    ".txt": 10 * _MB,
+    ".sh": 10 * _MB,
+    ".yaml": 10 * _MB,
+    ".yml": 10 * _MB,
+    ".png": 20 * _MB,
+    ".jpg": 20 * _MB,
+    ".jpeg": 20 * _MB,
+    ".bmp": 20 * _MB,
+    ".gif": 20 * _MB,
+    ".webp": 20 * _MB,
+    ".tif": 100 * _MB,
+    ".tiff": 100 * _MB,
+}
+# 未列出类型的上限
+DEFAULT_LIMIT = int(os.getenv("UPLOAD_MAX_DEFAULT", str(10 * _MB)))
+# 各服务单文件上传接口接受的类型
+DOCUMENT_TYPES = (".pdf", ".docx", ".csv", ".json", ".md", ".txt", ".sh", ".yaml", ".yml")
+IMAGE_TYPES = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp", ".tif", ".tiff")
+
+
+def limit_for(filename: str) -> int:
+    """返回该文件名对应类型的字节上限"""
+    ext = Path(filename or "").suffix.lower()
+    override = os.getenv(f"UPLOAD_MAX_{ext[1:].upper()}") if ext else None
+    if override:
+        return int(override)
+    return DEFAULT_LIMITS.get(ext, DEFAULT_LIMIT)
+
+
+def single_file_limit(extensions: Iterable[str]) -> int:
+    """只上传一个文件的接口的请求体上限：所接受类型中最大的单文件上限，加 1MB 表单字段余量
+
+    未列出的类型按 DEFAULT_LIMIT 计入，与 check_upload 的判定一致。
+    """
+    return max([limit_for(f"upload{ext}") for ext in extensions] + [DEFAULT_LIMIT]) + _MB
+
+
+def multi_file_limit(extensions: Iterable[str], count: int) -> int:
+    """一次最多上传 count 个文件的接口的请求体上限：count 个最大单文件上限，加 1MB 表单字段余量"""
+    return count * (single_file_limit(extensions) - _MB) + _MB
+
+
+def upload_size(stream: BinaryIO) -> int:
+    """返回已上传文件的大小，不读取内容（超过内存阈值的上传已落盘）"""
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def check_upload(filename: str, stream: BinaryIO) -> int:
+    """校验单个上传文件是否超过其类型的上限
+
+    Returns:
+        int: 文件字节数
+
+    Raises:
+        HTTPException: 超过上限时返回 413
+    """
+    size = upload_size(stream)
+    limit = limit_for(filename)
+    if size > limit:
+        logger.warning(f"上传文件过大: {filename} ({size} > {limit})")
+        raise HTTPException(status_code=413, detail=f"File too large: {filename} (max {limit} bytes)")
+    return size
+
+
+class BodySizeLimitMiddleware:
+    """边读取边限制请求体总大小的 ASGI 中间件
+
+    Content-Length 超限时不读取请求体直接返回 413；分块上传或
+    Content-Length 不可信时，在累计读取的字节数超限的那一刻中止。
+    multipart 解析器把超过内存阈值的文件写入临时文件，因此上限内的
+    大文件也不会整体驻留内存。
+
+    routes 按路径给出更小的上限（如单文件接口取所接受类型中最大的上限），
+    其余路径使用 max_bytes。中间件看不到文件名，单个文件的分类型上限
+    只能在请求体接收完后由 check_upload 校验：例如 10MB 上限的 .md
+    在单文件接口上最多会先接收到该接口的上限（落盘，不占内存）才被拒绝。
+    """
+
+    def __init__(self, app, max_bytes: int = None, routes: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes or int(os.getenv("UPLOAD_MAX_BODY", str(max(DEFAULT_LIMITS.values()) + _MB)))
+        self.routes = {path: min(limit, self.max_bytes) for path, limit in (routes or {}).items()}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        limit = self.routes.get(scope.get("path"), self.max_bytes)
+        headers = dict(scope.get("headers") or [])
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            return await self._reject(scope, receive, send, limit)
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=f"Request body too large (max {limit} bytes)")
+            return message
+
+        async def tracked_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except HTTPException as e:
+            if e.status_code != 413 or started:
+                raise
+            await self._reject(scope, receive, send, limit)
+
+    async def _reject(self, scope, receive, send, limit: int):
+        logger.warning(f"请求体超过上限: {scope.get('path')} (max {limit} bytes)")
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": f"Request body too large (max {limit} bytes)"},
+            headers={"Connection": "close"},
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,312 @@
+import asyncio
+import email.utils
+import hashlib
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# 可重试的上游状态码
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+# 熔断器状态，数值用于导出指标
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class UpstreamError(Exception):
+    """上游返回非200状态；retry_after 为响应头中的 Retry-After（秒）"""
+
+    def __init__(self, status: int, text: str, retry_after: Optional[float] = None):
+        super().__init__(f"DeepSeek API错误 (状态码: {status}): {text}")
+        self.status = status
+        self.text = text
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开，请求被直接拒绝"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After：秒数或 HTTP 日期"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """令牌桶限速：每秒补充 rate 个令牌，最多积累 burst 个；rate<=0 表示不限速"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self._updated = time.monotonic()
+        # 上游返回 429 时整体暂停到该时间点
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if self.rate <= 0 and not self.paused_until:
+            return
+        # 加锁保证等待者按到达顺序取得令牌
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                if self.rate <= 0:
+                    return
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class UpstreamGateway:
+    """DeepSeek 调用网关：并发限制、令牌桶限速、带抖动的重试和熔断
+
+    - 全局并发上限 max_concurrency，单个调用方（按 Bearer token 区分）并发上限 max_per_caller
+    - 429/5xx/超时/连接错误按指数退避加全抖动重试，优先遵循 Retry-After；429 时暂停整个令牌桶
+    - 连续失败 breaker_threshold 次后熔断 breaker_cooldown 秒，期间直接拒绝；
+      冷却结束后放行一个试探请求，成功则恢复
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_per_caller: Optional[int] = None,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        retries: Optional[int] = None,
+        deadline: Optional[float] = None,
+        breaker_threshold: Optional[int] = None,
+        breaker_cooldown: Optional[float] = None,
+    ):
+        self.max_concurrency = max_concurrency or int(os.getenv("DEEPSEEK_MAX_CONCURRENCY", "8"))
+        self.max_per_caller = max_per_caller or int(os.getenv("DEEPSEEK_MAX_PER_CALLER", "4"))
+        self.retries = retries if retries is not None else int(os.getenv("DEEPSEEK_RETRIES", "3"))
+        self.deadline = deadline or float(os.getenv("DEEPSEEK_DEADLINE", "90"))
+        self.base_delay = 0.5
+        self.max_delay = 8.0
+        self.breaker_threshold = breaker_threshold or int(os.getenv("DEEPSEEK_BREAKER_THRESHOLD", "5"))
+        self.breaker_cooldown = breaker_cooldown or float(os.getenv("DEEPSEEK_BREAKER_COOLDOWN", "30"))
+        self.bucket = TokenBucket(
+            rate if rate is not None else float(os.getenv("DEEPSEEK_RATE", "5")),
+            burst or int(os.getenv("DEEPSEEK_BURST", "10")),
+        )
+        self._global = asyncio.Semaphore(self.max_concurrency)
+        self._callers: Dict[str, asyncio.Semaphore] = {}
+        self._caller_users: Dict[str, int] = {}
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.retried = 0
+        self.failures = 0
+        self.rejected = 0
+        self.rate_limited = 0
+
+    def _before_attempt(self) -> bool:
+        """熔断检查：打开期间拒绝；冷却结束后只放行一个试探请求，返回本次是否为试探请求"""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.breaker_cooldown:
+                self.rejected += 1
+                raise CircuitOpenError("DeepSeek 暂不可用（熔断中），请稍后重试")
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == HALF_OPEN:
+            if self._probing:
+                self.rejected += 1
+                raise CircuitOpenError("DeepSeek 恢复探测中，请稍后重试")
+            self._probing = True
+            return True
+        return False
+
+    def _record_success(self):
+        if self.state != CLOSED:
+            logger.info("DeepSeek 熔断恢复")
+        self.state = CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def _record_failure(self):
+        self.failures += 1
+        self._failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self._failures >= self.breaker_threshold:
+            if self.state != OPEN:
+                logger.error(f"DeepSeek 连续失败 {self._failures} 次，熔断 {self.breaker_cooldown:.0f}s")
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+
+    @asynccontextmanager
+    async def _slot(self, caller: str) -> AsyncIterator[None]:
+        """占用一个全局槽位和一个调用方槽位，并取得限速令牌"""
+        key = hashlib.sha256(caller.encode("utf-8")).hexdigest()[:16]
+        per_caller = self._callers.setdefault(key, asyncio.Semaphore(self.max_per_caller))
+        self._caller_users[key] = self._caller_users.get(key, 0) + 1
+        try:
+            self.waiting += 1
+            try:
+                await per_caller.acquire()
+                try:
+                    await self._global.acquire()
+                except BaseException:
+                    per_caller.release()
+                    raise
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            try:
+                await self.bucket.acquire()
+                yield
+            finally:
+                self.in_flight -= 1
+                self._global.release()
+                per_caller.release()
+        finally:
+            self._caller_users[key] -= 1
+            if not self._caller_users[key]:
+                # 没有请求使用时移除，避免按调用方累积
+                del self._caller_users[key]
+                self._callers.pop(key, None)
+
+    def _retry_delay(self, error: Exception, attempt: int, started: float) -> float:
+        """返回下次重试前的等待时间；不可重试或超出重试次数/截止时间时重新抛出"""
+        if isinstance(error, UpstreamError):
+            if error.status not in RETRY_STATUSES:
+                raise error
+            if error.status == 429:
+                self.rate_limited += 1
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, self.base_delay)
+            if getattr(error, "status", None) == 429:
+                self.bucket.pause(retry_after)
+        if attempt >= self.retries or time.monotonic() - started + delay > self.deadline:
+            raise error
+        self.retried += 1
+        logger.warning(f"DeepSeek 调用失败，{delay:.1f}s 后重试 ({attempt + 1}/{self.retries}): {error}")
+        return delay
+
+    def _is_failure(self, error: Exception) -> bool:
+        """计入熔断的失败：5xx、超时和连接错误（4xx 为请求本身的问题）"""
+        if isinstance(error, UpstreamError):
+            return error.status >= 500 or error.status == 408
+        return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+    async def call(self, send: Callable[[], Awaitable[Any]], caller: str = "") -> Any:
+        """执行一次上游请求，按策略重试
+
+        Args:
+            send: 发起一次请求的协程函数，非200时抛出 UpstreamError
+            caller: 调用方标识（如请求方的 token），用于单调用方并发限制
+
+        Raises:
+            CircuitOpenError: 熔断中
+            UpstreamError / aiohttp.ClientError / asyncio.TimeoutError: 重试后仍失败
+        """
+        self.calls += 1
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            probe = self._before_attempt()
+            try:
+                async with self._slot(caller):
+                    result = await send()
+            except (UpstreamError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if self._is_failure(e):
+                    self._record_failure()
+                elif probe:
+                    self._probing = False
+                delay = self._retry_delay(e, attempt, started)
+            except BaseException:
+                # 取消或其他异常：不计入熔断，但要释放试探名额，否则半开状态会拒绝后续所有请求
+                if probe:
+                    self._probing = False
+                raise
+            else:
+                self._record_success()
+                return result
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def stream(self, send: Callable[[], Awaitable[aiohttp.ClientResponse]], caller: str = "") -> AsyncIterator[aiohttp.ClientResponse]:
+        """建立流式连接（失败按策略重试），读取期间一直占用并发槽位
+
+        send 返回未读取的响应（状态非200时应抛出 UpstreamError）；退出时释放响应。
+        开始读取后的中断不再重试，由调用方处理。
+        """
+        self.calls += 1
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            probe = self._before_attempt()
+            delay = None
+            try:
+                async with self._slot(caller):
+                    try:
+                        response = await send()
+                    except (UpstreamError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        if self._is_failure(e):
+                            self._record_failure()
+                        elif probe:
+                            self._probing = False
+                        delay = self._retry_delay(e, attempt, started)
+                    else:
+                        self._record_success()
+                        try:
+                            yield response
+                        finally:
+                            response.release()
+                        return
+            except BaseException:
+                # 同 call：被取消（如 SSE 客户端断开）或出现其他异常时释放试探名额
+                if probe:
+                    self._probing = False
+                raise
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "circuit_state": _STATE_CODES[self.state],
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "rate_tokens": round(self.bucket.tokens, 2),
+            "calls": self.calls,
+            "retries": self.retried,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "rate_limited": self.rate_limited,
+        }
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# 参与缓存键的请求字段：模型、消息与采样参数（stream 只影响传输方式，不参与）
+KEY_FIELDS = (
+    "model", "messages", "temperature", "top_p", "max_tokens", "stop",
+    "presence_penalty", "frequency_penalty", "seed", "response_format", "tools",
+)
+
+
+def cache_key(payload: dict) -> str:
+    """按 chat-completions 请求体生成缓存键"""
+    fields = {k: payload[k] for k in KEY_FIELDS if k in payload}
+    raw = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def cacheable(payload: dict, force: bool = False) -> bool:
+    """temperature 为 0 时输出可视为确定，才允许缓存；force=True 时忽略该限制
+
+    未设置 temperature 时按 API 默认值 1.0 处理。
+    """
+    return force or payload.get("temperature", 1.0) == 0
+
+
+class LLMCache:
+    """sqlite 持久化的 LLM 回复缓存
+
+    按 TTL 过期；总字节数超过 max_bytes 时按最近访问时间淘汰。
+    数据库在首次使用时才创建，未开启缓存的部署不会产生文件。
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        self.db_path = db_path or os.getenv("LLM_CACHE_DB", "llm_cache.db")
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+        self.ttl = ttl if ttl is not None else float(os.getenv("LLM_CACHE_TTL", "604800"))
+        self._db: Optional[sqlite3.Connection] = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, value TEXT, size INTEGER, expires REAL, accessed REAL)"
+            )
+            self._db.execute("DELETE FROM llm_cache WHERE expires <= ?", (time.time(),))
+            self._db.commit()
+            self._bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        return self._db
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            db = self._connect()
+            row = db.execute("SELECT value, size, expires FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[2] <= time.time():
+                db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                db.commit()
+                self._bytes -= row[1]
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (time.time(), key))
+            db.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        raw = json.dumps(value, ensure_ascii=False)
+        size = len(raw.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            old = db.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, raw, size, now + self.ttl, now),
+            )
+            self._bytes += size - (old[0] if old else 0)
+            self._evict(db)
+            db.commit()
+
+    def _evict(self, db: sqlite3.Connection):
+        """超出字节预算时删除过期条目，仍超出则按最近访问时间淘汰"""
+        if self._bytes <= self.max_bytes:
+            return
+        db.execute("DELETE FROM llm_cache WHERE expires <= ?", (time.time(),))
+        self._bytes = db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        evicted = 0
+        for key, size in db.execute("SELECT key, size FROM llm_cache ORDER BY accessed").fetchall():
+            if self._bytes <= self.max_bytes:
+                break
+            db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._bytes -= size
+            evicted += 1
+        if evicted:
+            logger.info(f"LLM 缓存淘汰条目: {evicted}")
+
+    def stats(self) -> dict:
+        return {
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
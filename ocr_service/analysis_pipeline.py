@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional
+
+import aiohttp
+
+from http_client import HTTPClient
+
+logger = logging.getLogger(__name__)
+
+
+class DocServiceError(Exception):
+    """doc_service 返回非200状态或无法连接"""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(f"doc_service 调用失败 (状态码: {status}): {detail}")
+        self.status = status
+        self.detail = detail
+
+
+class DocServiceClient:
+    """调用 doc_service /v1/analyze 的客户端
+
+    默认走进程共享的 HTTP 连接池（keep-alive 复用连接）；配置 DOC_SERVICE_SOCKET 时
+    改为经 Unix 域套接字连接同机部署的 doc_service（其 BIND=unix:<路径>），省去 TCP 开销，
+    同样保持长连接。
+    """
+
+    def __init__(self, http: HTTPClient, base_url: Optional[str] = None, socket_path: Optional[str] = None):
+        self.http = http
+        self.base_url = (base_url or os.getenv("DOC_SERVICE_URL", "http://localhost:4000")).rstrip("/")
+        self.socket_path = socket_path or os.getenv("DOC_SERVICE_SOCKET") or None
+        self._unix_session: Optional[aiohttp.ClientSession] = None
+        self.requests = 0
+        self.failures = 0
+
+    async def _session(self) -> aiohttp.ClientSession:
+        if not self.socket_path:
+            return await self.http.session()
+        if self._unix_session is None or self._unix_session.closed:
+            self._unix_session = aiohttp.ClientSession(
+                connector=aiohttp.UnixConnector(path=self.socket_path, keepalive_timeout=30),
+                timeout=aiohttp.ClientTimeout(total=self.http.total_timeout, connect=self.http.connect_timeout),
+            )
+        return self._unix_session
+
+    async def close(self):
+        if self._unix_session is not None:
+            await self._unix_session.close()
+            self._unix_session = None
+
+    async def analyze(self, text: str, token: str, prompt: Optional[str] = None) -> Dict[str, Any]:
+        """把识别文本交给 doc_service 分析（use_deepseek），返回其响应
+
+        Raises:
+            DocServiceError: 返回非200状态或连接失败
+        """
+        payload = {"code": text, "use_deepseek": True}
+        if prompt:
+            payload["prompt"] = prompt
+        headers = {"Authorization": f"Bearer {token}"}
+        self.requests += 1
+        session = await self._session()
+        try:
+            async with session.post(f"{self.base_url}/v1/analyze", headers=headers, json=payload) as resp:
+                if resp.status != 200:
+                    raise DocServiceError(resp.status, await resp.text())
+                return await resp.json()
+        except aiohttp.ClientError as e:
+            self.failures += 1
+            raise DocServiceError(502, str(e)) from e
+        except DocServiceError:
+            self.failures += 1
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "unix_socket": bool(self.socket_path),
+        }
+
+
+async def pipeline(first: Iterable[Awaitable[Dict[str, Any]]],
+                   second: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                   concurrency: int) -> AsyncIterator[Dict[str, Any]]:
+    """两阶段流水线：first 中每项完成后立即进入 second，与其余项的第一阶段重叠执行
+
+    第二阶段最多 concurrency 个同时进行；按完成顺序产出。迭代提前结束时取消未完成的项。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def chain(step: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+        item = await step
+        async with semaphore:
+            return await second(item)
+
+    tasks = [asyncio.ensure_future(chain(step)) for step in first]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,87 @@
+import logging
+import os
+from typing import Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPClient:
+    """进程级共享的 aiohttp 会话
+
+    在 FastAPI startup/shutdown 中启动和关闭，所有对外 HTTP 调用共用同一个
+    连接池，复用 keep-alive 连接，避免每次请求都重新做 TCP/TLS 握手。
+    """
+
+    def __init__(
+        self,
+        limit: Optional[int] = None,
+        limit_per_host: Optional[int] = None,
+        dns_ttl: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        total_timeout: Optional[float] = None,
+    ):
+        self.limit = limit or int(os.getenv("HTTP_POOL_LIMIT", "100"))
+        self.limit_per_host = limit_per_host or int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+        self.dns_ttl = dns_ttl or int(os.getenv("HTTP_DNS_TTL", "300"))
+        self.connect_timeout = connect_timeout or float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+        self.total_timeout = total_timeout or float(os.getenv("HTTP_TIMEOUT", "120"))
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            self.requests += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.connections_reused += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace
+
+    async def start(self):
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_ttl,
+            keepalive_timeout=30,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.total_timeout, connect=self.connect_timeout),
+            trace_configs=[self._trace_config()],
+        )
+        logger.info(f"HTTP连接池已启动: limit={self.limit}, per_host={self.limit_per_host}")
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            logger.info("HTTP连接池已关闭")
+
+    async def session(self) -> aiohttp.ClientSession:
+        """获取共享会话；未经 startup 启动时（如脚本直接调用）按需创建"""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+        }
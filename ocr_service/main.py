@@ -1,33 +1,64 @@
+import time
+# 尽早记录，用于统计模块导入耗时
+_IMPORT_START = time.perf_counter()
 import os
-from fastapi import FastAPI, UploadFile, File, HTTPException, Header, status, Form
-from fastapi.responses import JSONResponse
+import asyncio
+import json
+import shutil
+from fastapi import FastAPI, UploadFile, File, HTTPException, Header, status, Form, Request
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse, Response
+from starlette.routing import Match
 from dotenv import load_dotenv
-from PIL import Image
-import pytesseract
-import io
 import logging
 import sys
 from pathlib import Path
-import aiohttp
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from ocr_engine import OCREngine, OCRBusyError, OCRTimeoutError, count_frames
+from result_cache import ResultCache, make_key
+from http_client import HTTPClient
+from job_queue import JobQueue, JobQueueFull
+from single_flight import SingleFlight
+from upload_limits import IMAGE_TYPES, BodySizeLimitMiddleware, check_upload, multi_file_limit, single_file_limit
+from analysis_pipeline import DocServiceClient, DocServiceError, pipeline
+from startup import StartupTimer
+import metrics
+from metrics import stage
 
 # 加载.env文件
 load_dotenv(dotenv_path=Path(__file__).parent.parent / '.env')
 
 # 读取token
 API_TOKEN = os.getenv("TOKEN")
-
-# 调试：验证 TOKEN 加载
-print(f"🔍 OCR服务 - 当前工作目录: {os.getcwd()}")
-print(f"🔍 OCR服务 - .env 文件是否存在: {Path('.env').exists()}")
-print(f"🔍 OCR服务 - TOKEN 值: {API_TOKEN}")
-print(f"🔍 OCR服务 - TOKEN 长度: {len(API_TOKEN) if API_TOKEN else 0}")
-print("-" * 50)
+# /metrics 的 token，可与业务 TOKEN 分开配置给监控系统
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or API_TOKEN
 
 # 日志配置
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
+# 调试：验证 TOKEN 加载（不输出 TOKEN 本身）
+logging.debug(f"OCR服务 - 当前工作目录: {os.getcwd()}, .env 文件是否存在: {(Path(__file__).parent.parent / '.env').exists()}, "
+              f"TOKEN 已设置: {bool(API_TOKEN)}")
+
 app = FastAPI()
 
+# 单次批量请求允许的最大页数（多帧图片按帧计）
+OCR_BATCH_MAX_ITEMS = int(os.getenv("OCR_BATCH_MAX_ITEMS", "100"))
+# /ocr/batch 会把全部图片读入内存，请求体总字节数单独限制
+OCR_BATCH_MAX_BODY = int(os.getenv("OCR_BATCH_MAX_BODY", str(64 * 1024 * 1024)))
+# 后台任务单次允许的最大页数
+OCR_JOB_MAX_ITEMS = int(os.getenv("OCR_JOB_MAX_ITEMS", "1000"))
+
+# 边读取边限制请求体大小，超限立即返回 413；单图片接口按图片类型中最大的上限限制，
+# 多图片接口按最多文件数计算（/ocr/batch 另受 OCR_BATCH_MAX_BODY 限制）
+IMAGE_ROUTE_LIMIT = single_file_limit(IMAGE_TYPES)
+app.add_middleware(BodySizeLimitMiddleware, routes={
+    "/ocr": IMAGE_ROUTE_LIMIT,
+    "/ocr_and_analyze": IMAGE_ROUTE_LIMIT,
+    "/ocr/batch": min(multi_file_limit(IMAGE_TYPES, OCR_BATCH_MAX_ITEMS), OCR_BATCH_MAX_BODY),
+    "/jobs": multi_file_limit(IMAGE_TYPES, OCR_JOB_MAX_ITEMS),
+})
+
 if sys.platform == "win32":
     import winreg
 else:
@@ -60,19 +91,167 @@ def get_tesseract_path():
         except Exception:
             pass
     
-    # 4. 尝试系统 PATH（最后手段）
-    try:
-        pytesseract.get_tesseract_version()
-        return "tesseract"
-    except pytesseract.TesseractNotFoundError:
-        raise EnvironmentError(
-            "Tesseract OCR 未找到。请确保已安装并创建符号链接："
-            "mklink /D C:\\Tesseract \"C:\\Program Files\\Tesseract-OCR\""
-        )
+    # 4. 在系统 PATH 中查找（只检查文件，不启动 tesseract；版本检查在预热时进行）
+    path = shutil.which("tesseract")
+    if path:
+        return path
+    raise EnvironmentError(
+        "Tesseract OCR 未找到。请确保已安装并创建符号链接："
+        "mklink /D C:\\Tesseract \"C:\\Program Files\\Tesseract-OCR\""
+    )
 
 # 初始化设置
-pytesseract.pytesseract.tesseract_cmd = get_tesseract_path()
-print(f"使用的 Tesseract 路径: {pytesseract.pytesseract.tesseract_cmd}")
+TESSERACT_CMD = get_tesseract_path()
+logging.debug(f"使用的 Tesseract 路径: {TESSERACT_CMD}")
+
+# OCR进程池（/ocr 与 /ocr_and_analyze 共用）
+ocr_engine = OCREngine(tesseract_cmd=TESSERACT_CMD)
+# 识别结果缓存：按图片内容 + lang + 缩放上限
+result_cache = ResultCache()
+# 合并并发的相同识别请求
+ocr_flight = SingleFlight("ocr")
+
+# 共享HTTP连接池，供调用 doc_service 复用
+http_client = HTTPClient()
+
+# /ocr_and_analyze 调用 doc_service 分析识别结果
+doc_client = DocServiceClient(http_client)
+
+# 后台任务队列：大批量 OCR 走 /jobs，不占用交互请求的连接
+job_queue = JobQueue()
+
+# 导入/启动/预热耗时；识别依赖只在子进程中导入，预热时提前启动子进程
+startup_timer = StartupTimer(_IMPORT_START)
+
+metrics.register_stats("ocr_pool", ocr_engine.stats)
+metrics.register_stats("result_cache", result_cache.stats)
+metrics.register_stats("http_pool", lambda: http_client.stats())
+metrics.register_stats("jobs", job_queue.stats)
+metrics.register_stats("ocr_flight", ocr_flight.stats)
+metrics.register_stats("doc_service", doc_client.stats)
+metrics.register_stats("startup", startup_timer.stats)
+
+def route_label(request: Request) -> str:
+    """返回请求匹配的路由模板，避免路径参数造成指标标签爆炸"""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    """记录每个接口的请求数、进行中请求数和耗时"""
+    endpoint = route_label(request)
+    metrics.IN_FLIGHT.inc(endpoint=endpoint)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        metrics.IN_FLIGHT.dec(endpoint=endpoint)
+        metrics.REQUESTS.inc(method=request.method, endpoint=endpoint, status=status_code)
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, method=request.method, endpoint=endpoint)
+
+@app.on_event("startup")
+async def startup():
+    ocr_engine.start()
+    await http_client.start()
+    await job_queue.start()
+    startup_timer.ready(hooks=(ocr_engine.warm_up,))
+
+@app.on_event("shutdown")
+async def shutdown():
+    startup_timer.cancel()
+    await job_queue.close()
+    ocr_engine.shutdown()
+    await doc_client.close()
+    await http_client.close()
+
+# 每个后台任务同时占用的 OCR 进程数（为交互请求留出余量）
+OCR_JOB_CONCURRENCY = int(os.getenv("OCR_JOB_CONCURRENCY", str(max(1, ocr_engine.workers // 2))))
+# /ocr_and_analyze 多页输入时同时进行的 doc_service 分析数
+OCR_ANALYZE_CONCURRENCY = int(os.getenv("OCR_ANALYZE_CONCURRENCY", "4"))
+# 未指定 lang 时使用的语言：auto 表示先检测脚本，只加载需要的模型
+OCR_DEFAULT_LANG = os.getenv("OCR_DEFAULT_LANG", "auto")
+# 语言参数形如 eng、chi_sim+eng，直接传给 tesseract -l
+LANG_PATTERN = re.compile(r"^[A-Za-z_]+(\+[A-Za-z_]+)*$")
+
+def ocr_options(lang: Optional[str], psm: Optional[int]) -> Tuple[str, Optional[int]]:
+    """校验表单中的 lang/psm，未填写时使用默认值（psm 为 None 表示自动选择）"""
+    lang = lang or OCR_DEFAULT_LANG
+    if not LANG_PATTERN.match(lang):
+        raise HTTPException(status_code=400, detail=f"Invalid lang: {lang}")
+    # 0 只做方向检测、2 不做识别，都不会返回文字
+    if psm is not None and (psm not in range(1, 14) or psm == 2):
+        raise HTTPException(status_code=400, detail=f"Invalid psm: {psm}")
+    return lang, psm
+
+async def run_ocr(content: bytes, lang: str = 'auto', max_side: int = 2000, frame: int = 0,
+                  psm: Optional[int] = None) -> Tuple[str, bool]:
+    """在进程池中执行OCR，并将引擎异常转换为HTTP错误
+
+    Returns:
+        Tuple[str, bool]: 识别文本，以及是否命中缓存
+    """
+    # 大图（如多页 TIFF）哈希耗时较长，在线程中计算
+    cache_key = await asyncio.to_thread(make_key, content, lang=lang, max_side=max_side, frame=frame, psm=psm,
+                                        preprocess=ocr_engine.preprocess)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached, True
+
+    async def recognize() -> str:
+        try:
+            text = await ocr_engine.run(content, lang=lang, max_side=max_side, frame=frame, psm=psm)
+        except OCRBusyError as e:
+            logging.warning(str(e))
+            raise HTTPException(status_code=503, detail="OCR service busy", headers={"Retry-After": "5"})
+        except OCRTimeoutError as e:
+            logging.error(str(e))
+            raise HTTPException(status_code=504, detail="OCR timed out")
+        except Exception as e:
+            logging.error(f"OCR识别失败: {e}")
+            raise HTTPException(status_code=500, detail="OCR failed")
+        result_cache.set(cache_key, text)
+        return text
+
+    # 相同图片与参数的并发请求只占用一个 OCR 进程
+    return await ocr_flight.do(cache_key, recognize), False
+
+async def expand_pages(files: List[Tuple[str, bytes]]) -> List[Tuple[str, bytes, int]]:
+    """把上传的图片展开为 (文件名, 内容, 帧号) 列表，多帧 TIFF/GIF 每帧一项"""
+    items = []
+    for filename, content in files:
+        try:
+            frames = await asyncio.to_thread(count_frames, content)
+        except Exception as e:
+            logging.error(f"图片解码失败: {filename}, {e}")
+            frames = 1
+        items.extend((filename, content, frame) for frame in range(frames))
+    return items
+
+async def ocr_page(semaphore: asyncio.Semaphore, index: int, filename: str, content: bytes, frame: int,
+                   retry_busy: bool = False, lang: str = 'auto', psm: Optional[int] = None) -> dict:
+    """识别批量中的一页，错误记录在 error 字段而不是抛出
+
+    Args:
+        retry_busy (bool): 进程池繁忙时等待重试而不是直接报错（后台任务使用）
+    """
+    item = {"index": index, "filename": filename, "frame": frame}
+    async with semaphore:
+        while True:
+            try:
+                text, cached = await run_ocr(content, lang=lang, frame=frame, psm=psm)
+                item.update(text=text.strip()[:2000], cached=cached)
+            except HTTPException as e:
+                if retry_busy and e.status_code == 503:
+                    await asyncio.sleep(1)
+                    continue
+                item["error"] = e.detail
+            return item
 
 def verify_token(token: str):
     if token != API_TOKEN:
@@ -82,72 +261,263 @@ def verify_token(token: str):
 @app.post("/ocr")
 async def ocr_image(
     file: UploadFile = File(...),
-    authorization: str = Header(None)
+    authorization: str = Header(None),
+    lang: Optional[str] = Form(None),
+    psm: Optional[int] = Form(None)
 ):
+    """识别单张图片
+
+    lang/psm 不填时自动检测文字脚本并选择页面分割模式，填写则直接使用。
+    """
     # Token校验
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
     token = authorization.split(" ")[1]
     verify_token(token)
+    lang, psm = ocr_options(lang, psm)
+    check_upload(file.filename, file.file)
 
-    try:
-        image = Image.open(io.BytesIO(await file.read()))
-        # 图像优化：缩放大图
-        if max(image.width, image.height) > 2000:
-            image.thumbnail((2000, 2000))
-        # OCR识别（中英文）
-        text = pytesseract.image_to_string(image, lang='chi_sim+eng')
-    except Exception as e:
-        logging.error(f"OCR识别失败: {e}")
-        raise HTTPException(status_code=500, detail="OCR failed")
+    with stage("read"):
+        content = await file.read()
+    text, cached = await run_ocr(content, lang=lang, psm=psm)
 
     text = text.strip()[:2000]  # 限制返回长度
-    logging.info(f"OCR识别成功: {file.filename}, 长度: {len(text)}")
-    return JSONResponse(content={"text": text})
+    logging.info(f"OCR识别成功: {file.filename}, 长度: {len(text)}, 缓存命中: {cached}")
+    return JSONResponse(content={"text": text, "cached": cached})
+
+async def wait_disconnected(request: Request):
+    """请求体读取完后，等待客户端断开（响应发送完成时也会返回）"""
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+async def gather_until_disconnected(request: Request, tasks: List[asyncio.Task]) -> Optional[list]:
+    """等待全部任务完成并按顺序返回结果，客户端先断开时返回 None
+
+    同 stream 模式：客户端断开或请求被取消时取消未完成的任务，不再占用进程池。
+    """
+    finished = asyncio.ensure_future(asyncio.wait(tasks))
+    disconnected = asyncio.ensure_future(wait_disconnected(request))
+    try:
+        await asyncio.wait({finished, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        if not finished.done():
+            return None
+        return [task.result() for task in tasks]
+    finally:
+        finished.cancel()
+        disconnected.cancel()
+        for task in tasks:
+            task.cancel()
+
+@app.post("/ocr/batch")
+async def ocr_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    authorization: str = Header(None),
+    stream: bool = Form(False),
+    lang: Optional[str] = Form(None),
+    psm: Optional[int] = Form(None)
+):
+    """批量OCR：多文件、多帧 TIFF/GIF 按页并发识别
+
+    单页失败不影响其他页，错误记录在对应条目的 error 字段中。
+    stream=true 时以 NDJSON 逐行返回，每完成一页输出一行（顺序为完成顺序，
+    用 index 对应原始位置）。
+    """
+    # Token校验
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
+    token = authorization.split(" ")[1]
+    verify_token(token)
+    lang, psm = ocr_options(lang, psm)
+    if len(files) > OCR_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many files in batch (max {OCR_BATCH_MAX_ITEMS})")
+    # 读取任何文件之前先校验全部文件的大小
+    total = sum(check_upload(file.filename, file.file) for file in files)
+    if total > OCR_BATCH_MAX_BODY:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {OCR_BATCH_MAX_BODY} bytes)")
+
+    items = await expand_pages([(file.filename, await file.read()) for file in files])
+    if len(items) > OCR_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many pages in batch (max {OCR_BATCH_MAX_ITEMS})")
+
+    # 每个批次最多占用 workers 个并发，避免单个批次挤满队列导致其他请求被拒
+    semaphore = asyncio.Semaphore(ocr_engine.workers)
+    tasks = [
+        asyncio.ensure_future(ocr_page(semaphore, i, *item, lang=lang, psm=psm)) for i, item in enumerate(items)
+    ]
+    logging.info(f"批量OCR: {len(files)} 个文件, {len(items)} 页")
+
+    if stream:
+        async def ndjson():
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield json.dumps(await next_done, ensure_ascii=False) + "\n"
+            finally:
+                for task in tasks:
+                    task.cancel()
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    results = await gather_until_disconnected(request, tasks)
+    if results is None:
+        logging.info("客户端已断开，取消批量OCR剩余页面")
+        return Response(status_code=499)
+    failed = sum(1 for r in results if "error" in r)
+    return JSONResponse(content={"results": results, "total": len(results), "failed": failed})
+
+async def run_ocr_job(params: Dict[str, Any], files: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """后台任务：批量识别已落盘的图片，结果格式同 /ocr/batch"""
+    loaded = []
+    for filename, path in files:
+        loaded.append((filename, await asyncio.to_thread(Path(path).read_bytes)))
+    items = await expand_pages(loaded)
+    if len(items) > OCR_JOB_MAX_ITEMS:
+        raise RuntimeError(f"Too many pages in job (max {OCR_JOB_MAX_ITEMS})")
+    semaphore = asyncio.Semaphore(OCR_JOB_CONCURRENCY)
+    results = await asyncio.gather(*[
+        ocr_page(semaphore, i, *item, retry_busy=True, lang=params.get("lang", OCR_DEFAULT_LANG), psm=params.get("psm"))
+        for i, item in enumerate(items)
+    ])
+    failed = sum(1 for r in results if "error" in r)
+    return {"results": results, "total": len(results), "failed": failed}
+
+job_queue.register("ocr", run_ocr_job)
+
+def check_auth(authorization: str):
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
+    verify_token(authorization.split(" ")[1])
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    files: List[UploadFile] = File(...),
+    authorization: str = Header(None),
+    priority: int = Form(0),
+    lang: Optional[str] = Form(None),
+    psm: Optional[int] = Form(None)
+):
+    """提交后台批量OCR任务，用 GET /jobs/{id} 轮询状态和结果
+
+    每个任务最多同时占用 OCR_JOB_CONCURRENCY 个进程，进程池繁忙时等待而不是失败。
+    """
+    check_auth(authorization)
+    lang, psm = ocr_options(lang, psm)
+    for file in files:
+        check_upload(file.filename, file.file)
+    try:
+        job = await asyncio.to_thread(
+            job_queue.submit, "ocr", {"lang": lang, "psm": psm}, [(file.filename, file.file) for file in files], priority
+        )
+    except JobQueueFull as e:
+        logging.warning(str(e))
+        raise HTTPException(status_code=503, detail="Job queue full", headers={"Retry-After": "30"})
+    return JSONResponse(status_code=202, content=job)
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, authorization: str = Header(None)):
+    check_auth(authorization)
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str, authorization: str = Header(None)):
+    check_auth(authorization)
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+async def analyze_page(item: dict, token: str, prompt: Optional[str]) -> dict:
+    """流水线第二阶段：把一页的识别文本交给 doc_service 分析，错误记录在 error 字段"""
+    if "error" in item or not item["text"]:
+        item["analysis"] = None
+        return item
+    try:
+        with stage("doc_service"):
+            item["analysis"] = await doc_client.analyze(item["text"], token, prompt)
+    except DocServiceError as e:
+        logging.error(str(e))
+        item["error"] = f"doc_service failed: {e.detail}"
+    return item
 
 @app.post("/ocr_and_analyze")
 async def ocr_and_analyze(
     file: UploadFile = File(...),
     authorization: str = Header(None),
-    prompt: str = Form(None)
+    prompt: str = Form(None),
+    lang: Optional[str] = Form(None),
+    psm: Optional[int] = Form(None),
+    stream: bool = Form(False)
 ):
+    """识别图片并交给 doc_service 分析
+
+    单页图片返回 doc_service 的分析结果。多帧 TIFF/GIF 按页流水线处理：每页识别完成后
+    立即开始分析，与后续页面的识别重叠；返回 pages 列表（顺序同原始页），
+    stream=true 时以 NDJSON 按完成顺序逐页返回。
+    """
     # Token校验
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
     token = authorization.split(" ")[1]
     verify_token(token)
+    lang, psm = ocr_options(lang, psm)
+    check_upload(file.filename, file.file)
 
-    try:
-        image = Image.open(io.BytesIO(await file.read()))
-        if max(image.width, image.height) > 2000:
-            image.thumbnail((2000, 2000))
-        text = pytesseract.image_to_string(image, lang='chi_sim+eng').strip()[:2000]
-    except Exception as e:
-        logging.error(f"OCR识别失败: {e}")
-        raise HTTPException(status_code=500, detail="OCR failed")
-
-    # 调用 doc_service 的 /v1/analyze
-    doc_service_url = "http://localhost:4000/v1/analyze"  # 或者你的 doc_service 实际地址
-    payload = {
-        "code": text,
-        "use_deepseek": True
-    }
-    if prompt:
-        payload["prompt"] = prompt
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(doc_service_url, headers=headers, json=payload) as resp:
-            if resp.status != 200:
-                error_text = await resp.text()
-                logging.error(f"doc_service 调用失败: {error_text}")
-                raise HTTPException(status_code=500, detail=f"doc_service failed: {error_text}")
-            result = await resp.json()
-    return result
+    with stage("read"):
+        content = await file.read()
+    items = await expand_pages([(file.filename, content)])
+    if len(items) > OCR_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many pages in batch (max {OCR_BATCH_MAX_ITEMS})")
+
+    if len(items) == 1 and not stream:
+        text, _ = await run_ocr(content, lang=lang, psm=psm)
+        text = text.strip()[:2000]
+        try:
+            with stage("doc_service"):
+                return await doc_client.analyze(text, token, prompt)
+        except DocServiceError as e:
+            logging.error(str(e))
+            raise HTTPException(status_code=500, detail=f"doc_service failed: {e.detail}")
+
+    semaphore = asyncio.Semaphore(ocr_engine.workers)
+    results = pipeline(
+        (ocr_page(semaphore, i, *item, lang=lang, psm=psm) for i, item in enumerate(items)),
+        lambda item: analyze_page(item, token, prompt),
+        OCR_ANALYZE_CONCURRENCY,
+    )
+    logging.info(f"OCR+分析: {file.filename}, {len(items)} 页")
+
+    if stream:
+        async def ndjson():
+            async for item in results:
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    pages = sorted([item async for item in results], key=lambda item: item["index"])
+    failed = sum(1 for page in pages if "error" in page)
+    return JSONResponse(content={"pages": pages, "total": len(pages), "failed": failed})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint(authorization: str = Header(None)):
+    """Prometheus 格式的指标，需要 METRICS_TOKEN（未设置时为 TOKEN）作为 Bearer token"""
+    if authorization != f"Bearer {METRICS_TOKEN}" or not METRICS_TOKEN:
+        logging.warning("指标接口Token校验失败")
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # 可选：健康检查
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "ocr_pool": ocr_engine.stats(),
+        "cache": result_cache.stats(),
+        "http_pool": http_client.stats(),
+        "doc_service": doc_client.stats(),
+        "jobs": job_queue.stats(),
+        "startup": startup_timer.stats()
+    }
+
+# 模块导入到此结束
+startup_timer.imported()
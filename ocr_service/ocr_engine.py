@@ -0,0 +1,248 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+from metrics import STAGE_LATENCY
+
+logger = logging.getLogger(__name__)
+
+
+class OCRBusyError(Exception):
+    """队列已满，调用方应返回 503 并提示稍后重试"""
+
+
+class OCRTimeoutError(Exception):
+    """单次识别超过配置的超时时间"""
+
+
+def _init_worker(tesseract_cmd: str):
+    """子进程初始化：导入识别依赖（主进程不需要，不在模块加载时导入），沿用主进程定位到的 Tesseract 路径"""
+    import pytesseract
+    import preprocess  # noqa: F401
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+
+def _warm_up_worker() -> str:
+    """预热任务：子进程启动并完成导入后返回 Tesseract 版本"""
+    import pytesseract
+    return str(pytesseract.get_tesseract_version())
+
+
+def count_frames(content: bytes) -> int:
+    """返回图片帧数（多帧 TIFF/GIF 大于1），只读取文件头，开销很小"""
+    with Image.open(io.BytesIO(content)) as image:
+        return getattr(image, "n_frames", 1)
+
+
+# lang 取该值时先检测文字脚本，再只加载需要的语言模型
+AUTO_LANG = "auto"
+# 检测失败或脚本无法对应到单一模型时使用的语言
+FALLBACK_LANG = os.getenv("OCR_FALLBACK_LANG", "chi_sim+eng")
+# OSD 脚本名 -> Tesseract 语言模型；中文截图常夹杂英文（代码、术语），保留 eng
+SCRIPT_LANGS = {
+    "Han": "chi_sim+eng",
+    "Latin": "eng",
+}
+# 检测用缩略图的最长边
+_DETECT_SIDE = 1000
+
+
+def detect_lang(image: Image.Image, timeout: float = 0) -> str:
+    """在缩略图上用 Tesseract OSD 判断文字脚本，返回对应的语言模型
+
+    OSD 只跑方向/脚本检测，远快于完整识别；文字过少或缺少 osd 模型时
+    返回 FALLBACK_LANG。timeout 为 Tesseract 进程的超时（秒），0 表示不限。
+    """
+    import pytesseract
+
+    small = image.convert("L")
+    if max(small.size) > _DETECT_SIDE:
+        small.thumbnail((_DETECT_SIDE, _DETECT_SIDE))
+    try:
+        osd = pytesseract.image_to_osd(small, config="--psm 0", output_type=pytesseract.Output.DICT,
+                                       timeout=timeout)
+    except pytesseract.TesseractError as e:
+        logger.debug(f"OSD检测失败，使用默认语言: {e}")
+        return FALLBACK_LANG
+    if float(osd.get("script_conf", 0)) < 1.0:
+        return FALLBACK_LANG
+    return SCRIPT_LANGS.get(osd.get("script"), FALLBACK_LANG)
+
+
+def choose_psm(image: Image.Image) -> int:
+    """按预处理统计的文本行数选择页面分割模式
+
+    只有一行文字（截图里的标题、按钮、单行代码）用 7，其余（含未统计行数）用 Tesseract 默认的 3。
+    """
+    return 7 if image.info.get("lines") == 1 else 3
+
+
+def _remaining(deadline: float) -> float:
+    """距截止时间的秒数，供 pytesseract 的 timeout 使用（0 表示不限，已过期时取极小值）"""
+    return max(0.001, deadline - time.time()) if deadline else 0
+
+
+def _ocr_worker(content: bytes, lang: str, max_side: int, frame: int = 0, submitted: float = 0.0,
+                preprocess: bool = True, psm: Optional[int] = None,
+                deadline: float = 0.0) -> Tuple[str, Dict[str, float]]:
+    """在子进程中完成解码、预处理和识别，避免阻塞事件循环
+
+    Args:
+        lang (str): 语言模型，AUTO_LANG 表示自动检测
+        preprocess (bool): 是否做灰度/二值化/纠偏/裁边等预处理，关闭时只缩放大图
+        psm (Optional[int]): 页面分割模式，None 表示自动选择
+        deadline (float): 截止时间（time.time()），超时后终止 Tesseract 进程；0 表示不限
+
+    Returns:
+        Tuple[str, Dict[str, float]]: 识别文本，以及各阶段耗时（秒），由主进程写入指标
+    """
+    import pytesseract
+    from preprocess import preprocess as preprocess_image
+
+    timings = {"queue": time.time() - submitted} if submitted else {}
+    if deadline and time.time() >= deadline:
+        # 排队期间已超时，调用方不再等待结果
+        raise TimeoutError("OCR任务排队超时")
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(content))
+    if frame:
+        image.seek(frame)
+    image.load()
+    timings["decode"] = time.perf_counter() - start
+    start = time.perf_counter()
+    if preprocess:
+        image = preprocess_image(image, max_side)
+        timings["preprocess"] = time.perf_counter() - start
+        if image is None:
+            # 空白页不调用 Tesseract
+            return "", timings
+    else:
+        # 图像优化：缩放大图
+        if max(image.width, image.height) > max_side:
+            image.thumbnail((max_side, max_side))
+        timings["resize"] = time.perf_counter() - start
+    try:
+        if lang == AUTO_LANG:
+            start = time.perf_counter()
+            lang = detect_lang(image, timeout=_remaining(deadline))
+            timings["detect"] = time.perf_counter() - start
+        if psm is None:
+            psm = choose_psm(image)
+        start = time.perf_counter()
+        text = pytesseract.image_to_string(image, lang=lang, config=f"--psm {psm}", timeout=_remaining(deadline))
+    except RuntimeError as e:
+        # pytesseract 超时会终止 Tesseract 进程并抛出 RuntimeError
+        if "timeout" in str(e):
+            raise TimeoutError("OCR识别超时") from None
+        raise
+    timings["ocr"] = time.perf_counter() - start
+    return text, timings
+
+
+class OCREngine:
+    """基于进程池的 OCR 引擎
+
+    所有 OCR 请求共享同一个进程池。进行中 + 排队中的任务数超过
+    workers + queue_size 时直接拒绝，防止请求无限堆积。
+    """
+
+    def __init__(
+        self,
+        tesseract_cmd: str,
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.tesseract_cmd = tesseract_cmd
+        self.workers = workers or int(os.getenv("OCR_WORKERS", "0")) or (os.cpu_count() or 1)
+        self.queue_size = queue_size if queue_size is not None else int(os.getenv("OCR_QUEUE_SIZE", "16"))
+        self.timeout = timeout or float(os.getenv("OCR_TIMEOUT", "60"))
+        self.preprocess = os.getenv("OCR_PREPROCESS", "1") != "0"
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    def start(self):
+        if self._executor is None:
+            # spawn 启动的子进程不继承服务监听套接字等文件描述符
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.tesseract_cmd,),
+            )
+            logger.info(f"OCR进程池已启动: workers={self.workers}, queue={self.queue_size}, timeout={self.timeout}s")
+
+    async def warm_up(self):
+        """启动全部子进程并完成依赖导入，同时确认 Tesseract 可用"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        versions = await asyncio.gather(*[
+            loop.run_in_executor(self._executor, _warm_up_worker) for _ in range(self.workers)
+        ])
+        logger.info(f"OCR进程池已预热: workers={self.workers}, tesseract={versions[0]}")
+
+    def shutdown(self):
+        if self._executor is not None:
+            # 等待子进程退出，避免服务停止后残留孤儿进程
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            logger.info("OCR进程池已关闭")
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "pending": self._pending,
+            "timeout": self.timeout,
+            "preprocess": self.preprocess,
+        }
+
+    async def run(self, content: bytes, lang: str = AUTO_LANG, max_side: int = 2000, frame: int = 0,
+                  psm: Optional[int] = None) -> str:
+        """提交一次 OCR 任务并等待结果
+
+        超时后子进程中的 Tesseract 按同一截止时间被终止；任务在子进程里真正结束
+        （或排队中被取消）之前一直计入队列，避免超时的任务在后台堆积。
+
+        Raises:
+            OCRBusyError: 队列已满
+            OCRTimeoutError: 识别超时
+        """
+        if self._pending >= self.capacity:
+            raise OCRBusyError(f"OCR队列已满 ({self._pending}/{self.capacity})")
+        self.start()
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        future = self._executor.submit(
+            _ocr_worker, content, lang, max_side, frame, submitted, self.preprocess, psm, submitted + self.timeout
+        )
+        self._pending += 1
+        future.add_done_callback(lambda _: self._release(loop))
+        try:
+            text, timings = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise OCRTimeoutError(f"OCR识别超时 ({self.timeout}s)")
+        for name, seconds in timings.items():
+            STAGE_LATENCY.observe(seconds, stage=name)
+        return text
+
+    def _release(self, loop: asyncio.AbstractEventLoop):
+        """任务结束时由执行器线程回调，回到事件循环中减少计数"""
+        def release():
+            self._pending -= 1
+        try:
+            loop.call_soon_threadsafe(release)
+        except RuntimeError:
+            # 事件循环已关闭（服务退出中）
+            pass
@@ -0,0 +1,231 @@
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Tesseract 在约 300 DPI 时效果最好
+TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "300"))
+# 输出二值图（关闭后输出灰度图，交给 Tesseract 自行二值化）
+BINARIZE = os.getenv("OCR_BINARIZE", "1") != "0"
+
+# 纠偏搜索范围（度）与步长
+_SKEW_RANGE = 5.0
+_SKEW_STEP = 0.5
+# 最佳角度的行投影方差需比不旋转时高出该比例才纠偏
+_SKEW_MIN_GAIN = 1.1
+# 纠偏、分区统计使用的缩略图边长
+_ANALYSIS_SIDE = 800
+# 最亮与最暗像素之差低于该值视为空白页
+_MIN_CONTRAST = 40
+# 文本行高（含上下伸部，像素）达到该值时 Tesseract 已能稳定识别，不再按 DPI 放大
+_MIN_LINE_HEIGHT = 20
+
+
+def to_grayscale(image: Image.Image) -> Image.Image:
+    """转为灰度图，透明背景按白色处理"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, image)
+    return image.convert("L")
+
+
+def rescale(image: Image.Image, dpi: Optional[Tuple[float, float]], max_side: int) -> Image.Image:
+    """按 DPI 缩放到 TARGET_DPI 附近，并限制最长边
+
+    无 DPI 信息时只做最长边限制；缩放比例限制在 0.5~2 之间，避免小图被过度放大。
+    放大只到文本行高达到 _MIN_LINE_HEIGHT 为止：屏幕截图常标为 72/96 DPI，
+    但文字按屏幕像素渲染，本身已足够清晰，按 DPI 放大只会增加识别耗时。
+    """
+    scale = 1.0
+    if dpi and dpi[0] and dpi[0] > 0:
+        scale = min(2.0, max(0.5, TARGET_DPI / float(dpi[0])))
+        if scale > 1.0:
+            height = text_line_height(image)
+            if height:
+                scale = min(scale, max(1.0, _MIN_LINE_HEIGHT / height))
+        if abs(scale - 1.0) < 0.1:
+            scale = 1.0
+    longest = max(image.size) * scale
+    if longest > max_side:
+        scale *= max_side / longest
+    if scale == 1.0:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS if scale < 1 else Image.BICUBIC)
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Otsu 法求全局二值化阈值"""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    omega = np.cumsum(hist) / gray.size
+    mu = np.cumsum(hist * np.arange(256)) / gray.size
+    denom = omega * (1.0 - omega)
+    denom[denom == 0] = np.inf
+    sigma = (mu[-1] * omega - mu) ** 2 / denom
+    return int(np.argmax(sigma))
+
+
+def _analysis_mask(ink: np.ndarray) -> Image.Image:
+    mask = Image.fromarray((ink * 255).astype(np.uint8))
+    if max(mask.size) > _ANALYSIS_SIDE:
+        mask.thumbnail((_ANALYSIS_SIDE, _ANALYSIS_SIDE))
+    return mask
+
+
+def estimate_skew(ink: np.ndarray) -> float:
+    """投影法估计倾斜角：旋转后行投影方差最大的角度即文本行水平的角度
+
+    Returns:
+        float: 需要逆时针旋转的角度（度）
+    """
+    mask = _analysis_mask(ink)
+
+    def score(angle: float) -> float:
+        rows = np.asarray(mask.rotate(angle, resample=Image.NEAREST)).sum(axis=1, dtype=np.float64)
+        return float(np.var(rows))
+
+    baseline = score(0.0)
+    best_angle, best_score = 0.0, baseline
+    for angle in np.arange(-_SKEW_RANGE, _SKEW_RANGE + 1e-6, _SKEW_STEP):
+        current = score(float(angle))
+        if current > best_score:
+            best_angle, best_score = float(angle), current
+    # 在最佳角度附近细化
+    for angle in np.arange(best_angle - _SKEW_STEP, best_angle + _SKEW_STEP + 1e-6, 0.1):
+        current = score(float(angle))
+        if current > best_score:
+            best_angle, best_score = float(angle), current
+    # 提升不明显时视为未倾斜，避免对正常页面做无谓的旋转
+    if best_score < baseline * _SKEW_MIN_GAIN:
+        return 0.0
+    return round(best_angle, 1)
+
+
+def content_bands(ink: np.ndarray, min_gap: int, pad: int) -> List[Tuple[int, int]]:
+    """按行投影切出含内容的水平带，间隔小于 min_gap 的相邻带合并
+
+    Returns:
+        List[Tuple[int, int]]: [(起始行, 结束行)...]，已含上下留白 pad
+    """
+    noise = max(1, ink.shape[1] // 500)
+    rows = np.flatnonzero(ink.sum(axis=1) > noise)
+    if rows.size == 0:
+        return []
+    bands = []
+    start = prev = int(rows[0])
+    for row in rows[1:]:
+        row = int(row)
+        if row - prev > min_gap:
+            bands.append((start, prev + 1))
+            start = row
+        prev = row
+    bands.append((start, prev + 1))
+    height = ink.shape[0]
+    return [(max(0, a - pad), min(height, b + pad)) for a, b in bands]
+
+
+def text_lines(ink: np.ndarray) -> List[Tuple[int, int]]:
+    """按行投影切出文本行
+
+    先按空白行切出连续的墨迹段，间隔小于段高中位数 1/5 的视为同一行（字形内部的空隙）；
+    高度不足最高行 1/3 的碎片（标点、下划线、噪点）不计入。
+
+    Returns:
+        List[Tuple[int, int]]: [(起始行, 结束行)...]
+    """
+    noise = max(1, ink.shape[1] // 500)
+    filled = np.concatenate(([False], ink.sum(axis=1) > noise, [False]))
+    edges = np.flatnonzero(filled[1:] != filled[:-1])
+    runs = list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+    if not runs:
+        return []
+    min_gap = max(1, int(np.median([b - a for a, b in runs])) // 5)
+    lines = [list(runs[0])]
+    for a, b in runs[1:]:
+        if a - lines[-1][1] < min_gap:
+            lines[-1][1] = b
+        else:
+            lines.append([a, b])
+    tallest = max(b - a for a, b in lines)
+    return [(a, b) for a, b in lines if (b - a) * 3 >= tallest]
+
+
+def count_text_lines(ink: np.ndarray) -> int:
+    """按行投影统计文本行数"""
+    return len(text_lines(ink))
+
+
+def text_line_height(gray: Image.Image) -> int:
+    """灰度图中文本行高的中位数（像素），没有可辨认的文字时返回 0"""
+    pixels = np.asarray(gray)
+    ink = pixels <= otsu_threshold(pixels)
+    if ink.mean() > 0.5:
+        ink = ~ink
+    lines = text_lines(ink)
+    return int(np.median([b - a for a, b in lines])) if lines else 0
+
+
+def preprocess(image: Image.Image, max_side: int = 2000) -> Optional[Image.Image]:
+    """OCR 前处理：灰度、DPI 缩放、二值化、纠偏、裁掉空白边距并压缩大段空白
+
+    只保留含内容的区域，Tesseract 处理的像素更少；空白页返回 None，直接跳过识别。
+
+    Args:
+        image (Image.Image): 已解码的图片（多帧图片已定位到目标帧）
+        max_side (int): 输出图片最长边上限
+
+    Returns:
+        Optional[Image.Image]: 处理后的图片，空白页为 None
+    """
+    dpi = image.info.get("dpi")
+    gray = rescale(to_grayscale(image), dpi, max_side)
+    pixels = np.asarray(gray)
+    median = int(np.median(pixels))
+    if median - int(pixels.min()) < _MIN_CONTRAST and int(pixels.max()) - median < _MIN_CONTRAST:
+        return None
+
+    threshold = otsu_threshold(pixels)
+    ink = pixels <= threshold
+    # 深色背景浅色文字：反相，保证输出为白底黑字
+    if ink.mean() > 0.5:
+        pixels = 255 - pixels
+        threshold = 254 - threshold
+        ink = ~ink
+        gray = Image.fromarray(pixels)
+
+    angle = estimate_skew(ink)
+    if abs(angle) >= 0.3:
+        gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+        pixels = np.asarray(gray)
+        ink = pixels <= threshold
+
+    # 裁掉左右空白边距
+    noise = max(1, ink.shape[0] // 500)
+    cols = np.flatnonzero(ink.sum(axis=0) > noise)
+    if cols.size == 0:
+        return None
+    pad = max(8, ink.shape[1] // 100)
+    left, right = max(0, int(cols[0]) - pad), min(ink.shape[1], int(cols[-1]) + 1 + pad)
+
+    # 上下方向只保留含内容的水平带，带之间用固定高度的空白连接
+    gap = max(24, ink.shape[0] // 40)
+    bands = content_bands(ink[:, left:right], min_gap=gap, pad=pad)
+    if not bands:
+        return None
+    cropped = ink[:, left:right]
+    lines = sum(count_text_lines(cropped[top:bottom]) for top, bottom in bands)
+    output = pixels if not BINARIZE else np.where(ink, 0, 255).astype(np.uint8)
+    pieces = []
+    spacer = np.full((gap, right - left), 255, dtype=np.uint8)
+    for i, (top, bottom) in enumerate(bands):
+        if i:
+            pieces.append(spacer)
+        pieces.append(output[top:bottom, left:right])
+    result = Image.fromarray(np.vstack(pieces))
+    if BINARIZE:
+        result = result.convert("1")
+    # 文本行数供识别阶段选择页面分割模式（多行段落会合并为一个文本带，不能用带数判断）
+    result.info["lines"] = lines
+    return result
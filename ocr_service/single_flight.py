@@ -0,0 +1,49 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """合并相同 key 的并发调用
+
+    同一 key 的第一个调用者启动计算，计算期间到达的调用者等待同一个结果
+    （包括异常），计算结束后立即移除，不做缓存。计算在独立任务中执行，
+    发起者被取消时不影响其他等待者，因此 fn 不能依赖发起者请求范围内的资源
+    （如上传文件对象），需要时自行持有副本。
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """执行 fn()，若相同 key 已在计算中则等待其结果
+
+        Args:
+            key (str): 去重键，调用方负责包含所有影响结果的参数
+            fn (Callable[[], Awaitable[Any]]): 无参协程函数
+
+        Returns:
+            Any: fn() 的返回值；并发调用者拿到的是同一个对象，不应修改
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            logger.info(f"合并并发请求: {self.name} {key[:16]}")
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "inflight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
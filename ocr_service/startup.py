@@ -0,0 +1,62 @@
+import asyncio
+import importlib
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """记录模块导入、startup 和预热耗时（秒），在 /metrics 与 /health 中查看
+
+    解析库等较重的依赖在首次用到时才导入；WARMUP=1 时 startup 完成后在后台
+    提前导入并执行各服务的预热函数，不推迟服务就绪。
+    """
+
+    def __init__(self, started: float):
+        # started 为 main 模块开始导入时的 time.perf_counter()
+        self.started = started
+        self.import_seconds: Optional[float] = None
+        self.ready_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.enabled = os.getenv("WARMUP", "0") == "1"
+        self._task: Optional[asyncio.Task] = None
+
+    def imported(self):
+        """在 main 模块末尾调用"""
+        self.import_seconds = time.perf_counter() - self.started
+
+    def ready(self, modules: Iterable[str] = (), hooks: Iterable[Callable[[], Awaitable[None]]] = ()):
+        """在 startup 事件末尾调用；开启预热时在后台导入 modules 并依次执行 hooks"""
+        self.ready_seconds = time.perf_counter() - self.started
+        logger.info(f"启动完成: 导入 {self.import_seconds or 0:.3f}s, 就绪 {self.ready_seconds:.3f}s")
+        if self.enabled:
+            self._task = asyncio.ensure_future(self._warm_up(list(modules), list(hooks)))
+
+    async def _warm_up(self, modules: list, hooks: list):
+        start = time.perf_counter()
+        try:
+            for name in modules:
+                await asyncio.to_thread(importlib.import_module, name)
+            for hook in hooks:
+                await hook()
+        except Exception as e:
+            logger.warning(f"预热失败: {e}")
+            return
+        self.warmup_seconds = time.perf_counter() - start
+        logger.info(f"预热完成: {self.warmup_seconds:.3f}s")
+
+    def cancel(self):
+        """在 shutdown 事件中调用，取消未完成的预热"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "import_seconds": self.import_seconds,
+            "ready_seconds": self.ready_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "warmup": self.enabled,
+        }
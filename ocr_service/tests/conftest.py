@@ -0,0 +1,23 @@
+import importlib
+import os
+import shutil
+import sys
+
+import pytest
+
+# 服务模块按脚本目录导入（与 uvicorn main:app 一致）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TOKEN = "test-token"
+
+
+@pytest.fixture(scope="session")
+def ocr_main(tmp_path_factory):
+    """导入 main 模块：任务库放在临时目录，Tesseract 路径用占位值（识别由各测试替换）"""
+    tmp = tmp_path_factory.mktemp("ocr_main")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("TOKEN", TOKEN)
+        patch.setenv("JOB_DB", str(tmp / "jobs.db"))
+        patch.setenv("RESULT_CACHE_DB", "")
+        patch.setattr(shutil, "which", lambda name: "/usr/bin/tesseract")
+        yield importlib.import_module("main")
@@ -0,0 +1,111 @@
+import asyncio
+import io
+
+import httpx
+import pytest
+from aiohttp import web
+from PIL import Image
+
+from analysis_pipeline import DocServiceClient, DocServiceError
+from http_client import HTTPClient
+
+from conftest import TOKEN
+
+
+async def _stub_doc_service(received: list) -> web.AppRunner:
+    """替身 doc_service：回显文本，含 fail 时返回 500；页码越小响应越慢，完成顺序与原始顺序相反"""
+    async def analyze(request):
+        payload = await request.json()
+        received.append(payload)
+        if "fail" in payload["code"]:
+            return web.Response(status=500, text="analysis failed")
+        page = int(payload["code"].split()[-1]) if payload["code"] else 0
+        await asyncio.sleep(0.05 * (3 - page))
+        return web.json_response({"ast": None, "analysis": payload["code"].upper()})
+
+    app = web.Application()
+    app.router.add_post("/v1/analyze", analyze)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner
+
+
+def _base_url(runner: web.AppRunner) -> str:
+    host, port = runner.addresses[0][:2]
+    return f"http://{host}:{port}"
+
+
+def _tiff(frames: int) -> bytes:
+    images = [Image.new("L", (50, 50), 255) for _ in range(frames)]
+    out = io.BytesIO()
+    images[0].save(out, format="TIFF", save_all=True, append_images=images[1:])
+    return out.getvalue()
+
+
+def test_doc_service_client():
+    async def run():
+        received = []
+        runner = await _stub_doc_service(received)
+        http = HTTPClient()
+        client = DocServiceClient(http, base_url=_base_url(runner))
+        try:
+            result = await client.analyze("page 2", "secret", prompt="explain")
+            with pytest.raises(DocServiceError) as error:
+                await client.analyze("fail", "secret")
+            return result, error.value, received, client.stats()
+        finally:
+            await http.close()
+            await runner.cleanup()
+
+    result, error, received, stats = asyncio.run(run())
+    assert result == {"ast": None, "analysis": "PAGE 2"}
+    assert received[0] == {"code": "page 2", "use_deepseek": True, "prompt": "explain"}
+    assert (error.status, error.detail) == (500, "analysis failed")
+    assert stats["requests"] == 2 and stats["failures"] == 1
+
+
+def _post(ocr_main, monkeypatch, texts, content: bytes, filename: str):
+    async def recognize(content, lang="auto", max_side=2000, frame=0, psm=None):
+        return texts[frame]
+
+    monkeypatch.setattr(ocr_main.ocr_engine, "run", recognize)
+    monkeypatch.setattr(ocr_main.result_cache, "max_bytes", 0)
+
+    async def run():
+        received = []
+        runner = await _stub_doc_service(received)
+        monkeypatch.setattr(ocr_main.doc_client, "base_url", _base_url(runner))
+        try:
+            transport = httpx.ASGITransport(app=ocr_main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.post(
+                    "/ocr_and_analyze", headers={"Authorization": f"Bearer {TOKEN}"},
+                    files={"file": (filename, content, "image/tiff")},
+                )
+            return response, received
+        finally:
+            await ocr_main.http_client.close()
+            await runner.cleanup()
+
+    return asyncio.run(run())
+
+
+def test_pages_come_back_in_order_with_per_page_errors(ocr_main, monkeypatch):
+    response, _ = _post(ocr_main, monkeypatch, ["page 0", "fail 1", "page 2", ""], _tiff(4), "scan.tif")
+    assert response.status_code == 200
+    body = response.json()
+    assert [page["index"] for page in body["pages"]] == [0, 1, 2, 3]
+    assert body["pages"][0]["analysis"] == {"ast": None, "analysis": "PAGE 0"}
+    assert body["pages"][1]["error"].startswith("doc_service failed")
+    assert body["pages"][2]["analysis"] == {"ast": None, "analysis": "PAGE 2"}
+    # 空白页不调用 doc_service
+    assert body["pages"][3]["analysis"] is None
+    assert (body["total"], body["failed"]) == (4, 1)
+
+
+def test_single_page_forwards_empty_text_to_doc_service(ocr_main, monkeypatch):
+    response, received = _post(ocr_main, monkeypatch, [""], _tiff(1), "scan.tif")
+    assert response.status_code == 200
+    assert response.json() == {"ast": None, "analysis": ""}
+    assert received == [{"code": "", "use_deepseek": True}]
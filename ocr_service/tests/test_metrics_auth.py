@@ -0,0 +1,18 @@
+import asyncio
+
+import httpx
+
+from conftest import TOKEN
+
+
+def test_metrics_requires_token(ocr_main):
+    async def get(headers):
+        transport = httpx.ASGITransport(app=ocr_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/metrics", headers=headers)
+
+    assert asyncio.run(get({})).status_code == 401
+    assert asyncio.run(get({"Authorization": "Bearer wrong"})).status_code == 401
+    response = asyncio.run(get({"Authorization": f"Bearer {TOKEN}"}))
+    assert response.status_code == 200
+    assert "http_requests_total" in response.text
@@ -0,0 +1,112 @@
+import asyncio
+import io
+
+import httpx
+from PIL import Image
+
+from conftest import TOKEN
+
+
+def _png(shade: int) -> bytes:
+    out = io.BytesIO()
+    Image.new("L", (50, 50), shade).save(out, format="PNG")
+    return out.getvalue()
+
+
+def _files(contents):
+    return [("files", (f"{i}.png", content, "image/png")) for i, content in enumerate(contents)]
+
+
+async def _post(app, contents):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post("/ocr/batch", headers={"Authorization": f"Bearer {TOKEN}"}, files=_files(contents))
+
+
+def test_bad_frame_is_a_per_item_error(ocr_main, monkeypatch):
+    bad = b"not an image"
+
+    async def recognize(content, lang="auto", max_side=2000, frame=0, psm=None):
+        if content == bad:
+            raise OSError("cannot identify image file")
+        return f"text {content[-8:].hex()}"
+
+    monkeypatch.setattr(ocr_main.ocr_engine, "run", recognize)
+    response = asyncio.run(_post(ocr_main.app, [_png(10), bad, _png(20)]))
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["total"], body["failed"]) == (3, 1)
+    assert [item["index"] for item in body["results"]] == [0, 1, 2]
+    assert body["results"][1]["error"] == "OCR failed"
+    assert "error" not in body["results"][0] and "error" not in body["results"][2]
+
+
+def _blocking_engine(ocr_main, monkeypatch):
+    """识别一直挂起，记录开始和被取消的页"""
+    started = []
+    cancelled = []
+
+    async def recognize(content, lang="auto", max_side=2000, frame=0, psm=None):
+        started.append(content)
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(content)
+            raise
+
+    monkeypatch.setattr(ocr_main.ocr_engine, "run", recognize)
+    monkeypatch.setattr(ocr_main.ocr_engine, "workers", 2)
+    return started, cancelled
+
+
+def test_cancelled_batch_cancels_pending_pages(ocr_main, monkeypatch):
+    started, cancelled = _blocking_engine(ocr_main, monkeypatch)
+
+    async def run():
+        request = asyncio.ensure_future(_post(ocr_main.app, [_png(shade) for shade in range(30, 36)]))
+        while len(started) < 2:
+            await asyncio.sleep(0.01)
+        request.cancel()
+        await asyncio.gather(request, return_exceptions=True)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    # 只有占用并发名额的两页开始识别，取消后都被停止，其余页不再开始
+    assert len(started) == 2
+    assert sorted(cancelled) == sorted(started)
+
+
+def test_client_disconnect_cancels_pending_pages(ocr_main, monkeypatch):
+    started, cancelled = _blocking_engine(ocr_main, monkeypatch)
+    request = httpx.Request("POST", "http://test/ocr/batch", headers={"Authorization": f"Bearer {TOKEN}"},
+                            files=_files([_png(shade) for shade in range(40, 46)]))
+    body = request.read()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/ocr/batch", "raw_path": b"/ocr/batch", "query_string": b"",
+        "root_path": "", "server": ("test", 80), "client": ("127.0.0.1", 1234),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in request.headers.items()],
+    }
+    sent = []
+
+    async def run():
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            # 请求体发送完后客户端断开
+            while len(started) < 2:
+                await asyncio.sleep(0.01)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await asyncio.wait_for(ocr_main.app(scope, receive, send), timeout=10)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    assert sent[0]["status"] == 499
+    assert len(started) == 2
+    assert sorted(cancelled) == sorted(started)
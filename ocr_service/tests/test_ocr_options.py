@@ -0,0 +1,104 @@
+import asyncio
+import io
+
+import pytesseract
+import pytest
+from PIL import Image, ImageDraw
+
+from ocr_engine import AUTO_LANG, FALLBACK_LANG, _ocr_worker, choose_psm, detect_lang
+
+
+def _png() -> bytes:
+    """一行文字的图片"""
+    image = Image.new("L", (400, 200), 255)
+    ImageDraw.Draw(image).rectangle([50, 80, 350, 110], fill=0)
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def tesseract(monkeypatch):
+    """替换 pytesseract，记录调用参数"""
+    calls = {"osd": 0, "ocr": []}
+    osd = {"script": "Han", "script_conf": 5.0}
+
+    def image_to_osd(image, config="", output_type=None, timeout=0):
+        calls["osd"] += 1
+        return dict(osd)
+
+    def image_to_string(image, lang=None, config="", timeout=0):
+        calls["ocr"].append((lang, config))
+        return "text"
+
+    monkeypatch.setattr(pytesseract, "image_to_osd", image_to_osd)
+    monkeypatch.setattr(pytesseract, "image_to_string", image_to_string)
+    # 测试通过 calls["result"] 修改 OSD 返回值
+    calls["result"] = osd
+    return calls
+
+
+@pytest.mark.parametrize("lines, psm", [(1, 7), (2, 3), (0, 3), (None, 3)])
+def test_choose_psm(lines, psm):
+    image = Image.new("L", (10, 10))
+    if lines is not None:
+        image.info["lines"] = lines
+    assert choose_psm(image) == psm
+
+
+def test_detect_lang_maps_script(tesseract):
+    assert detect_lang(Image.new("L", (100, 100))) == "chi_sim+eng"
+    tesseract["result"].update(script="Latin")
+    assert detect_lang(Image.new("L", (100, 100))) == "eng"
+
+
+def test_inconclusive_osd_falls_back(tesseract, monkeypatch):
+    tesseract["result"].update(script="Latin", script_conf=0.3)
+    assert detect_lang(Image.new("L", (100, 100))) == FALLBACK_LANG
+    tesseract["result"].update(script="Cyrillic", script_conf=5.0)
+    assert detect_lang(Image.new("L", (100, 100))) == FALLBACK_LANG
+
+    def fail(*args, **kwargs):
+        raise pytesseract.TesseractError(1, "Too few characters")
+
+    monkeypatch.setattr(pytesseract, "image_to_osd", fail)
+    assert detect_lang(Image.new("L", (100, 100))) == FALLBACK_LANG
+    assert FALLBACK_LANG == "chi_sim+eng"
+
+
+def test_auto_lang_and_psm_are_detected(tesseract):
+    text, timings = _ocr_worker(_png(), AUTO_LANG, 2000)
+    assert text == "text"
+    assert tesseract["osd"] == 1
+    # 预处理统计出一行文字，自动选择 psm 7
+    assert tesseract["ocr"] == [("chi_sim+eng", "--psm 7")]
+    assert "detect" in timings
+
+
+def test_explicit_lang_and_psm_skip_detection(tesseract):
+    _ocr_worker(_png(), "deu", 2000, psm=6)
+    assert tesseract["osd"] == 0
+    assert tesseract["ocr"] == [("deu", "--psm 6")]
+
+
+def test_lang_and_psm_are_part_of_cache_key(ocr_main, monkeypatch):
+    runs = []
+
+    async def run(content, lang=AUTO_LANG, max_side=2000, frame=0, psm=None):
+        runs.append((lang, psm))
+        return f"{lang}/{psm}"
+
+    monkeypatch.setattr(ocr_main.ocr_engine, "run", run)
+
+    async def main():
+        content = _png()
+        return [
+            await ocr_main.run_ocr(content, lang=AUTO_LANG),
+            await ocr_main.run_ocr(content, lang="eng"),
+            await ocr_main.run_ocr(content, lang="eng", psm=6),
+            await ocr_main.run_ocr(content, lang="eng", psm=6),
+        ]
+
+    results = asyncio.run(main())
+    assert runs == [(AUTO_LANG, None), ("eng", None), ("eng", 6)]
+    assert results[-1] == ("eng/6", True)
@@ -0,0 +1,54 @@
+import numpy as np
+from PIL import Image, ImageDraw
+
+from preprocess import estimate_skew, preprocess, rescale
+
+
+def _page(lines: int, height: int = 24, gap: int = 40, size=(1000, 800), ink: int = 0, paper: int = 255) -> Image.Image:
+    """画 lines 行由矩形"单词"组成的文本行，行高 height 像素"""
+    image = Image.new("L", size, paper)
+    draw = ImageDraw.Draw(image)
+    top = 100
+    for _ in range(lines):
+        left = 100
+        while left < size[0] - 200:
+            draw.rectangle([left, top, left + 60, top + height - 1], fill=ink)
+            left += 80
+        top += height + gap
+    return image
+
+
+def test_blank_page_returns_none():
+    assert preprocess(Image.new("L", (800, 600), 255)) is None
+    noise = np.random.default_rng(0).integers(240, 256, (600, 800), dtype=np.uint8)
+    assert preprocess(Image.fromarray(noise)) is None
+
+
+def test_dark_background_is_inverted():
+    result = preprocess(_page(3, ink=230, paper=20))
+    pixels = np.asarray(result.convert("L"))
+    # 白底黑字：背景占多数，边角为白色
+    assert pixels.mean() > 127
+    assert pixels[0, 0] == 255
+
+
+def test_skew_estimate_matches_rotation():
+    image = _page(8, height=12, gap=20).rotate(3, resample=Image.NEAREST, expand=True, fillcolor=255)
+    ink = np.asarray(image) <= 127
+    assert abs(estimate_skew(ink) + 3) <= 0.5
+    assert estimate_skew(np.asarray(_page(8, height=12, gap=20)) <= 127) == 0.0
+
+
+def test_counts_drawn_lines():
+    for lines in (1, 2, 5):
+        # 行距小于分带间隔，多行合并为一个文本带，仍按行计数
+        assert preprocess(_page(lines, gap=12)).info["lines"] == lines
+    assert preprocess(_page(3, gap=120)).info["lines"] == 3
+
+
+def test_low_dpi_image_with_tall_text_is_not_upscaled():
+    image = _page(3, height=30)
+    assert rescale(image, (96, 96), 4000).size == image.size
+    # 文字太小时仍按 DPI 放大（上限 2 倍）
+    small = _page(3, height=8, gap=16)
+    assert rescale(small, (96, 96), 4000).size == (2000, 1600)